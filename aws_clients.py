@@ -0,0 +1,188 @@
+"""Shared AWS clients and cached Secrets Manager lookups.
+
+``ClientPool`` hands out one boto3 client per (service, region, credentials)
+and reuses it across calls and threads (boto3 clients are thread-safe once
+created). ``SecretCache`` keeps decoded secrets for a TTL and refreshes them
+in the background shortly before they expire, so callers only wait on
+Secrets Manager for the very first lookup or after a long idle period.
+
+Both take a ``factory`` so they can be exercised against a local stub
+instead of AWS, e.g. ``ClientPool(factory=lambda service, **kw: stub)``.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+def _boto3_client(service, **kwargs):
+    import boto3
+
+    return boto3.session.Session().client(service, **kwargs)
+
+
+class ClientPool:
+    def __init__(self, factory=None):
+        self._factory = factory or _boto3_client
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def _key(service, kwargs):
+        # Hash credentials so secrets are not kept around as dictionary keys
+        items = sorted((name, str(value)) for name, value in kwargs.items())
+        digest = hashlib.sha256(repr(items).encode('utf-8')).hexdigest()
+        return service, kwargs.get('region_name'), digest
+
+    def get(self, service, **kwargs):
+        """Return a shared client for ``service`` created with ``kwargs``"""
+        key = self._key(service, kwargs)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.reused += 1
+                return client
+            client = self._factory(service, **kwargs)
+            self._clients[key] = client
+            self.created += 1
+            return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._clients), 'created': self.created, 'reused': self.reused}
+
+
+class SecretCache:
+    """TTL cache for JSON secrets with background refresh.
+
+    Entries younger than ``refresh_after`` (a fraction of ``ttl``) are served
+    as-is. Older entries are still served while one background thread
+    re-fetches them; entries past ``ttl`` are fetched synchronously, and
+    concurrent callers waiting on the same secret share one fetch.
+    """
+
+    def __init__(self, pool, ttl=300.0, refresh_after=0.8, **client_kwargs):
+        self._pool = pool
+        self._client_kwargs = client_kwargs
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self._entries = {}          # secret id -> (value, fetched_at)
+        self._refreshing = set()
+        self._inflight = {}         # secret id -> Future of the synchronous fetch
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self.background_refreshes = 0
+        self.errors = 0
+
+    def _fetch(self, secret_id):
+        client = self._pool.get('secretsmanager', **self._client_kwargs)
+        response = client.get_secret_value(SecretId=secret_id)
+        value = json.loads(response['SecretString'])
+        with self._lock:
+            self._entries[secret_id] = (value, time.monotonic())
+            self.fetches += 1
+        return value
+
+    def _refresh(self, secret_id):
+        try:
+            self._fetch(secret_id)
+        except Exception:
+            # Keep serving the cached value; the next call past the TTL retries
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(secret_id)
+
+    def get(self, secret_id):
+        """Return the decoded secret, fetching or refreshing it as needed"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(secret_id)
+            if entry is not None:
+                value, fetched_at = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    self.hits += 1
+                    if age >= self.ttl * self.refresh_after and secret_id not in self._refreshing:
+                        self._refreshing.add(secret_id)
+                        self.background_refreshes += 1
+                        threading.Thread(target=self._refresh, args=(secret_id,),
+                                         daemon=True).start()
+                    return value
+            future = self._inflight.get(secret_id)
+            if future is None:
+                future = self._inflight[secret_id] = Future()
+                owner = True
+            else:
+                owner = False
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+        try:
+            value = self._fetch(secret_id)
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+                del self._inflight[secret_id]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[secret_id]
+        future.set_result(value)
+        return value
+
+    def invalidate(self, secret_id=None):
+        with self._lock:
+            if secret_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(secret_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached': len(self._entries),
+                'hits': self.hits,
+                'fetches': self.fetches,
+                'coalesced': self.coalesced,
+                'background_refreshes': self.background_refreshes,
+                'errors': self.errors,
+            }
+
+
+# Process-wide instances used by bedrock_utils
+client_pool = None
+secret_cache = None
+
+
+def configure(factory=None, secret_ttl=None):
+    """(Re)create the shared pool and secret cache.
+
+    ``factory(service, **kwargs)`` replaces boto3 client creation, e.g. with
+    a stub; ``secret_ttl`` defaults to ``BEDROCK_SECRET_TTL`` (300 seconds).
+    """
+    global client_pool, secret_cache
+    if secret_ttl is None:
+        secret_ttl = float(os.environ.get('BEDROCK_SECRET_TTL', 300))
+    client_pool = ClientPool(factory)
+    secret_cache = SecretCache(client_pool, ttl=secret_ttl)
+
+
+configure()
+
+
+def aws_metrics():
+    """Client reuse and secret refresh counters for the shared instances"""
+    return {'clients': client_pool.stats(), 'secrets': secret_cache.stats()}
@@ -0,0 +1,193 @@
+"""Headless batch renderer for diagram spec files.
+
+Renders every spec file given on the command line (directories are searched
+for ``--pattern``) to an SVG in ``--out-dir``, fanning out over a process
+pool. A manifest in the output directory records the content hash of each
+input so unchanged specs are skipped on the next run. ``--compact`` writes
+the compact SVG format and ``--svgz`` gzips each output.
+
+    python batch_render.py specs/ -o build/diagrams -j 8
+"""
+import argparse
+import fnmatch
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bedrock_utils import parse_diagram_spec
+
+RENDERERS = ('custom', 'graphviz')
+MANIFEST_NAME = '.render-manifest.json'
+
+
+def spec_files(paths, pattern):
+    """Expand files and directories into sorted ``(path, relative_path)`` pairs.
+
+    Files found in a directory keep their path relative to it so outputs
+    mirror the input tree; files named directly are relative to themselves.
+    """
+    found = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in fnmatch.filter(names, pattern):
+                    spec_path = os.path.join(root, name)
+                    found[spec_path] = os.path.relpath(spec_path, path)
+        else:
+            found[path] = os.path.basename(path)
+    return sorted(found.items())
+
+
+def content_hash(path, variant):
+    """Hash a spec file's bytes together with the renderer (and options) that consume it"""
+    digest = hashlib.sha256(variant.encode('utf-8') + b'\0')
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_path(relative_path, out_dir, svgz=False):
+    extension = '.svgz' if svgz else '.svg'
+    return os.path.join(out_dir, os.path.splitext(relative_path)[0] + extension)
+
+
+def load_renderer(renderer, compact=False, max_animated=None):
+    """Return a ``write(out, nodes, connections, animations)`` function"""
+    if renderer == 'graphviz':
+        from bedrock_utils import write_diagram
+
+        def write(out, nodes, connections, animations):
+            # The Graphviz renderer takes (source, target) pairs
+            write_diagram(out, nodes, [conn[:2] for conn in connections], animations)
+        return write
+
+    from svg_renderer import write_custom_svg
+
+    def write(out, nodes, connections, animations):
+        write_custom_svg(out, nodes, connections, animations, html=False, compact=compact,
+                         max_animated=max_animated)
+    return write
+
+
+def open_output(path, svgz):
+    if not svgz:
+        return open(path, 'w', encoding='utf-8')
+    # mtime=0 keeps the output reproducible for unchanged specs
+    return io.TextIOWrapper(gzip.GzipFile(path, 'wb', compresslevel=9, mtime=0), encoding='utf-8')
+
+
+def render_file(path, out_path, renderer, compact=False, svgz=False, max_animated=None):
+    """Parse and render one spec file; runs in a worker process.
+
+    Returns ``(path, seconds, output_bytes, error)``.
+    """
+    write = load_renderer(renderer, compact, max_animated)
+    start = time.perf_counter()
+    tmp_path = out_path + '.tmp'
+    try:
+        with open(path, encoding='utf-8') as fp:
+            nodes, connections, animations = parse_diagram_spec(fp)
+
+        os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+        with open_output(tmp_path, svgz) as out:
+            write(out, nodes, connections, animations)
+        os.replace(tmp_path, out_path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return path, time.perf_counter() - start, 0, f"{type(e).__name__}: {e}"
+    return path, time.perf_counter() - start, os.path.getsize(out_path), None
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding='utf-8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as fp:
+        json.dump(manifest, fp, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render diagram spec files to SVG.")
+    parser.add_argument('paths', nargs='+', help="spec files or directories")
+    parser.add_argument('-o', '--out-dir', default='diagrams')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('--renderer', choices=RENDERERS, default='custom')
+    parser.add_argument('--pattern', default='*.txt',
+                        help="file pattern used when searching directories")
+    parser.add_argument('--force', action='store_true',
+                        help="render every file even if its content is unchanged")
+    parser.add_argument('--compact', action='store_true',
+                        help="write the compact SVG format (custom renderer only)")
+    parser.add_argument('--svgz', action='store_true', help="gzip outputs as .svgz")
+    parser.add_argument('--max-animated', type=int, default=None,
+                        help="cap on concurrently animated connections (custom renderer only)")
+    args = parser.parse_args(argv)
+    variant = args.renderer + (':compact' if args.compact else '') + (':svgz' if args.svgz else '')
+    if args.max_animated:
+        variant += f':max-animated={args.max_animated}'
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    # --force only skips the hash check: entries of files outside this run stay
+    manifest = load_manifest(args.out_dir)
+
+    # Hash inputs up front and only dispatch the ones that changed
+    jobs = []
+    skipped = 0
+    hashes = {}
+    for path, relative_path in spec_files(args.paths, args.pattern):
+        out_path = output_path(relative_path, args.out_dir, args.svgz)
+        hashes[path] = content_hash(path, variant)
+        if (not args.force and manifest.get(path) == hashes[path]
+                and os.path.exists(out_path)):
+            skipped += 1
+            continue
+        jobs.append((path, out_path))
+
+    start = time.perf_counter()
+    rendered = failed = total_bytes = 0
+    if jobs:
+        # Import the renderer once per worker so per-file timings exclude it
+        with ProcessPoolExecutor(max_workers=max(1, args.workers),
+                                 initializer=load_renderer,
+                                 initargs=(args.renderer, args.compact, args.max_animated)) as pool:
+            futures = [pool.submit(render_file, path, out_path, args.renderer,
+                                   args.compact, args.svgz, args.max_animated)
+                       for path, out_path in jobs]
+            for future in as_completed(futures):
+                path, elapsed, size, error = future.result()
+                if error:
+                    failed += 1
+                    manifest.pop(path, None)
+                    print(f"FAIL {path} ({elapsed * 1000:.1f} ms): {error}", file=sys.stderr)
+                    continue
+                rendered += 1
+                total_bytes += size
+                manifest[path] = hashes[path]
+                print(f"  ok {path} {elapsed * 1000:8.1f} ms {size / 1024:8.1f} KiB")
+    wall = time.perf_counter() - start
+
+    save_manifest(args.out_dir, manifest)
+    wall = max(wall, 1e-9)
+    print(f"{rendered} rendered, {skipped} unchanged, {failed} failed "
+          f"in {wall:.2f}s with {args.workers} workers "
+          f"({rendered / wall:.1f} files/s, {total_bytes / (1024 * 1024) / wall:.1f} MiB/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
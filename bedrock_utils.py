@@ -1,14 +1,20 @@
-import boto3
+import io
 import json
-import streamlit as st
 import re
+import time
+
+import aws_clients
+import metrics
+import response_cache
+
+# boto3 and streamlit are imported inside the functions that use them so the
+# parsing and rendering helpers below stay cheap to import
 
 def get_bedrock_credentials():
-    secrets_client = boto3.client('secretsmanager')
     secret_name = "bedrocksecrets"
     try:
-        response = secrets_client.get_secret_value(SecretId=secret_name)
-        secrets = json.loads(response['SecretString'])
+        # Served from a TTL cache that refreshes in the background
+        secrets = aws_clients.secret_cache.get(secret_name)
         return {
             'region_name': secrets.get('AWS_REGION'),
             'aws_access_key_id': secrets.get('AWS_ACCESS_KEY_ID'),
@@ -21,6 +27,7 @@ def get_bedrock_credentials():
             'session_secret_instructor2': secrets.get('SESSION_SECRET_INSTRUCTOR2')
         }
     except Exception as e:
+        import streamlit as st
         st.error(f"Error retrieving Bedrock credentials: {e}")
         return None
 
@@ -35,47 +42,126 @@ def list_available_models():
     ]
     return claude_models
 
-def invoke_bedrock_model(prompt, access_key, secret_key, model_id):
+def iter_bedrock_text(prompt, access_key, secret_key, model_id, max_tokens=1024):
+    """Invoke a Bedrock model and yield its response text as it streams in.
+
+    A response cached for the same model, prompt and ``max_tokens`` is
+    yielded in one piece; otherwise the streamed response is cached once
+    it completes. Errors are raised to the caller; ``invoke_bedrock_model``
+    is the non-streaming wrapper that reports them in the UI.
+    """
+    key = response_cache.response_key(model_id, prompt, max_tokens)
+    cached = response_cache.cache.get(key)
+    if cached is not None:
+        metrics.registry.record('bedrock_stream', 0.0, cached=1, output_chars=len(cached))
+        yield cached
+        return
+
+    start = time.perf_counter()
+    parts = []
+    usage = {}
     try:
-        bedrock_client = boto3.client(
-            'bedrock-runtime',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name='us-east-1'
-        )
+        for delta in _stream_bedrock_text(prompt, access_key, secret_key, model_id, max_tokens,
+                                          usage):
+            parts.append(delta)
+            yield delta
+    except Exception:
+        metrics.registry.record('bedrock_stream', time.perf_counter() - start, error=True)
+        raise
+    elapsed = time.perf_counter() - start
+    response_cache.cache.put(key, ''.join(parts), elapsed)
+    metrics.registry.record('bedrock_stream', elapsed, output_chars=sum(map(len, parts)), **usage)
 
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1024,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-        })
-
-        response = bedrock_client.invoke_model_with_response_stream(
-            modelId=model_id,
-            body=body,
-        )
+def _stream_bedrock_text(prompt, access_key, secret_key, model_id, max_tokens, usage=None):
+    # Reuse one client per region and credentials across calls and threads
+    bedrock_client = aws_clients.client_pool.get(
+        'bedrock-runtime',
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name='us-east-1'
+    )
 
-        stream = response.get("body")
-        parsed_response = ""
+    body = json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+    })
 
-        for event in stream:
-            chunk = event.get('chunk')
-            if chunk:
-                message = json.loads(chunk.get("bytes").decode())
-                if "content_block_delta" in message.get('type', ''):
-                    parsed_response += message['delta'].get("text", "")
-                elif "message_stop" in message.get('type', ''):
-                    break
+    response = bedrock_client.invoke_model_with_response_stream(
+        modelId=model_id,
+        body=body,
+    )
+    yield from iter_stream_text(response.get("body"), usage)
+
+def iter_stream_text(stream, usage=None):
+    """Yield the text deltas of an ``invoke_model_with_response_stream`` body.
+
+    When ``usage`` is a dict it receives the token counts the model reports
+    (``input_tokens``, ``output_tokens``) and the number of text ``chunks``.
+    """
+    if usage is None:
+        usage = {}
+    usage.setdefault('chunks', 0)
+    for event in stream:
+        chunk = event.get('chunk')
+        if chunk:
+            message = json.loads(chunk.get("bytes").decode())
+            message_type = message.get('type', '')
+            if "content_block_delta" in message_type:
+                usage['chunks'] += 1
+                yield message['delta'].get("text", "")
+            elif "message_start" in message_type:
+                usage['input_tokens'] = message.get('message', {}).get('usage', {}).get('input_tokens', 0)
+            elif "message_delta" in message_type:
+                usage['output_tokens'] = message.get('usage', {}).get('output_tokens', 0)
+            elif "message_stop" in message_type:
+                break
 
-        return parsed_response
+def invoke_bedrock_model(prompt, access_key, secret_key, model_id, max_tokens=1024):
+    usage = {}
+    start = time.perf_counter()
+    try:
+        # Repeat prompts are served from the response cache and concurrent
+        # identical prompts share one upstream call
+        text = response_cache.cache.get_or_compute(
+            response_cache.response_key(model_id, prompt, max_tokens),
+            lambda: ''.join(_stream_bedrock_text(prompt, access_key, secret_key,
+                                                 model_id, max_tokens, usage)),
+        )
     except Exception as e:
+        metrics.registry.record('bedrock', time.perf_counter() - start, error=True)
+        import streamlit as st
         st.error(f"Error in invoking model: {e}")
         return "Response not available due to API error."
+    # usage stays empty when the response came from the cache or another call
+    metrics.registry.record('bedrock', time.perf_counter() - start, output_chars=len(text),
+                            cached=int(not usage), **usage)
+    return text
+
+def iter_text_lines(deltas):
+    """Regroup a stream of text deltas into complete lines.
+
+    Lines are yielded without their newline as soon as they are complete,
+    so ``iter_diagram_spec(iter_text_lines(deltas))`` parses a model
+    response while it is still being generated.
+    """
+    pending = []
+    for delta in deltas:
+        if '\n' not in delta:
+            pending.append(delta)
+            continue
+        first, *lines, last = delta.split('\n')
+        pending.append(first)
+        yield ''.join(pending)
+        yield from lines
+        pending = [last]
+    if any(pending):
+        yield ''.join(pending)
 
 def summarize_markdown(markdown_content):
     if markdown_content.strip():
@@ -84,128 +170,161 @@ def summarize_markdown(markdown_content):
     else:
         return "No insights available from the provided learning resources."
 
-def parse_diagram_spec(text):
-    """Parse the diagram specification from the prompt text"""
-    nodes = []
-    connections = []
-    animations = []
-    
+# Every connector in one alternation. The leftmost match splits source from
+# target. "to>" needs no surrounding space ("Ato>B" is A to B), while " to "
+# is only taken when no other connector follows it, so names such as
+# "Proto" or "Route to S3" survive.
+_CONNECTOR_RE = re.compile(
+    r'~~|~>|==|=>|>>|--|->|to>'
+    r'|\sto\s(?!.*(?:~~|~>|==|=>|>>|--|->|to>))'
+)
+
+def iter_diagram_spec(lines):
+    """Lazily parse a diagram specification from any iterable of lines.
+
+    Yields ``(kind, lineno, item)`` tuples where ``kind`` is ``'node'``
+    (item is ``(node_type, label)``), ``'connection'`` (``(source, target,
+    connector)``), ``'animation'`` (``(source, target)``) or ``'rejected'``
+    (the offending line). Only lines inside a known section that cannot be
+    parsed are rejected; text outside the sections is ignored.
+    """
     current_section = None
-    for line in text.split('\n'):
+    search = _CONNECTOR_RE.search
+    lineno = 0
+    for line in lines:
+        lineno += 1
         line = line.strip()
         if not line:
             continue
             
-        if line.startswith('['):
+        if line[0] == '[':
             current_section = line[1:-1].lower()
             continue
             
-        if current_section == 'diagram nodes':
-            if ' - ' in line:
-                node_type, node_name = line.split(' - ', 1)
-                nodes.append((node_type.strip(), node_name.strip()))
-                
-        elif current_section == 'diagram connection':
-            connectors = [
-                '~~', '~>', '==', '=>', '--', '->', 'to>', ' to>', ' to ', '>>'
-            ]
-            for c in connectors:
-                if c in line:
-                    connector = c
-                    source, target = line.split(c, 1)
-                    connections.append((source.strip(), target.strip(), connector))
-                    break
-                
+        # Connection lines dominate large specs, so test for them first
+        if current_section == 'diagram connection':
+            match = search(line)
+            if match is None:
+                yield 'rejected', lineno, line
+                continue
+            connector = match.group()
+            if connector[0].isspace():
+                connector = ' to '
+            yield 'connection', lineno, (
+                line[:match.start()].rstrip(), line[match.end():].lstrip(), connector
+            )
+
+        elif current_section == 'diagram nodes':
+            node_type, sep, node_name = line.partition(' - ')
+            if sep:
+                yield 'node', lineno, (node_type.rstrip(), node_name.lstrip())
+            else:
+                yield 'rejected', lineno, line
+
         elif current_section == 'animation':
             # Handle all connection types in animations
-            connectors = ['~~', '~>', '==', '=>', '--', '->', ' to> ', ' to ', '>>']
-            for c in connectors:
-                if c in line:
-                    source, target = line.split(c, 1)
-                    animations.append((source.strip(), target.strip()))
-                    break
-                
-    return nodes, connections, animations
+            match = search(line)
+            if match is None:
+                yield 'rejected', lineno, line
+                continue
+            yield 'animation', lineno, (
+                line[:match.start()].rstrip(), line[match.end():].lstrip()
+            )
 
-def generate_diagram(nodes, connections, animations=None):
-    """Generate a Graphviz diagram with flowing pipe animations"""
-    from graphviz import Digraph
-    import re
-
-    dot = Digraph(engine='dot')
-    dot.attr(
-        rankdir='LR', 
-        splines='spline', 
-        bgcolor='transparent', 
-        nodesep='6', 
-        ranksep='6',
-        size='8,6!'
-    )
-    
-    # Define node appearance by type.
-    node_shapes = {
-        'EC2': ('box', '#E3F2FD', '#1976D2'),
-        'ELB': ('ellipse', '#F1F8E9', '#7CB342'),
-        'RDS': ('cylinder', '#FFEBEE', '#D32F2F'),
-        'S3': ('folder', '#E8F5E9', '#388E3C')
+@metrics.timed('parse', lambda parsed, *args, **kwargs: {'nodes': len(parsed[0]),
+                                                         'edges': len(parsed[1])})
+def parse_diagram_spec(text, rejected=None):
+    """Parse the diagram specification from the prompt text.
+
+    ``text`` may be a string or any iterable of lines (an open file, stdin,
+    a streamed model response). Lines that could not be parsed are appended
+    to ``rejected`` as ``(lineno, line)`` when a list is given.
+    """
+    lines = io.StringIO(text) if isinstance(text, str) else text
+    return collect_diagram_spec(iter_diagram_spec(lines), rejected)
+
+def collect_diagram_spec(events, rejected=None):
+    """Collect ``(kind, lineno, item)`` events into ``(nodes, connections, animations)``.
+
+    ``events`` come from ``iter_diagram_spec`` or the inventory importers;
+    rejected items are appended to ``rejected`` as ``(lineno, item)``.
+    """
+    nodes = []
+    connections = []
+    animations = []
+    sinks = {
+        'node': nodes.append,
+        'connection': connections.append,
+        'animation': animations.append,
+        'rejected': rejected.append if rejected is not None else lambda item: None,
     }
-    
-    for node_type, node_name in nodes:
-        shape, fill, color = node_shapes.get(node_type, ('box', '#FFFFFF', '#000000'))
-        dot.node(node_name, node_name, 
-                 shape=shape, 
-                 style='filled,rounded',
-                 fillcolor=fill,
-                 color=color,
-                 fontcolor=color,
-                 penwidth='2',
-                 fontname='Arial',
-                 fontsize='12',
-                 margin='0.1')
-    
-    # Optionally force a specific node (here LoadBalancerA) to the same rank.
-    if any(node_name == 'LoadBalancerA' for _, node_name in nodes):
-        with dot.subgraph() as s:
-            s.attr(rank='same')
-            s.node('LoadBalancerA')
-    
-    # Add edges. For edges that should be animated, add an explicit id.
-    for source, target in connections:
-        is_animated = False
-        if animations:
-            is_animated = (source, target) in animations
-        if is_animated:
-            # Create an id by replacing any spaces (ids should not contain spaces).
-            edge_id = f"edge_{source}_{target}".replace(" ", "_")
-            dot.edge(source, target,
-                     color='#FF5722',
-                     penwidth='3',
-                     arrowsize='1.2',
-                     arrowhead='vee',
-                     style='bold',
-                     # Pass the id attribute (Graphviz will output it in the SVG)
-                     id=edge_id)
-        else:
-            dot.edge(source, target,
-                     color='#4CAF50',
-                     penwidth='3',
-                     arrowsize='1.2',
-                     arrowhead='vee',
-                     style='bold')
-    
-    # Generate SVG content with proper coordinate system
-    svg_content = dot.pipe(format='svg').decode('utf-8')
-    
-    # Remove Graphviz transformations and normalize coordinates
-    svg_content = re.sub(r'transform="[^"]+"', '', svg_content)
-    svg_content = re.sub(r'<g id="graph\d+"[^>]*>', '', svg_content)
-    svg_content = svg_content.replace('</g>', '', 1)
-    
-    # Extract and transform all elements
-    paths = re.findall(r'<[^>]+>', svg_content)
-    
-    # Generate full SVG document with proper layering
-    return f'''<?xml version="1.0" encoding="UTF-8"?>
+    for kind, lineno, item in events:
+        sinks[kind](item if kind != 'rejected' else (lineno, item))
+    return nodes, connections, animations
+
+def write_fragments(out, fragments, chunk_size=65536):
+    """Write an iterable of text fragments to a file object or write callable.
+
+    Small fragments are coalesced into chunks of about ``chunk_size``
+    characters so a socket or HTTP response is not hit once per element.
+    Returns the number of characters written.
+    """
+    write = out if callable(out) else out.write
+    buffer = []
+    buffered = 0
+    written = 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        buffered += len(fragment)
+        if buffered >= chunk_size:
+            write(''.join(buffer))
+            written += buffered
+            buffer = []
+            buffered = 0
+    if buffer:
+        write(''.join(buffer))
+        written += buffered
+    return written
+
+def iter_diagram(nodes, connections, animations=None):
+    """Yield the Graphviz-based animated SVG document as fragments.
+
+    The dot layout is cached by graph structure, so re-rendering the same
+    graph with different animations does not run dot again.
+    """
+    from graph import DiagramGraph
+
+    yield from iter_graph_diagram(DiagramGraph.from_spec(nodes, connections, animations or ()))
+
+def iter_graph_diagram(graph):
+    """``iter_diagram`` for a ``DiagramGraph``"""
+    from graphviz_layout import layout_graphs, style_graph
+
+    yield from _iter_diagram_groups(*style_graph(layout_graphs([graph])[0], graph))
+
+@metrics.timed('graphviz_batch', lambda svgs, *args: {'diagrams': len(svgs)})
+def generate_diagrams(diagrams):
+    """Generate Graphviz diagrams for many ``(nodes, connections, animations)``.
+
+    Items may also be ``DiagramGraph`` objects. All layouts missing from
+    the cache are computed by a single dot run.
+    """
+    from graph import DiagramGraph
+    from graphviz_layout import layout_graphs, style_graph
+
+    graphs = [
+        diagram if isinstance(diagram, DiagramGraph) else
+        DiagramGraph.from_spec(diagram[0], diagram[1], diagram[2] or ())
+        for diagram in diagrams
+    ]
+    return [
+        ''.join(_iter_diagram_groups(*style_graph(layout, graph)))
+        for layout, graph in zip(layout_graphs(graphs), graphs)
+    ]
+
+def _iter_diagram_groups(background, animated, node_parts):
+    # Emit the full SVG document group by group with proper layering
+    yield '''<?xml version="1.0" encoding="UTF-8"?>
 <svg width="800" height="600" viewBox="0 0 800 600"
      xmlns="http://www.w3.org/2000/svg"
      xmlns:xlink="http://www.w3.org/1999/xlink">
@@ -226,25 +345,44 @@ def generate_diagram(nodes, connections, animations=None):
 
     <!-- Background connections -->
     <g id="background-connections">
-        {' '.join([
-            re.sub(r'stroke="#ff5722"', 'stroke="#EDEBEB"', p, flags=re.IGNORECASE)
-            for p in paths if 'fill="none"' in p
-        ])}
+        '''
+    yield from _join_fragments(background)
+    yield '''
     </g>
 
     <!-- Animated connections -->
     <g id="animated-connections">
-        {' '.join([
-            re.sub(r'stroke="#ff5722"', 'stroke="#FB5844" mask="url(#gradient-mask)"', p, flags=re.IGNORECASE)
-            for p in paths if 'fill="none"' in p and re.search(r'stroke="#ff5722"', p, re.IGNORECASE)
-        ])}
+        '''
+    yield from _join_fragments(animated)
+    yield '''
     </g>
 
     <!-- Nodes -->
     <g id="nodes" transform="translate(0,600) scale(1,-1)">
-        {' '.join([
-            p for p in paths 
-            if 'fill="#' in p and 'fill="none"' not in p
-        ])}
+        '''
+    yield from _join_fragments(node_parts)
+    yield '''
     </g>
 </svg>'''
+
+def _join_fragments(fragments, separator=' '):
+    """Yield fragments with ``separator`` between them, like str.join"""
+    for i, fragment in enumerate(fragments):
+        if i:
+            yield separator
+        yield fragment
+
+def write_diagram(out, nodes, connections, animations=None, chunk_size=65536):
+    """Stream the Graphviz-based diagram to a file object or write callable"""
+    return write_fragments(out, iter_diagram(nodes, connections, animations), chunk_size)
+
+@metrics.timed('graphviz', metrics.output_sizes)
+def generate_diagram(nodes, connections, animations=None):
+    """Generate a Graphviz diagram with flowing pipe animations"""
+    return ''.join(iter_diagram(nodes, connections, animations))
+
+@metrics.timed('graphviz', lambda svg, graph: {
+    'nodes': graph.node_count, 'edges': graph.edge_count, 'output_chars': len(svg)})
+def generate_graph_diagram(graph):
+    """``generate_diagram`` for a ``DiagramGraph``"""
+    return ''.join(iter_graph_diagram(graph))
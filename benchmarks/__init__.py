@@ -0,0 +1,14 @@
+"""Rendering benchmarks for the diagram generator.
+
+Run with ``python -m benchmarks``; ``--help`` lists the runs and their
+sizes. Each area lives in its own module:
+
+* ``suite``: per-stage time and peak memory over synthetic cases, with
+  baselines;
+* ``render``: render scaling, layout, output size and parallel emission;
+* ``parse``: spec parsing throughput and the graph model's memory;
+* ``graphviz_post``: post-processing of large ``dot`` output;
+* ``query``: sub-diagram queries against the full render;
+* ``imports``: cold import time of the rendering core;
+* ``synthetic`` and ``timing``: the inputs and timers they share.
+"""
@@ -0,0 +1,90 @@
+"""Command line for the benchmark runs: ``python -m benchmarks --help``"""
+import argparse
+import sys
+
+from .graphviz_post import bench_graphviz
+from .imports import bench_import
+from .parse import bench_graph, bench_parse
+from .query import bench_query
+from .render import bench_layout, bench_parallel, bench_scaling, bench_size
+from .suite import SUITES, bench_suite, compare_baseline, save_baseline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Rendering benchmarks for the diagram generator.")
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 100, 1000, 10000, 100000],
+                        help="edge counts for the render scaling run")
+    parser.add_argument('--max-growth', type=float, default=3.0,
+                        help="allowed growth of the per-edge render time across --sizes")
+    parser.add_argument('--import-budget-ms', type=float, default=300.0,
+                        help="cold import budget for the rendering core (0 to skip)")
+    parser.add_argument('--layout-edges', type=int, default=100000,
+                        help="edge count used for the layout run (0 to skip)")
+    parser.add_argument('--parse-mb', type=float, default=8.0,
+                        help="size of the spec used for the parse run (0 to skip)")
+    parser.add_argument('--size-edges', type=int, default=1000,
+                        help="edge count used for the output size run (0 to skip)")
+    parser.add_argument('--graphviz-edges', type=int, default=100000,
+                        help="edge count of the synthetic Graphviz output (0 to skip)")
+    parser.add_argument('--graph-edges', type=int, default=100000,
+                        help="edge count for the tuples vs graph model memory run (0 to skip)")
+    parser.add_argument('--query-edges', type=int, default=100000,
+                        help="edge count for the sub-diagram query run (0 to skip)")
+    parser.add_argument('--parallel-edges', type=int, default=200000,
+                        help="edge count for the parallel emission run (0 to skip)")
+    parser.add_argument('--parallel-workers', type=int, nargs='+', default=None,
+                        help="worker counts for the parallel run (default: 1, 2, 4, ... "
+                             "up to the CPU count)")
+    parser.add_argument('--suite', choices=sorted(SUITES) + ['none'], default='quick',
+                        help="per-stage timing and peak memory suite to run")
+    parser.add_argument('--suite-only', action='store_true',
+                        help="run only the stage suite")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="minimum timed runs per stage; the best is kept")
+    parser.add_argument('--baseline', metavar='PATH',
+                        help="JSON baseline to compare the suite against")
+    parser.add_argument('--save-baseline', metavar='PATH',
+                        help="write the suite results as a JSON baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown or memory growth against the baseline")
+    args = parser.parse_args(argv)
+
+    ok = True
+    if args.suite != 'none':
+        results = bench_suite(SUITES[args.suite], args.repeat)
+        if args.baseline:
+            ok = compare_baseline(args.baseline, results, args.threshold)
+            if not ok:
+                print("stage suite regressed against the baseline")
+        if args.save_baseline:
+            save_baseline(args.save_baseline, results)
+        if args.suite_only:
+            return 0 if ok else 1
+
+    if args.import_budget_ms:
+        ok = bench_import(args.import_budget_ms) and ok
+    if args.layout_edges:
+        bench_layout(args.layout_edges, layer_count=20)
+    if args.parse_mb:
+        bench_parse(args.parse_mb)
+    if args.size_edges:
+        bench_size(args.size_edges)
+    if args.graphviz_edges:
+        bench_graphviz(args.graphviz_edges)
+    if args.graph_edges:
+        bench_graph(args.graph_edges)
+    if args.query_edges:
+        bench_query(args.query_edges)
+    if args.parallel_edges:
+        bench_parallel(args.parallel_edges, args.parallel_workers)
+
+    if not bench_scaling(args.sizes, args.max_growth):
+        print("render time is not scaling linearly with edge count")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+"""Post-processing of large Graphviz output"""
+from graphviz_layout import _style, index_svg
+
+from .synthetic import synthetic_graphviz_svg
+from .timing import time_call
+
+
+def bench_graphviz(edge_count):
+    """Time the two steps between ``dot`` and the animated diagram.
+
+    ``index_svg`` splits the ``dot`` output into elements per edge once per
+    graph structure (its result is cached); styling then colors that index
+    for the animated edges on every render, here one edge in ten.
+    """
+    svg = synthetic_graphviz_svg(edge_count)
+    megabytes = len(svg.encode('utf-8')) / (1024 * 1024)
+    indexed = index_svg(svg)
+    animated_edges = set(range(0, edge_count, 10))
+    index = time_call(index_svg, svg)
+    style = time_call(_style, indexed, animated_edges)
+    print(f"graphviz post-processing {megabytes:.1f} MB / {edge_count} edges:")
+    print(f"  {'index':>5}: {index:.3f}s  {megabytes / index:6.1f} MB/s  (once per structure)")
+    print(f"  {'style':>5}: {style:.3f}s  (every render)")
@@ -0,0 +1,59 @@
+"""Cold import time of the rendering core"""
+import os
+import subprocess
+import sys
+
+# Modules that must import without the UI and AWS dependencies
+CORE_MODULES = ('bedrock_utils', 'layout', 'svg_renderer', 'render_cache', 'incremental',
+                'graphviz_layout', 'metrics', 'graph', 'graph_query', 'parallel_render')
+HEAVY_MODULES = ('streamlit', 'boto3', 'botocore')
+
+
+def bench_import(budget_ms):
+    """Import the rendering core in a fresh interpreter under ``-X importtime``.
+
+    Returns False when it pulls in Streamlit or boto3 or takes longer than
+    ``budget_ms``.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(CORE_MODULES)],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    # Lines look like "import time:   self |   cumulative | <indent>module";
+    # top-level imports have no extra indentation, so summing their
+    # cumulative time gives the total. The interpreter imports everything
+    # up to and including ``site`` before running the command, so that is
+    # the startup baseline rather than the cost of the core
+    startup_us = 0
+    total_us = 0
+    top_level = []
+    heavy = set()
+    started = False
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative = int(parts[1])
+        name = parts[2][1:]
+        if name.split('.')[0].strip() in HEAVY_MODULES:
+            heavy.add(name.strip().split('.')[0])
+        if name.startswith(' '):
+            continue
+        if started:
+            total_us += cumulative
+            top_level.append((cumulative, name))
+        else:
+            startup_us += cumulative
+            started = name == 'site'
+
+    print(f"import {', '.join(CORE_MODULES)}: {total_us / 1000:.1f} ms "
+          f"(budget {budget_ms:.0f} ms)")
+    print(f"  interpreter startup, not counted: {startup_us / 1000:.1f} ms")
+    for cumulative, name in sorted(top_level, reverse=True)[:5]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if heavy:
+        print(f"  core imports pulled in: {', '.join(sorted(heavy))}")
+    return not heavy and total_us / 1000 <= budget_ms
+
@@ -0,0 +1,45 @@
+"""Spec parsing throughput and parsed spec memory"""
+import io
+
+from bedrock_utils import parse_diagram_spec
+from graph import DiagramGraph
+from svg_renderer import generate_custom_svg, generate_graph_svg
+
+from .synthetic import synthetic_spec_text
+from .timing import time_call, traced
+
+
+def bench_parse(size_mb):
+    """Report ``parse_diagram_spec`` throughput on a spec of about ``size_mb`` MB.
+
+    The spec is parsed both from one string and from a stream of lines.
+    """
+    # Grow the edge count until the spec reaches the requested size
+    text = synthetic_spec_text(int(size_mb * 1024 * 1024 / 36))
+    megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+    line_count = text.count('\n')
+
+    from_text = time_call(parse_diagram_spec, text)
+    from_lines = time_call(lambda: parse_diagram_spec(io.StringIO(text)))
+    print(f"parse {megabytes:.1f} MB / {line_count} lines:")
+    for name, elapsed in (('str', from_text), ('stream', from_lines)):
+        print(f"  {name:>6}: {elapsed:.3f}s  {megabytes / elapsed:6.1f} MB/s  "
+              f"{line_count / elapsed / 1e6:5.2f} M lines/s")
+
+
+def bench_graph(edge_count):
+    """Compare memory and speed of parsed tuples and the ``DiagramGraph`` model"""
+    text = synthetic_spec_text(edge_count)
+    tuples, tuple_bytes, tuple_peak = traced(lambda: parse_diagram_spec(text))
+    graph, graph_bytes, graph_peak = traced(lambda: DiagramGraph.parse(text))
+    print(f"parsed spec memory for {edge_count} edges (MB retained / peak):")
+    print(f"  {'tuples':>6}: {tuple_bytes / 2 ** 20:7.1f} / {tuple_peak / 2 ** 20:7.1f}")
+    print(f"  {'graph':>6}: {graph_bytes / 2 ** 20:7.1f} / {graph_peak / 2 ** 20:7.1f}  "
+          f"({graph_bytes / tuple_bytes:.0%} of tuples)")
+    parse_tuples = time_call(parse_diagram_spec, text)
+    parse_graph = time_call(DiagramGraph.parse, text)
+    render_tuples = time_call(generate_custom_svg, *tuples)
+    render_graph = time_call(generate_graph_svg, graph)
+    print(f"  parse  tuples {parse_tuples:.3f}s  graph {parse_graph:.3f}s")
+    print(f"  render tuples {render_tuples:.3f}s  graph {render_graph:.3f}s")
+
@@ -0,0 +1,32 @@
+"""Sub-diagram queries against the full render"""
+from graph import DiagramGraph
+from graph_query import AdjacencyIndex
+from svg_renderer import generate_graph_svg
+
+from .synthetic import synthetic_spec_text
+from .timing import time_call
+
+
+def bench_query(edge_count):
+    """Time sub-diagram renders against the full render.
+
+    A two-hop neighborhood, a downstream walk and a single layer are
+    selected with an ``AdjacencyIndex`` and rendered; their cost should
+    follow the size of the result, not of the diagram.
+    """
+    print(f"sub-diagram queries on {edge_count} edges:")
+    graph = DiagramGraph.parse(synthetic_spec_text(edge_count))
+    build = time_call(AdjacencyIndex, graph)
+    index = AdjacencyIndex(graph)
+    full = time_call(generate_graph_svg, graph)
+    print(f"  {'index':>12}: {build:.3f}s")
+    print(f"  {'full render':>12}: {full:.3f}s  {graph.node_count} nodes {graph.edge_count} edges")
+    seed = graph.labels[0]
+    for name, query in (('2-hop', lambda: index.neighborhood([seed], hops=2)),
+                        ('downstream', lambda: index.downstream([seed])),
+                        ('layer 3', lambda: index.layer_range(3, 3))):
+        sub = query()
+        elapsed = time_call(lambda: generate_graph_svg(query()))
+        print(f"  {name:>12}: {elapsed:.4f}s  {sub.node_count} nodes {sub.edge_count} edges "
+              f"({elapsed / full:.1%} of the full render)")
+
@@ -0,0 +1,90 @@
+"""Render scaling, layout, output size and parallel emission runs"""
+import base64
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from layout import compute_layout
+from parallel_render import iter_parallel_svg
+from svg_renderer import compress_svg, generate_custom_svg, iter_layout_svg
+
+from .synthetic import synthetic_spec
+from .timing import time_call
+
+
+def bench_scaling(sizes, max_growth):
+    """Render synthetic diagrams of each size in ``sizes`` and print the per-edge time.
+
+    Returns False when the per-edge cost grows by more than ``max_growth``
+    between the smallest timed size (1k edges up) and the largest one.
+    """
+    print(f"{'edges':>8} {'seconds':>10} {'us/edge':>10}")
+    per_edge = []
+    for size in sizes:
+        spec = synthetic_spec(size)
+        elapsed = time_call(generate_custom_svg, *spec)
+        per_edge.append(elapsed / size)
+        print(f"{size:>8} {elapsed:>10.4f} {elapsed / size * 1e6:>10.2f}")
+
+    # Tiny sizes are dominated by fixed overhead, so compare from 1k edges up
+    timed = [cost for size, cost in zip(sizes, per_edge) if size >= 1000]
+    growth = timed[-1] / timed[0] if len(timed) > 1 else 1.0
+    print(f"per-edge growth: {growth:.2f}x (limit {max_growth:.2f}x)")
+    return growth <= max_growth
+
+
+def bench_layout(edge_count, layer_count):
+    """Time ``compute_layout`` alone on one synthetic diagram"""
+    nodes, connections, _ = synthetic_spec(edge_count, layer_count)
+    elapsed = time_call(compute_layout, nodes, connections)
+    print(f"layout {len(nodes)} nodes / {edge_count} edges / {layer_count} layers: "
+          f"{elapsed * 1000:.1f} ms")
+
+
+def bench_size(edge_count):
+    """Compare the bytes of the full and compact SVG formats.
+
+    Each is measured raw, gzipped (``.svgz``) and base64-encoded.
+    """
+    spec = synthetic_spec(edge_count)
+    full = generate_custom_svg(*spec, html=False)
+    compact = generate_custom_svg(*spec, html=False, compact=True)
+    print(f"output size for {edge_count} edges (bytes):")
+    print(f"  {'':>8} {'svg':>10} {'svgz':>10} {'base64':>10}")
+    sizes = {}
+    for name, svg in (('full', full), ('compact', compact)):
+        raw = svg.encode('utf-8')
+        sizes[name] = (len(raw), len(compress_svg(svg)), len(base64.b64encode(raw)))
+        print(f"  {name:>8} " + ' '.join(f"{size:>10}" for size in sizes[name]))
+    saved = [1 - c / f for f, c in zip(sizes['full'], sizes['compact'])]
+    print(f"  {'saved':>8} " + ' '.join(f"{s:>10.1%}" for s in saved))
+    print(f"  compact svgz is {1 - sizes['compact'][1] / sizes['full'][0]:.1%} smaller "
+          f"than the full svg")
+
+
+def bench_parallel(edge_count, worker_counts=None):
+    """Time serial against process-pool emission of one diagram.
+
+    Layout is computed once and excluded; each pool is started and warmed
+    up before it is timed, so the times cover sharing the layout, rendering
+    and joining the fragments.
+    """
+    cores = os.cpu_count() or 1
+    if not worker_counts:
+        worker_counts = sorted({1 << i for i in range(cores.bit_length()) if 1 << i <= cores}
+                               | {cores})
+    nodes, connections, _ = synthetic_spec(edge_count, layer_count=20)
+    layout = compute_layout(nodes, connections)
+    serial = time_call(lambda: ''.join(iter_layout_svg(layout)), repeat=2)
+    print(f"parallel emission of {edge_count} edges on {cores} CPUs:")
+    print(f"  {'workers':>7} {'seconds':>8} {'speedup':>8} {'efficiency':>10}")
+    print(f"  {'serial':>7} {serial:8.3f} {1:7.2f}x")
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            def emit():
+                return ''.join(iter_parallel_svg(layout, workers=workers, executor=pool,
+                                                 min_edges=0))
+            emit()
+            elapsed = time_call(emit, repeat=2)
+        speedup = serial / elapsed
+        print(f"  {workers:>7} {elapsed:8.3f} {speedup:7.2f}x {speedup / workers:9.0%}")
+
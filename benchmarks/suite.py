@@ -0,0 +1,137 @@
+"""Per-stage time and peak memory over synthetic cases, with baselines.
+
+The suite builds synthetic specs for a set of cases (node count, edge
+density, layer count, connector mix, animation ratio) and reports each
+stage separately: parsing, layout, SVG emission (full and compact), the
+whole custom render, Graphviz post-processing and styling, and ``dot``
+itself when it is installed.
+"""
+import json
+import platform
+import shutil
+import time
+
+from bedrock_utils import _iter_diagram_groups, parse_diagram_spec
+from graphviz_layout import index_svg, layout_source, run_dot, style_layout
+from layout import compute_layout
+from svg_renderer import generate_custom_svg, iter_layout_svg
+
+from .synthetic import synthetic_graphviz_svg, synthetic_spec_text
+from .timing import measure
+
+# Cases: node count, edges per node, layers, connector weights (None for
+# all equally likely) and share of animated connections
+QUICK_CASES = [
+    {'name': 'small', 'nodes': 100, 'density': 2, 'layers': 5},
+    {'name': 'medium', 'nodes': 2000, 'density': 2, 'layers': 10},
+    {'name': 'dense', 'nodes': 1000, 'density': 10, 'layers': 5},
+    {'name': 'deep', 'nodes': 5000, 'density': 1, 'layers': 50},
+    {'name': 'curved', 'nodes': 2000, 'density': 2, 'layers': 10,
+     'connectors': {'~~': 1, '~>': 1}},
+    {'name': 'all-animated', 'nodes': 2000, 'density': 2, 'layers': 10, 'animation_ratio': 1.0},
+]
+SUITES = {
+    'quick': QUICK_CASES,
+    'full': QUICK_CASES + [
+        {'name': 'large', 'nodes': 50000, 'density': 2, 'layers': 20},
+        {'name': 'large-dense', 'nodes': 10000, 'density': 20, 'layers': 20},
+    ],
+}
+# dot gets slow quickly, so only small cases run it
+GRAPHVIZ_MAX_EDGES = 2000
+# Timing and memory changes below these are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.002
+MIN_REGRESSION_BYTES = 64 * 1024
+
+
+def case_stages(case, have_dot):
+    """Yield ``(stage, func)`` for one suite case; inputs are built up front"""
+    edge_count = round(case['nodes'] * case['density'])
+    text = synthetic_spec_text(
+        edge_count, case['layers'], node_count=case['nodes'],
+        connectors=case.get('connectors'), animation_ratio=case.get('animation_ratio', 0.1),
+    )
+    nodes, connections, animations = parse_diagram_spec(text)
+    layout = compute_layout(nodes, connections)
+    # The Graphviz renderer takes (source, target) pairs
+    pairs = [connection[:2] for connection in connections]
+    graphviz_svg = synthetic_graphviz_svg(edge_count)
+    indexed = index_svg(graphviz_svg)
+
+    yield 'parse', lambda: parse_diagram_spec(text)
+    yield 'layout', lambda: compute_layout(nodes, connections)
+    yield 'emit', lambda: ''.join(iter_layout_svg(layout, html=False))
+    yield 'emit-compact', lambda: ''.join(iter_layout_svg(layout, html=False,
+                                                          compact=True))
+    yield 'render', lambda: generate_custom_svg(nodes, connections, animations, html=False)
+    yield 'graphviz-post', lambda: index_svg(graphviz_svg)
+    yield 'graphviz-style', lambda: ''.join(
+        _iter_diagram_groups(*style_layout(indexed, pairs, animations)))
+    if have_dot and edge_count <= GRAPHVIZ_MAX_EDGES:
+        # Bypasses the layout cache so dot runs every time
+        source = layout_source(nodes, pairs)
+        yield 'graphviz-dot', lambda: index_svg(run_dot([source])[0])
+
+
+def bench_suite(cases, repeat=3):
+    """Time every stage of every case; returns ``{"case/stage": result}``"""
+    have_dot = shutil.which('dot') is not None
+    if not have_dot:
+        print("dot not found: skipping graphviz-dot stages")
+    results = {}
+    print(f"{'case':<14} {'stage':<15} {'edges':>8} {'ms':>10} {'peak MB':>9}")
+    for case in cases:
+        edge_count = round(case['nodes'] * case['density'])
+        for stage, func in case_stages(case, have_dot):
+            seconds, peak = measure(func, repeat)
+            results[f"{case['name']}/{stage}"] = {
+                'seconds': seconds, 'peak_bytes': peak,
+                'nodes': case['nodes'], 'edges': edge_count,
+            }
+            print(f"{case['name']:<14} {stage:<15} {edge_count:>8} {seconds * 1000:>10.2f} "
+                  f"{peak / 2 ** 20:>9.2f}")
+    return results
+
+
+def save_baseline(path, results):
+    data = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump(data, fp, indent=2, sort_keys=True)
+    print(f"baseline saved to {path}")
+
+
+def compare_baseline(path, results, threshold):
+    """Print changes against a saved baseline; return False on a regression.
+
+    A stage regresses when its time or peak memory exceeds the baseline by
+    more than ``threshold`` (0.25 is 25%) and by more than the noise floor.
+    """
+    with open(path, encoding='utf-8') as fp:
+        baseline = json.load(fp)['results']
+    ok = True
+    print(f"compared with {path} (threshold {threshold:.0%}):")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"  {name:<30} new")
+            continue
+        changes = []
+        for key, floor, unit, factor in (('seconds', MIN_REGRESSION_SECONDS, 'ms', 1000),
+                                         ('peak_bytes', MIN_REGRESSION_BYTES, 'MB', 2 ** -20)):
+            value = result[key]
+            before = base[key]
+            ratio = value / before - 1 if before else 0.0
+            regressed = ratio > threshold and value - before > floor
+            ok = ok and not regressed
+            changes.append(f"{value * factor:9.2f} {unit} ({ratio:+6.1%})"
+                           + (' REGRESSION' if regressed else ''))
+        print(f"  {name:<30} " + '  '.join(changes))
+    for name in sorted(set(baseline) - set(results)):
+        print(f"  {name:<30} not run")
+    return ok
+
@@ -0,0 +1,85 @@
+"""Synthetic specs and Graphviz output for benchmarks and tests"""
+import math
+import random
+
+CONNECTORS = ['~~', '~>', '==', '=>', '--', '->', ' to ', 'to>', '>>']
+
+
+def synthetic_spec(edge_count, layer_count=5, seed=0, node_count=None, connectors=None,
+                   animation_ratio=0.1):
+    """Build parsed (nodes, connections, animations) for a synthetic diagram.
+
+    ``node_count`` defaults to half the edge count; ``connectors`` maps
+    connector to relative weight (default: all equally likely) and
+    ``animation_ratio`` is the share of connections that are animated.
+    """
+    rng = random.Random(seed)
+    if node_count is None:
+        node_count = max(layer_count, edge_count // 2)
+    nodes = [
+        (f'LAYER{i % layer_count + 1}', f'Node{i}')
+        for i in range(node_count)
+    ]
+    if connectors is None:
+        choose = lambda: rng.choice(CONNECTORS)
+    else:
+        names = list(connectors)
+        weights = list(connectors.values())
+        choose = lambda: rng.choices(names, weights)[0]
+    connections = []
+    for _ in range(edge_count):
+        source = rng.randrange(node_count)
+        target = rng.randrange(node_count)
+        connections.append((f'Node{source}', f'Node{target}', choose()))
+    # Evenly spaced, starting with the first connection
+    animations = [
+        (s, t) for i, (s, t, _) in enumerate(connections)
+        if math.floor(i * animation_ratio) > math.floor((i - 1) * animation_ratio)
+    ]
+    return nodes, connections, animations
+
+
+def synthetic_spec_text(edge_count, layer_count=5, seed=0, **options):
+    """Render a synthetic diagram as spec text (options as for ``synthetic_spec``)"""
+    nodes, connections, animations = synthetic_spec(edge_count, layer_count, seed, **options)
+    lines = ['[diagram nodes]']
+    lines.extend(f'{node_type} - {label}' for node_type, label in nodes)
+    lines.append('[diagram connection]')
+    lines.extend(f'{source} {conn.strip()} {target}' for source, target, conn in connections)
+    lines.append('[animation]')
+    lines.extend(f'{source} >> {target}' for source, target in animations)
+    return '\n'.join(lines) + '\n'
+
+
+def synthetic_graphviz_svg(edge_count, seed=0):
+    """Build SVG shaped like ``dot -Tsvg`` output for a synthetic diagram"""
+    rng = random.Random(seed)
+    node_count = max(2, edge_count // 2)
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+        '<svg width="8000pt" height="6000pt" viewBox="0.00 0.00 8000.00 6000.00" '
+        'xmlns="http://www.w3.org/2000/svg">\n'
+        '<g id="graph0" class="graph" transform="scale(1 1) rotate(0) translate(4 5996)">\n'
+        '<title>%3</title>\n'
+        '<polygon fill="transparent" stroke="none" points="-4,4 -4,-5996 7996,-5996 7996,4 -4,4"/>\n'
+    ]
+    for i in range(node_count):
+        x, y = rng.randrange(8000), -rng.randrange(6000)
+        parts.append(
+            f'<!-- Node{i} -->\n<g id="node{i + 1}" class="node"><title>Node{i}</title>\n'
+            f'<path fill="#e3f2fd" stroke="#1976d2" stroke-width="2" '
+            f'd="M{x},{y - 36}C{x},{y - 36} {x + 48},{y - 36} {x + 48},{y - 36}"/>\n'
+            f'<text text-anchor="middle" x="{x + 24}" y="{y - 14.3}" font-family="Arial" '
+            f'font-size="12.00" fill="#1976d2">Node{i}</text>\n</g>\n'
+        )
+    for i in range(edge_count):
+        x, y = rng.randrange(8000), -rng.randrange(6000)
+        parts.append(
+            f'<!-- e{i} -->\n<g id="e{i}" class="edge"><title>e{i}</title>\n'
+            f'<path fill="none" stroke="#4caf50" stroke-width="3" '
+            f'd="M{x},{y}C{x + 20},{y} {x + 30},{y} {x + 40},{y}"/>\n'
+            f'<polygon fill="#4caf50" stroke="#4caf50" stroke-width="3" '
+            f'points="{x + 40},{y - 4} {x + 50},{y} {x + 40},{y + 4} {x + 40},{y - 4}"/>\n</g>\n'
+        )
+    parts.append('</g>\n</svg>\n')
+    return ''.join(parts)
@@ -0,0 +1,50 @@
+"""Timers shared by the benchmark runs"""
+import time
+import tracemalloc
+
+
+def time_call(func, *args, repeat=3):
+    """Return the best wall time of ``repeat`` calls"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(func, repeat, min_time=0.25):
+    """Return ``(best seconds, peak traced bytes)`` for ``func()``.
+
+    Fast stages are repeated until they have run for ``min_time`` seconds
+    so the best time is stable. Memory is traced in a separate call so
+    tracing does not slow the timed ones. Only allocations made by Python
+    and NumPy are seen, not those of subprocesses such as ``dot``.
+    """
+    seconds = float('inf')
+    runs = 0
+    deadline = time.perf_counter() + min_time
+    while runs < repeat or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        func()
+        seconds = min(seconds, time.perf_counter() - start)
+        runs += 1
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def traced(func):
+    """Return ``(result, retained bytes, peak bytes)`` of ``func()``"""
+    tracemalloc.start()
+    try:
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
@@ -0,0 +1,159 @@
+"""Compact graph model shared by the custom SVG and Graphviz renderers.
+
+A parsed spec as plain tuples holds a separate string object for every
+label occurrence and a tuple per node and connection. ``DiagramGraph``
+interns labels, node types and connectors once and keeps the rest as NumPy
+columns:
+
+* nodes (one entry per declaration): ``node_label`` and ``node_type`` ids;
+* connections: ``source``/``target`` label ids, a ``connector`` id and an
+  ``animated`` flag;
+* ``type_layers``: the layer number of every distinct node type (-1 when it
+  is not a ``LAYER<n>`` type), computed once per type.
+
+Labels that only appear in connections are interned too, so a connection
+always has both ends even when a node was not declared.
+"""
+import io
+from collections import defaultdict
+from itertools import chain, count
+from operator import itemgetter
+
+import numpy as np
+
+from bedrock_utils import iter_diagram_spec
+
+
+def layer_number(node_type):
+    """Return the layer number of a ``LAYER<n>`` node type, or None"""
+    if not node_type.startswith('LAYER'):
+        return None
+    digits = ''.join(filter(str.isdigit, node_type))
+    return int(digits) if digits else None
+
+
+class DiagramGraph:
+    """Interned labels and array-backed node and connection columns"""
+
+    __slots__ = (
+        'labels', 'types', 'connectors', 'type_layers',
+        'node_label', 'node_type', 'source', 'target', 'connector', 'animated',
+    )
+
+    @classmethod
+    def from_spec(cls, nodes, connections, animations=()):
+        """Build a graph from parsed ``(nodes, connections, animations)``.
+
+        Connections may be ``(source, target, connector)`` or plain
+        ``(source, target)`` pairs as the Graphviz renderer takes them.
+        """
+        return _build(
+            list(map(itemgetter(0), nodes)), list(map(itemgetter(1), nodes)),
+            list(map(itemgetter(0), connections)), list(map(itemgetter(1), connections)),
+            [connection[2] if len(connection) > 2 else '' for connection in connections],
+            animations,
+        )
+
+    @classmethod
+    def parse(cls, text, rejected=None):
+        """Parse spec text (or any iterable of lines) straight into a graph.
+
+        Same input and ``rejected`` handling as ``parse_diagram_spec``,
+        without keeping a tuple per node and connection.
+        """
+        lines = io.StringIO(text) if isinstance(text, str) else text
+        return cls.from_events(iter_diagram_spec(lines), rejected)
+
+    @classmethod
+    def from_events(cls, events, rejected=None):
+        """Build a graph from ``(kind, lineno, item)`` events as yielded by
+        ``iter_diagram_spec`` or the inventory importers"""
+        node_types, node_labels, sources, targets, connectors, animations = (
+            [], [], [], [], [], [])
+        add_source, add_target, add_connector = sources.append, targets.append, connectors.append
+        for kind, lineno, item in events:
+            if kind == 'connection':
+                add_source(item[0])
+                add_target(item[1])
+                add_connector(item[2])
+            elif kind == 'node':
+                node_types.append(item[0])
+                node_labels.append(item[1])
+            elif kind == 'animation':
+                animations.append(item)
+            elif rejected is not None:
+                rejected.append((lineno, item))
+        return _build(node_types, node_labels, sources, targets, connectors, animations)
+
+    @property
+    def node_count(self):
+        return len(self.node_label)
+
+    @property
+    def edge_count(self):
+        return len(self.source)
+
+    @property
+    def node_layers(self):
+        """Layer number of every node declaration (-1 when not layered)"""
+        return self.type_layers[self.node_type]
+
+    def nodes(self):
+        """The nodes as ``(node_type, label)`` tuples"""
+        labels, types = self.labels, self.types
+        return [(types[t], labels[i])
+                for t, i in zip(self.node_type.tolist(), self.node_label.tolist())]
+
+    def connections(self):
+        """The connections as ``(source, target, connector)`` tuples"""
+        labels, connectors = self.labels, self.connectors
+        return [(labels[s], labels[t], connectors[c]) for s, t, c in zip(
+            self.source.tolist(), self.target.tolist(), self.connector.tolist())]
+
+    def animations(self):
+        """``(source, target)`` of every animated connection, in order"""
+        labels = self.labels
+        return [(labels[s], labels[t]) for s, t in zip(
+            self.source[self.animated].tolist(), self.target[self.animated].tolist())]
+
+
+def _intern(values, size):
+    """Return ``(ids by value, id of each value)``; ids follow first use.
+
+    A defaultdict numbering new keys as they are looked up assigns and
+    reads every id in one C-level pass.
+    """
+    ids = defaultdict(count().__next__)
+    return ids, np.fromiter(map(ids.__getitem__, values), dtype=np.int32, count=size)
+
+
+def _build(node_types, node_labels, sources, targets, connectors, animations):
+    node_count = len(node_labels)
+    edge_count = len(sources)
+    graph = DiagramGraph()
+    label_ids, ids = _intern(chain(node_labels, sources, targets), node_count + 2 * edge_count)
+    graph.node_label = ids[:node_count]
+    graph.source = ids[node_count:node_count + edge_count]
+    graph.target = ids[node_count + edge_count:]
+    type_ids, graph.node_type = _intern(node_types, node_count)
+    connector_ids, graph.connector = _intern(connectors, edge_count)
+    graph.labels = list(label_ids)
+    graph.types = list(type_ids)
+    graph.connectors = list(connector_ids)
+    graph.type_layers = np.array(
+        [-1 if layer is None else layer for layer in map(layer_number, graph.types)],
+        dtype=np.int64)
+
+    # Animations name their ends; pairs that are not connections are ignored
+    animated_pairs = {
+        (label_ids[source], label_ids[target])
+        for source, target in (tuple(animation)[:2] for animation in animations)
+        if source in label_ids and target in label_ids
+    }
+    if animated_pairs:
+        graph.animated = np.fromiter(
+            map(animated_pairs.__contains__, zip(graph.source.tolist(), graph.target.tolist())),
+            dtype=bool, count=edge_count)
+    else:
+        graph.animated = np.zeros(edge_count, dtype=bool)
+    return graph
@@ -0,0 +1,207 @@
+"""Adjacency index and sub-diagram queries over a ``DiagramGraph``.
+
+``AdjacencyIndex`` is built once per parsed spec. It keeps outgoing and
+incoming connections per label, connections per connector and labels sorted
+by layer as CSR-style arrays. Queries then select a sub-diagram without
+scanning the whole graph:
+
+* ``neighborhood(labels, hops)``: everything within ``hops`` connections;
+* ``downstream(labels)`` / ``upstream(labels)``: everything reachable
+  following connections forwards / backwards;
+* ``layer_range(first, last)``: the nodes of a range of layers;
+* ``with_connectors(*connectors)``: connections of the given types.
+
+Every query also takes the ``layers`` and ``connectors`` filters, which
+restrict which nodes and connections a traversal may use. The result is a
+new, smaller ``DiagramGraph`` holding the selected nodes and the
+connections between them, so laying it out and rendering it costs time in
+proportion to the result rather than the full diagram:
+
+    index = AdjacencyIndex(DiagramGraph.parse(spec_text))
+    svg = generate_graph_svg(index.neighborhood(['ALBA'], hops=2))
+"""
+import numpy as np
+
+from graph import DiagramGraph
+
+DIRECTIONS = ('both', 'out', 'in')
+
+
+def _csr(keys, size):
+    """Group item indexes by key: items of key k are ``order[indptr[k]:indptr[k + 1]]``"""
+    order = np.argsort(keys, kind='stable')
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=indptr[1:])
+    return indptr, order
+
+
+def _gather(indptr, order, keys):
+    """Concatenate the groups of ``keys`` without a Python loop"""
+    starts = indptr[keys]
+    lengths = indptr[keys + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=order.dtype)
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.arange(total) - np.repeat(offsets - starts, lengths)
+    return order[positions]
+
+
+class AdjacencyIndex:
+    """Neighbor, connector and layer lookups for one ``DiagramGraph``"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        label_count = len(graph.labels)
+        self.label_ids = {label: i for i, label in enumerate(graph.labels)}
+        self.out_indptr, self.out_edges = _csr(graph.source, label_count)
+        self.in_indptr, self.in_edges = _csr(graph.target, label_count)
+        self.connector_indptr, self.connector_edges = _csr(graph.connector,
+                                                           len(graph.connectors))
+        self.node_indptr, self.node_decls = _csr(graph.node_label, label_count)
+
+        # A label is drawn at its last declaration, so that one sets its layer
+        last = np.full(label_count, -1, dtype=np.int64)
+        np.maximum.at(last, graph.node_label, np.arange(graph.node_count))
+        self.label_layer = np.where(last >= 0, graph.node_layers[last], -1)
+        self.layer_order = np.argsort(self.label_layer, kind='stable')
+        self.sorted_layers = self.label_layer[self.layer_order]
+
+    def neighborhood(self, labels, hops=1, direction='both', **filters):
+        """Nodes within ``hops`` connections of ``labels``"""
+        return self.query(labels, hops, direction, **filters)
+
+    def downstream(self, labels, **filters):
+        """Nodes reachable from ``labels`` following connections forwards"""
+        return self.query(labels, None, 'out', **filters)
+
+    def upstream(self, labels, **filters):
+        """Nodes that reach ``labels`` following connections forwards"""
+        return self.query(labels, None, 'in', **filters)
+
+    def layer_range(self, first=None, last=None, connectors=None):
+        """Nodes in layers ``first``..``last`` (inclusive; None leaves a side open)"""
+        return self.query(layers=(first, last), connectors=connectors)
+
+    def with_connectors(self, *connectors, layers=None):
+        """Connections drawn with any of ``connectors`` and their ends"""
+        return self.query(layers=layers, connectors=connectors)
+
+    def query(self, around=None, hops=None, direction='both', layers=None, connectors=None):
+        """Select a sub-diagram and return it as a ``DiagramGraph``.
+
+        With ``around`` (labels), walks up to ``hops`` connections (None:
+        no limit) in ``direction`` (``both``, ``out`` or ``in``) from them.
+        ``layers`` is a ``(first, last)`` range: nodes outside it are left
+        out and not walked through. ``connectors`` limits the connections
+        that are kept and followed. Without ``around`` the result is the
+        nodes in ``layers``, or the ends of the ``connectors`` connections
+        when only those are given. Connections between selected nodes
+        that pass the connector filter are included.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+        allowed = self._connector_mask(connectors)
+        if around is not None:
+            selected = self._walk(self._label_ids(around), hops, direction, layers, allowed)
+        elif layers is not None:
+            selected = self._layer_labels(*layers)
+        elif connectors is not None:
+            edges = _gather(self.connector_indptr, self.connector_edges,
+                            np.flatnonzero(allowed))
+            selected = np.unique(np.concatenate([self.graph.source[edges],
+                                                 self.graph.target[edges]]))
+        else:
+            selected = np.arange(len(self.graph.labels))
+        return self._subgraph(selected, allowed)
+
+    def _label_ids(self, labels):
+        labels = [labels] if isinstance(labels, str) else labels
+        missing = [label for label in labels if label not in self.label_ids]
+        if missing:
+            raise ValueError(f"Unknown node {missing[0]!r}")
+        return np.unique(np.fromiter((self.label_ids[label] for label in labels),
+                                     dtype=np.int64, count=len(labels)))
+
+    def _connector_mask(self, connectors):
+        """Allowed flag per connector id, or None when all are allowed"""
+        if connectors is None:
+            return None
+        wanted = set(connectors)
+        return np.array([name in wanted for name in self.graph.connectors], dtype=bool)
+
+    def _layer_labels(self, first=None, last=None):
+        """Label ids in a layer range; unlayered labels are never in one"""
+        start = np.searchsorted(self.sorted_layers, max(first or 0, 0), 'left')
+        end = (np.searchsorted(self.sorted_layers, last, 'right') if last is not None
+               else len(self.sorted_layers))
+        return np.sort(self.layer_order[start:end])
+
+    def _in_layers(self, label_ids, layers):
+        if layers is None:
+            return np.ones(len(label_ids), dtype=bool)
+        first, last = layers
+        layer = self.label_layer[label_ids]
+        keep = layer >= max(first or 0, 0)
+        if last is not None:
+            keep &= layer <= last
+        return keep
+
+    def _walk(self, seeds, hops, direction, layers, allowed):
+        """Breadth-first search, one vectorized step per hop"""
+        graph = self.graph
+        seeds = seeds[self._in_layers(seeds, layers)]
+        visited = np.zeros(len(graph.labels), dtype=bool)
+        visited[seeds] = True
+        reached = [seeds]
+        frontier = seeds
+        step = 0
+        while len(frontier) and (hops is None or step < hops):
+            step += 1
+            neighbors = []
+            if direction in ('both', 'out'):
+                edges = _gather(self.out_indptr, self.out_edges, frontier)
+                if allowed is not None:
+                    edges = edges[allowed[graph.connector[edges]]]
+                neighbors.append(graph.target[edges])
+            if direction in ('both', 'in'):
+                edges = _gather(self.in_indptr, self.in_edges, frontier)
+                if allowed is not None:
+                    edges = edges[allowed[graph.connector[edges]]]
+                neighbors.append(graph.source[edges])
+            frontier = np.unique(np.concatenate(neighbors))
+            frontier = frontier[~visited[frontier]]
+            frontier = frontier[self._in_layers(frontier, layers)]
+            visited[frontier] = True
+            reached.append(frontier)
+        return np.sort(np.concatenate(reached))
+
+    def _subgraph(self, selected, allowed):
+        """The graph of ``selected`` labels (sorted ids) and the connections among them"""
+        graph = self.graph
+        member = np.zeros(len(graph.labels), dtype=bool)
+        member[selected] = True
+        edges = _gather(self.out_indptr, self.out_edges, selected)
+        edges = edges[member[graph.target[edges]]]
+        if allowed is not None:
+            edges = edges[allowed[graph.connector[edges]]]
+        # Keep declaration and connection order so the layout matches the full diagram
+        edges.sort()
+        decls = np.sort(_gather(self.node_indptr, self.node_decls, selected))
+
+        sub = DiagramGraph()
+        node_label = graph.node_label[decls]
+        source = graph.source[edges]
+        target = graph.target[edges]
+        used = np.unique(np.concatenate([node_label, source, target]))
+        sub.labels = [graph.labels[i] for i in used.tolist()]
+        sub.node_label = np.searchsorted(used, node_label).astype(np.int32)
+        sub.source = np.searchsorted(used, source).astype(np.int32)
+        sub.target = np.searchsorted(used, target).astype(np.int32)
+        sub.types = graph.types
+        sub.type_layers = graph.type_layers
+        sub.node_type = graph.node_type[decls]
+        sub.connectors = graph.connectors
+        sub.connector = graph.connector[edges]
+        sub.animated = graph.animated[edges]
+        return sub
@@ -0,0 +1,253 @@
+"""Cached Graphviz layouts for the animated diagram renderer.
+
+Where ``dot`` places nodes and routes edges depends only on the graph's
+structure (node names and types, edges). Which edges are animated only
+changes their color. So ``dot`` is run once per distinct structure with
+every edge in the plain edge color and tagged with its index; the output is
+split into elements per edge and cached by a hash of the dot source, and
+animation colors are applied in Python (``style_layout``).
+
+``layout_graphs`` sends every graph missing from the cache to one ``dot``
+process, which lays out a stream of graphs and writes one SVG document per
+graph, instead of forking ``dot`` once per diagram.
+"""
+import os
+import re
+
+import numpy as np
+
+import metrics
+from graph import DiagramGraph
+from render_cache import RenderCache, text_key
+
+EDGE_COLOR = '#4CAF50'
+ANIMATED_EDGE_COLOR = '#FF5722'
+
+# Node appearance by type: (shape, fill, color)
+NODE_SHAPES = {
+    'EC2': ('box', '#E3F2FD', '#1976D2'),
+    'ELB': ('ellipse', '#F1F8E9', '#7CB342'),
+    'RDS': ('cylinder', '#FFEBEE', '#D32F2F'),
+    'S3': ('folder', '#E8F5E9', '#388E3C')
+}
+DEFAULT_NODE_SHAPE = ('box', '#FFFFFF', '#000000')
+
+_SVG_TAG_RE = re.compile(r'<[^>]+>')
+_FILLED_TAG_RE = re.compile(r'<[^>]*fill="(?:none|#)[^>]*>')
+_TRANSFORM_RE = re.compile(r'transform="[^"]+"')
+_EDGE_STROKE_RE = re.compile(r'stroke="#4caf50"', re.IGNORECASE)
+_EDGE_COLOR_RE = re.compile(r'"#4caf50"', re.IGNORECASE)
+_EDGE_GROUP_RE = re.compile(r'<g id="e(\d+)" class="edge">')
+
+layout_cache = RenderCache(
+    maxsize=int(os.environ.get('GRAPHVIZ_LAYOUT_CACHE_SIZE', 256)),
+    cache_dir=os.environ.get('GRAPHVIZ_LAYOUT_CACHE_DIR') or None,
+    disk_maxsize=int(os.environ.get('GRAPHVIZ_LAYOUT_CACHE_DISK_SIZE', 1024)),
+)
+
+
+def layout_source(nodes, connections):
+    """Build the dot source that determines a diagram's layout"""
+    return graph_source(DiagramGraph.from_spec(nodes, connections))
+
+
+def graph_source(graph):
+    """``layout_source`` for a ``DiagramGraph``"""
+    from graphviz import Digraph
+
+    dot = Digraph(engine='dot')
+    dot.attr(
+        rankdir='LR',
+        splines='spline',
+        bgcolor='transparent',
+        nodesep='6',
+        ranksep='6',
+        size='8,6!'
+    )
+
+    labels = graph.labels
+    nodes = graph.nodes()
+    for node_type, node_name in nodes:
+        shape, fill, color = NODE_SHAPES.get(node_type, DEFAULT_NODE_SHAPE)
+        dot.node(node_name, node_name,
+                 shape=shape,
+                 style='filled,rounded',
+                 fillcolor=fill,
+                 color=color,
+                 fontcolor=color,
+                 penwidth='2',
+                 fontname='Arial',
+                 fontsize='12',
+                 margin='0.1')
+
+    # Optionally force a specific node (here LoadBalancerA) to the same rank.
+    if any(node_name == 'LoadBalancerA' for _, node_name in nodes):
+        with dot.subgraph() as s:
+            s.attr(rank='same')
+            s.node('LoadBalancerA')
+
+    # Every edge gets the plain color and its index as id so style_layout
+    # can find and recolor it
+    for i, (source, target) in enumerate(zip(graph.source.tolist(), graph.target.tolist())):
+        dot.edge(labels[source], labels[target],
+                 color=EDGE_COLOR,
+                 penwidth='3',
+                 arrowsize='1.2',
+                 arrowhead='vee',
+                 style='bold',
+                 id=f'e{i}')
+    return dot.source
+
+
+@metrics.timed('graphviz_dot', lambda documents, sources: {'graphs': len(sources)})
+def run_dot(sources):
+    """Render several dot sources to SVG with a single ``dot`` process"""
+    import graphviz
+
+    output = graphviz.pipe_string('dot', 'svg', '\n'.join(sources), encoding='utf-8')
+    documents = [document + '</svg>' for document in output.split('</svg>')[:-1]]
+    if len(documents) != len(sources):
+        raise RuntimeError(f"dot returned {len(documents)} documents for {len(sources)} graphs")
+    return documents
+
+
+def iter_svg_elements(svg_content):
+    """Yield ``(position, unfilled, markup)`` for the shapes of a Graphviz SVG.
+
+    Shapes are tags with ``fill="none"`` (edge paths) or a ``fill="#..."``
+    color (node outlines, arrowheads, labels). Elements with content, such
+    as labels, are yielded whole with their text and closing tag.
+    ``transform`` attributes are dropped so everything uses the document's
+    coordinates.
+    """
+    search = _FILLED_TAG_RE.search
+    match = search(svg_content)
+    while match is not None:
+        tag = match.group()
+        end = match.end()
+        if 'transform="' in tag:
+            tag = _TRANSFORM_RE.sub('', tag)
+
+        if 'fill="none"' in tag:
+            yield match.start(), True, tag
+        elif tag[-2] == '/' or tag[1] in '/!?':
+            yield match.start(), False, tag
+        else:
+            # Keep everything up to the matching end tag
+            # (or the end of a truncated document)
+            depth = 1
+            for inner in _SVG_TAG_RE.finditer(svg_content, match.end()):
+                inner_tag = inner.group()
+                if inner_tag[1] == '/':
+                    depth -= 1
+                elif inner_tag[-2] != '/' and inner_tag[1] not in '!?':
+                    depth += 1
+                if not depth:
+                    end = inner.end()
+                    break
+            else:
+                end = len(svg_content)
+            yield match.start(), False, tag + svg_content[match.end():end]
+        match = search(svg_content, end)
+
+
+def index_svg(svg_content):
+    """Split a layout SVG into ``(unfilled, filled)`` lists of ``(edge, markup)``.
+
+    ``edge`` is the index of the connection an element belongs to, or -1
+    for node elements.
+    """
+    # Edge groups hold no nested groups, so each ends at the next </g>
+    spans = []
+    for match in _EDGE_GROUP_RE.finditer(svg_content):
+        spans.append((match.end(), svg_content.find('</g>', match.end()), int(match.group(1))))
+
+    unfilled = []
+    filled = []
+    span = 0
+    for position, is_unfilled, markup in iter_svg_elements(svg_content):
+        while span < len(spans) and spans[span][1] < position:
+            span += 1
+        edge = -1
+        if span < len(spans) and spans[span][0] <= position:
+            edge = spans[span][2]
+        (unfilled if is_unfilled else filled).append((edge, markup))
+    return unfilled, filled
+
+
+def layout_graphs(graphs):
+    """Lay out graphs, running ``dot`` at most once.
+
+    Each graph is a ``DiagramGraph`` or a ``(nodes, connections)`` pair.
+    Cached layouts are reused; the remaining distinct graphs are rendered
+    together by one ``dot`` process. Returns one layout per graph for
+    ``style_layout``.
+    """
+    keys = []
+    missing = {}
+    layouts = {}
+    for graph in graphs:
+        if not isinstance(graph, DiagramGraph):
+            graph = DiagramGraph.from_spec(*graph)
+        source = graph_source(graph)
+        key = 'graphviz-' + text_key(source)
+        keys.append(key)
+        if key in layouts or key in missing:
+            continue
+        layout = layout_cache.get(key)
+        if layout is None:
+            missing[key] = source
+        else:
+            layouts[key] = layout
+
+    if missing:
+        for key, svg_content in zip(missing, run_dot(list(missing.values()))):
+            layouts[key] = index_svg(svg_content)
+            layout_cache.put(key, layouts[key])
+    return [layouts[key] for key in keys]
+
+
+def layout_graph(nodes, connections):
+    return layout_graphs([(nodes, connections)])[0]
+
+
+def style_graph(layout, graph):
+    """``style_layout`` using a ``DiagramGraph``'s animated flags"""
+    return _style(layout, set(np.flatnonzero(graph.animated).tolist()))
+
+
+def style_layout(layout, connections, animations=None):
+    """Color a cached layout for a set of animated ``(source, target)`` pairs.
+
+    Returns ``(background, animated, nodes)`` lists of markup: every edge
+    path goes to the background group (greyed out when animated), animated
+    edge paths are repeated in the animated group with the gradient mask,
+    and filled shapes (nodes and arrowheads) go to the node group.
+    """
+    animations = {tuple(animation) for animation in animations or ()}
+    animated_edges = {
+        i for i, connection in enumerate(connections)
+        if tuple(connection[:2]) in animations
+    }
+    return _style(layout, animated_edges)
+
+
+def _style(layout, animated_edges):
+    unfilled, filled = layout
+
+    background = []
+    animated = []
+    for edge, markup in unfilled:
+        if edge in animated_edges:
+            background.append(_EDGE_STROKE_RE.sub('stroke="#EDEBEB"', markup))
+            animated.append(_EDGE_STROKE_RE.sub(
+                'stroke="#FB5844" mask="url(#gradient-mask)"', markup))
+        else:
+            background.append(markup)
+
+    node_parts = [
+        _EDGE_COLOR_RE.sub(f'"{ANIMATED_EDGE_COLOR.lower()}"', markup)
+        if edge in animated_edges else markup
+        for edge, markup in filled
+    ]
+    return background, animated, node_parts
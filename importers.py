@@ -0,0 +1,452 @@
+"""Streaming importers for resource inventories in CSV, JSON lines and JSON.
+
+Inventory exports with tens of thousands of resources are read straight into
+the parsed diagram structures instead of being converted to spec text first.
+Each record is one node or one connection:
+
+* a node has a ``type`` (a ``LAYER<n>`` node type, a resource type mapped
+  through ``type_map``, or a numeric ``layer``) and a ``label``;
+* a connection has a ``source`` and a ``target`` label, optionally a
+  ``connector`` (default ``to>``, a plain arrow) and an ``animated`` flag.
+
+Column and key names can be changed with ``fields``. Nodes and connections
+may live in the same file or in separate ones, e.g. a resources CSV and a
+relationships NDJSON file.
+
+Files are memory-mapped and read one record at a time, so memory per record
+stays constant whatever the file size; only the parsed nodes and
+connections are kept. A JSON file may be one large array of records or an
+object whose array members hold the records; arrays are decoded element by
+element. Malformed rows are skipped, logged at debug level to the
+``diagram.import`` logger and reported as rejected; a JSON syntax error ends
+that file since there is no reliable point to resume from.
+
+    python importers.py resources.csv relationships.ndjson -o diagram.svg
+"""
+import argparse
+import codecs
+import csv
+import json
+import logging
+import mmap
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from itertools import chain
+
+import metrics
+from bedrock_utils import collect_diagram_spec
+
+FIELDS = {
+    'type': 'type',
+    'label': 'label',
+    'layer': 'layer',
+    'source': 'source',
+    'target': 'target',
+    'connector': 'connector',
+    'animated': 'animated',
+}
+CONNECTORS = frozenset(('~~', '~>', '==', '=>', '--', '->', '>>', ' to ', 'to>'))
+DEFAULT_CONNECTOR = 'to>'
+FORMATS = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.json': 'json',
+}
+TRUE_VALUES = frozenset(('1', 'true', 'yes', 'y'))
+
+# Largest single JSON record read before the file is treated as malformed
+MAX_JSON_RECORD = 64 * 1024 * 1024
+# A decode error this close to the end of the text read so far may be a
+# token cut off by the chunk boundary; earlier ones are malformed input
+JSON_TOKEN_MARGIN = 32
+# Characters a number can continue with in the next chunk
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+logger = logging.getLogger('diagram.import')
+
+
+@contextmanager
+def map_file(path):
+    """Memory-map a file read-only; empty files yield ``b''``"""
+    with open(path, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            yield mapped
+
+
+def iter_lines(data):
+    """Yield the lines of a mapped file as bytes, line endings included"""
+    if not data:
+        return
+    yield from iter(data.readline, b'')
+
+
+def iter_csv_records(data, delimiter=','):
+    """Yield ``(line_number, record)``; ``record`` is a dict, or an error message"""
+    lines = iter_lines(data)
+    first = next(lines, b'')
+    text_lines = (line.decode('utf-8', errors='replace')
+                  for line in chain([first.removeprefix(codecs.BOM_UTF8)], lines))
+    reader = csv.reader(text_lines, delimiter=delimiter)
+    header = None
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield reader.line_num, f"invalid CSV: {e}"
+            continue
+        if header is None:
+            header = [name.strip() for name in row]
+            continue
+        if not row:
+            continue
+        if len(row) > len(header):
+            yield reader.line_num, f"{len(row)} fields, expected {len(header)}"
+            continue
+        yield reader.line_num, dict(zip(header, row))
+
+
+def iter_ndjson_records(data):
+    """Yield ``(line_number, record)`` for a JSON-lines file"""
+    for lineno, line in enumerate(iter_lines(data), 1):
+        if not line.strip():
+            continue
+        try:
+            yield lineno, json.loads(line)
+        except ValueError as e:
+            yield lineno, f"invalid JSON: {e}"
+
+
+class _JsonReader:
+    """Incremental reader over a mapped JSON document.
+
+    Text is decoded one chunk at a time and values are decoded with
+    ``raw_decode`` from a window that only holds the unread part.
+    """
+
+    def __init__(self, data, chunk_size=1 << 20):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.raw_decode = json.JSONDecoder().raw_decode
+        self.buffer = ''
+        self.pos = 0
+        self.consumed = 0  # characters dropped from the front of the buffer
+        self.eof = False
+
+    def fill(self):
+        """Drop the consumed text and decode the next chunk; False at the end"""
+        if self.eof:
+            return False
+        chunk = self.data[self.offset:self.offset + self.chunk_size]
+        self.offset += len(chunk)
+        self.eof = self.offset >= len(self.data)
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.consumed += self.pos
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ('' at the end)"""
+        while True:
+            buffer = self.buffer
+            pos = self.pos
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            self.pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self.fill():
+                return ''
+
+    def take(self, expected):
+        if self.peek() not in expected:
+            raise ValueError(f"expected {' or '.join(map(repr, expected))} "
+                             f"at character {self.consumed + self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, reading more text while it is incomplete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Only a value cut off by the end of the window can be
+                # completed by reading on; fail on anything else right away
+                cut_off = (e.pos >= len(self.buffer) - JSON_TOKEN_MARGIN
+                           or e.msg.startswith('Unterminated string'))
+                if cut_off and len(self.buffer) - self.pos <= MAX_JSON_RECORD and self.fill():
+                    continue
+                message = "unexpected end of input" if cut_off and self.eof else e.msg
+                raise ValueError(f"{message} at character {self.consumed + e.pos}") from None
+            # A number ending at the window edge may continue in the next chunk
+            if not self.eof and _NUMBER_TAIL.match(self.buffer, end):
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        self.take('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            self.take(',]')
+            if self.buffer[self.pos - 1] == ']':
+                return
+
+
+def iter_json_records(data):
+    """Yield ``(record_number, record)`` from a JSON array, or from every
+    array member of a top-level object"""
+    reader = _JsonReader(data)
+    number = 0
+    try:
+        first = reader.peek()
+        if first == '[':
+            arrays = [reader.iter_array()]
+        elif first == '{':
+            arrays = _iter_member_arrays(reader)
+        elif not first:
+            return
+        else:
+            raise ValueError("expected a JSON array or object")
+        for array in arrays:
+            for record in array:
+                number += 1
+                yield number, record
+    except ValueError as e:
+        yield number + 1, f"invalid JSON: {e}"
+
+
+def _iter_member_arrays(reader):
+    """Yield a record iterator for every array member of an object; other
+    members are skipped"""
+    reader.take('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        reader.value()
+        reader.take(':')
+        if reader.peek() == '[':
+            yield reader.iter_array()
+        else:
+            reader.value()
+        reader.take(',}')
+        if reader.buffer[reader.pos - 1] == '}':
+            return
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def record_events(record, fields=FIELDS, type_map=None, connector=DEFAULT_CONNECTOR):
+    """Turn one record into ``(kind, item)`` pairs; raises ValueError if malformed"""
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+    source = _text(record.get(fields['source']))
+    target = _text(record.get(fields['target']))
+    if source or target:
+        if not (source and target):
+            raise ValueError("connection needs both source and target")
+        name = _text(record.get(fields['connector'])) or connector
+        name = ' to ' if name == 'to' else name
+        if name not in CONNECTORS:
+            raise ValueError(f"unknown connector {name!r}")
+        events = [('connection', (source, target, name))]
+        animated = record.get(fields['animated'])
+        if animated is True or _text(animated).lower() in TRUE_VALUES:
+            events.append(('animation', (source, target)))
+        return events
+
+    label = _text(record.get(fields['label']))
+    node_type = _text(record.get(fields['type']))
+    if type_map and node_type in type_map:
+        node_type = type_map[node_type]
+    if not node_type:
+        layer = _text(record.get(fields['layer']))
+        if layer.isdigit():
+            node_type = f'LAYER{layer}'
+    if not label or not node_type:
+        raise ValueError("node needs a label and a type or layer")
+    return [('node', (node_type, label))]
+
+
+def detect_format(path):
+    return FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def iter_inventory(path, format=None, fields=None, type_map=None, connector=DEFAULT_CONNECTOR,
+                   report=None):
+    """Stream one inventory file as ``(kind, number, item)`` events.
+
+    The events match ``iter_diagram_spec``'s, so they can be collected with
+    ``collect_diagram_spec`` or ``DiagramGraph.from_events``; ``number`` is
+    the line (CSV, NDJSON) or record (JSON) number and rejected items are
+    ``"<file>: <reason>"``. ``format`` is ``csv``, ``tsv``, ``ndjson`` or
+    ``json`` (default: from the extension). Counts, bytes and timings are
+    added to ``report`` when a dict is given.
+    """
+    format = format or detect_format(path)
+    if format not in ('csv', 'tsv', 'ndjson', 'json'):
+        raise ValueError(f"Unknown inventory format for {path!r}; pass format=")
+    fields = dict(FIELDS, **(fields or {}))
+    name = os.path.basename(path)
+    counts = {'records': 0, 'node': 0, 'connection': 0, 'animation': 0, 'rejected': 0}
+    start = time.perf_counter()
+    with map_file(path) as data:
+        if format == 'json':
+            records = iter_json_records(data)
+        elif format == 'ndjson':
+            records = iter_ndjson_records(data)
+        else:
+            records = iter_csv_records(data, '\t' if format == 'tsv' else ',')
+
+        for number, record in records:
+            counts['records'] += 1
+            if isinstance(record, str):
+                events = None
+                reason = record
+            else:
+                try:
+                    events = record_events(record, fields, type_map, connector)
+                except ValueError as e:
+                    events = None
+                    reason = str(e)
+            if events is None:
+                counts['rejected'] += 1
+                logger.debug("%s:%d: %s", name, number, reason)
+                yield 'rejected', number, f"{name}: {reason}"
+                continue
+            for kind, item in events:
+                counts[kind] += 1
+                yield kind, number, item
+        size = len(data)
+
+    seconds = time.perf_counter() - start
+    if counts['rejected']:
+        logger.warning("%s: skipped %d of %d records", name, counts['rejected'], counts['records'])
+    metrics.registry.record('import', seconds, records=counts['records'], nodes=counts['node'],
+                            edges=counts['connection'], rejected=counts['rejected'],
+                            input_bytes=size)
+    if report is not None:
+        for key, value in (('files', 1), ('bytes', size), ('seconds', seconds),
+                           ('records', counts['records']), ('nodes', counts['node']),
+                           ('connections', counts['connection']),
+                           ('animations', counts['animation']),
+                           ('rejected', counts['rejected'])):
+            report[key] = report.get(key, 0) + value
+        elapsed = max(report['seconds'], 1e-9)
+        report['records_per_second'] = report['records'] / elapsed
+        report['mb_per_second'] = report['bytes'] / (1024 * 1024) / elapsed
+
+
+def _iter_inventories(paths, options):
+    paths = [paths] if isinstance(paths, (str, os.PathLike)) else paths
+    for path in paths:
+        yield from iter_inventory(path, **options)
+
+
+def import_inventory(paths, rejected=None, **options):
+    """Import one or more inventory files as ``(nodes, connections, animations)``.
+
+    Takes ``iter_inventory``'s options (including ``report``); rejected
+    records are appended to ``rejected`` as ``(number, "<file>: <reason>")``.
+    """
+    return collect_diagram_spec(_iter_inventories(paths, options), rejected)
+
+
+def import_inventory_graph(paths, rejected=None, **options):
+    """``import_inventory`` straight into a ``DiagramGraph``"""
+    from graph import DiagramGraph
+
+    return DiagramGraph.from_events(_iter_inventories(paths, options), rejected)
+
+
+def iter_spec_lines(nodes, connections, animations):
+    """Yield diagram spec text lines for parsed ``(nodes, connections, animations)``"""
+    yield '[diagram nodes]\n'
+    for node_type, label in nodes:
+        yield f'{node_type} - {label}\n'
+    yield '[diagram connection]\n'
+    for source, target, connector in connections:
+        yield f'{source} {connector.strip()} {target}\n'
+    yield '[animation]\n'
+    for source, target in animations:
+        yield f'{source} >> {target}\n'
+
+
+def _key_value(text):
+    key, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import resource inventories into a diagram.")
+    parser.add_argument('paths', nargs='+', help="CSV, TSV, NDJSON or JSON inventory files")
+    parser.add_argument('-o', '--output',
+                        help="write an SVG (.svg) or a diagram spec (any other extension)")
+    parser.add_argument('--format', choices=('csv', 'tsv', 'ndjson', 'json'),
+                        help="input format (default: from each file's extension)")
+    parser.add_argument('--field', action='append', type=_key_value, default=[],
+                        metavar='NAME=COLUMN',
+                        help=f"column or key for a field ({', '.join(FIELDS)})")
+    parser.add_argument('--type', action='append', type=_key_value, default=[],
+                        metavar='TYPE=NODE_TYPE', dest='types',
+                        help="map a resource type to a node type, e.g. AWS::S3::Bucket=LAYER4")
+    parser.add_argument('--connector', default=DEFAULT_CONNECTOR,
+                        help="connector for connections without one")
+    parser.add_argument('--compact', action='store_true', help="write the compact SVG format")
+    args = parser.parse_args(argv)
+    for name, _ in args.field:
+        if name not in FIELDS:
+            parser.error(f"unknown field {name!r}")
+
+    rejected = []
+    report = {}
+    nodes, connections, animations = import_inventory(
+        args.paths, rejected, format=args.format, fields=dict(args.field),
+        type_map=dict(args.types), connector=args.connector, report=report)
+    for number, reason in rejected[:10]:
+        print(f"skipped record {number} of {reason}", file=sys.stderr)
+    if len(rejected) > 10:
+        print(f"... and {len(rejected) - 10} more", file=sys.stderr)
+    print(f"{report['records']} records from {report['files']} files "
+          f"({report['bytes'] / (1024 * 1024):.1f} MiB) in {report['seconds']:.2f}s: "
+          f"{report['records_per_second']:,.0f} records/s, {report['mb_per_second']:.1f} MiB/s; "
+          f"{report['nodes']} nodes, {report['connections']} connections, "
+          f"{report['animations']} animated, {report['rejected']} rejected")
+
+    if args.output:
+        from bedrock_utils import write_fragments
+
+        with open(args.output, 'w', encoding='utf-8') as out:
+            if args.output.endswith('.svg'):
+                from svg_renderer import write_custom_svg
+                write_custom_svg(out, nodes, connections, animations, html=False,
+                                 compact=args.compact)
+            else:
+                write_fragments(out, iter_spec_lines(nodes, connections, animations))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
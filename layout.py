@@ -0,0 +1,159 @@
+"""Vectorized layout stage for the custom SVG renderer.
+
+Nodes are placed in horizontal tiers by layer number (``LAYER1``,
+``LAYER2``, ... with no upper limit; ``LAYER0`` adds a tier above
+``LAYER1``) and centered on a canvas that grows to
+fit the widest tier and the deepest layer. All coordinates, connection
+endpoints and curve control points are computed as NumPy arrays in one
+batched pass; only the label lookups are per-item Python work.
+"""
+import numpy as np
+
+import metrics
+from graph import DiagramGraph
+
+# Layout configuration
+SVG_WIDTH = 800   # Minimum canvas size
+SVG_HEIGHT = 600
+NODE_WIDTH = 120
+NODE_HEIGHT = 50
+GAP = 50  # Space between tiers
+
+# Layers deeper than this get their own tier; up to it the bottom tier is
+# pinned to the canvas bottom like the original five-layer layout
+MIN_BOTTOM_LAYER = 5
+
+# Connectors drawn as curves with a fixed upward bend
+CURVED_CONNECTORS = frozenset(('~~', '~>'))
+
+
+class Layout:
+    """Node and connection geometry for one diagram.
+
+    ``labels``/``node_types``/``node_x``/``node_y`` describe the drawn nodes
+    in draw order. ``edges`` holds the indexes of the connections that were
+    kept (both ends placed), aligned with the ``connectors`` list and the
+    ``x1``..``ctrl_y`` arrays.
+    """
+
+    __slots__ = (
+        'width', 'height', 'labels', 'node_types', 'node_layers',
+        'node_x', 'node_y', 'edges', 'connectors', 'x1', 'y1', 'x2', 'y2', 'ctrl_x', 'ctrl_y',
+    )
+
+
+def compute_layout(nodes, connections):
+    """Place parsed nodes and route parsed connections.
+
+    A label declared more than once takes the position of its last
+    declaration; every declaration still occupies a slot in its tier.
+    Connections whose ends are not placed are dropped.
+    """
+    return compute_graph_layout(DiagramGraph.from_spec(nodes, connections))
+
+
+@metrics.timed('layout', lambda layout, *args: {'nodes': len(layout.labels),
+                                                  'edges': len(layout.edges)})
+def compute_graph_layout(graph):
+    """``compute_layout`` for a ``DiagramGraph``"""
+    # Layer numbers were resolved once per distinct node type
+    node_layer = graph.node_layers
+
+    # Only LAYER<n> nodes are placed; each placed declaration is a slot
+    placed = np.flatnonzero(node_layer >= 0)
+    slot_layer = node_layer[placed]
+    slot_count = len(slot_layer)
+
+    # Stable sort by layer keeps declaration order within each tier
+    order = np.argsort(slot_layer, kind='stable')
+    sorted_layer = slot_layer[order]
+    tiers, tier_start, tier_count = np.unique(sorted_layer, return_index=True, return_counts=True)
+    tier_of_slot = np.repeat(np.arange(len(tiers)), tier_count)
+    index_in_tier = np.arange(slot_count) - tier_start[tier_of_slot]
+
+    # Tiers are numbered from LAYER1, or from LAYER0 when it is used, so the
+    # top tier always sits one gap below the canvas top
+    top_layer = min(1, int(tiers[0])) if len(tiers) else 1
+    tier_rank = tiers - (top_layer - 1)
+
+    # Size the canvas from the widest tier and the deepest layer
+    tier_width = (NODE_WIDTH + GAP) * tier_count - GAP
+    widest = int(tier_width.max()) if len(tiers) else 0
+    bottom_rank = max(MIN_BOTTOM_LAYER, int(tier_rank[-1]) if len(tiers) else 0)
+    width = max(SVG_WIDTH, widest + 2*GAP)
+    height = max(SVG_HEIGHT, int(GAP*(2*bottom_rank - 1) + NODE_HEIGHT + GAP*1.5))
+
+    tier_y = np.where(
+        tier_rank == bottom_rank,
+        height - NODE_HEIGHT - GAP*1.5,
+        GAP*(2*tier_rank - 1.0),
+    )
+    start_x = (width - tier_width) / 2
+
+    x = np.empty(slot_count)
+    y = np.empty(slot_count)
+    x[order] = start_x[tier_of_slot] + (NODE_WIDTH + GAP) * index_in_tier
+    y[order] = tier_y[tier_of_slot]
+
+    # Drawn nodes: one per label in tier order, at its last declared slot
+    # (dict() keeps the first insertion position and the last value)
+    label_slot = dict(zip(graph.node_label[placed[order]].tolist(), order.tolist()))
+    drawn = np.fromiter(label_slot.values(), dtype=np.int64, count=len(label_slot))
+
+    layout = Layout()
+    layout.width = width
+    layout.height = height
+    layout.labels = [graph.labels[label] for label in label_slot]
+    layout.node_types = [graph.types[node_type]
+                         for node_type in graph.node_type[placed[drawn]].tolist()]
+    layout.node_layers = slot_layer[drawn]
+    layout.node_x = x[drawn]
+    layout.node_y = y[drawn]
+
+    # Resolve connection ends to slots; skip connections to unplaced nodes
+    label_slots = np.full(len(graph.labels), -1, dtype=np.int64)
+    label_slots[np.fromiter(label_slot, dtype=np.int64, count=len(label_slot))] = drawn
+    sources = label_slots[graph.source]
+    targets = label_slots[graph.target]
+    curved_ids = [i for i, name in enumerate(graph.connectors) if name in CURVED_CONNECTORS]
+    kept = np.flatnonzero((sources >= 0) & (targets >= 0))
+    sources = sources[kept]
+    targets = targets[kept]
+    connector = graph.connector[kept]
+    curved = np.isin(connector, curved_ids)
+    layout.edges = kept.tolist()
+    layout.connectors = [graph.connectors[c] for c in connector.tolist()]
+
+    # Downward connections run bottom-to-top, everything else side-to-side
+    vertical = slot_layer[sources] < slot_layer[targets]
+    sx = x[sources]
+    sy = y[sources]
+    tx = x[targets]
+    ty = y[targets]
+    x1 = np.where(vertical, sx + NODE_WIDTH/2, sx + NODE_WIDTH)
+    y1 = np.where(vertical, sy + NODE_HEIGHT, sy + NODE_HEIGHT/2)
+    x2 = np.where(vertical, tx + NODE_WIDTH/2, tx)
+    y2 = np.where(vertical, ty, ty + NODE_HEIGHT/2)
+
+    mid_x = (x1 + x2) / 2
+    mid_y = (y1 + y2) / 2
+    offset = 50
+    curve_intensity = 100
+
+    # Curved connectors bend up by half the drop (clamped to 30..60) when
+    # vertical and to the upper right otherwise; the rest bow away from the
+    # direction of travel
+    curved_vertical = curved & vertical
+    curved_other = curved & ~vertical
+    ctrl_x = np.where(curved_other, mid_x + curve_intensity, mid_x)
+    ctrl_y = np.where(y1 < y2, mid_y + offset, mid_y - offset)
+    ctrl_y = np.where(curved_vertical, mid_y - np.clip((y2 - y1) * 0.5, 30, 60), ctrl_y)
+    ctrl_y = np.where(curved_other, mid_y - (curve_intensity * 0.6), ctrl_y)
+
+    layout.x1 = x1
+    layout.y1 = y1
+    layout.x2 = x2
+    layout.y2 = y2
+    layout.ctrl_x = ctrl_x
+    layout.ctrl_y = ctrl_y
+    return layout
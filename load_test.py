@@ -0,0 +1,149 @@
+"""Load test for the HTTP render service.
+
+Keeps ``--concurrency`` keep-alive connections busy posting specs to a
+running ``render_service.py`` and reports throughput, latency percentiles
+and response codes. Specs are synthetic diagrams from
+``benchmarks.synthetic`` (or the files given with ``--spec``), cycled
+through ``--distinct`` variants so some requests coalesce or hit the
+service cache; ``--distinct 0`` makes every request unique.
+
+    python render_service.py --port 8080 &
+    python load_test.py http://127.0.0.1:8080/render -c 32 -n 2000 --edges 2000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from benchmarks.synthetic import synthetic_spec_text
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection; reconnects when the server closes it"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def post(self, target, body):
+        """Send one POST and return ``(status, response_bytes)``"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f'POST {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+            f'Content-Type: text/plain; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        content = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def run_load(url, bodies, concurrency, requests, duration):
+    """Post ``bodies`` round-robin until ``requests`` are done or ``duration`` runs out.
+
+    Returns ``(latencies, statuses, response_bytes, wall_seconds)``.
+    """
+    parts = urlsplit(url)
+    target = parts.path or '/'
+    if parts.query:
+        target += '?' + parts.query
+    latencies = []
+    statuses = Counter()
+    received = 0
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def client():
+        nonlocal issued, received
+        connection = Connection(parts.hostname, parts.port or 80)
+        try:
+            while issued < requests and (deadline is None or time.perf_counter() < deadline):
+                body = bodies[issued % len(bodies)]
+                issued += 1
+                start = time.perf_counter()
+                try:
+                    status, content = await connection.post(target, body)
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    connection.close()
+                    statuses[type(e).__name__] += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+                received += len(content)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, statuses, received, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the diagram render service.")
+    parser.add_argument('url', nargs='?', default='http://127.0.0.1:8080/render',
+                        help="render endpoint, with any query options")
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-n', '--requests', type=int, default=500)
+    parser.add_argument('-d', '--duration', type=float, default=None,
+                        help="stop after this many seconds even if requests remain")
+    parser.add_argument('--edges', type=int, default=1000,
+                        help="connections per synthetic spec")
+    parser.add_argument('--distinct', type=int, default=8,
+                        help="distinct synthetic specs to cycle through (0: all unique)")
+    parser.add_argument('--spec', action='append', default=[],
+                        help="post this spec file instead of synthetic specs (repeatable)")
+    args = parser.parse_args(argv)
+
+    if args.spec:
+        bodies = []
+        for path in args.spec:
+            with open(path, 'rb') as fp:
+                bodies.append(fp.read())
+    else:
+        variants = args.distinct or args.requests
+        bodies = [synthetic_spec_text(args.edges, seed=seed).encode('utf-8')
+                  for seed in range(variants)]
+
+    latencies, statuses, received, wall = asyncio.run(
+        run_load(args.url, bodies, args.concurrency, args.requests, args.duration))
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    print(f"{len(latencies)} responses in {wall:.2f}s with {args.concurrency} connections: "
+          f"{len(latencies) / wall:.1f} req/s ({ok / wall:.1f} ok/s), "
+          f"{received / (1024 * 1024) / wall:.1f} MiB/s")
+    print("latency ms: " + "  ".join(
+        f"{name} {percentile(latencies, fraction) * 1000:.1f}"
+        for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))))
+    print("responses:  " + "  ".join(f"{status}: {count}"
+                                     for status, count in sorted(statuses.items(), key=str)))
+    return 0 if ok == sum(statuses.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
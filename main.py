@@ -1,8 +1,30 @@
 import streamlit as st
-from bedrock_utils import get_bedrock_credentials, list_available_models, invoke_bedrock_model, parse_diagram_spec, generate_diagram
+from bedrock_utils import get_bedrock_credentials, parse_diagram_spec
+from bedrock_utils import iter_bedrock_text, iter_text_lines
 import streamlit.components.v1 as components
-import re
-import base64
+import os
+import metrics
+import response_cache
+from render_cache import RenderCache, spec_key, text_key
+from svg_renderer import generate_custom_svg
+from incremental import IncrementalRenderer, render_progressively
+
+SPEC_PROMPT = """Describe the following architecture as a diagram spec in exactly this format,
+with no other text:
+
+[diagram nodes]
+LAYER1 - <NodeName>
+LAYER2 - <NodeName>
+...
+[diagram connection]
+<NodeName> ~> <NodeName>
+...
+
+Use LAYER1 for users and higher layers for deeper tiers. Connectors are
+to>, ~>, ->, >>, =>, ~~, == and --. Node names must not contain spaces.
+
+Architecture: {description}
+"""
 
 def main():
     st.title("Interactive Architecture Diagram Generator")
@@ -20,341 +42,226 @@ def main():
     </style>
     """, unsafe_allow_html=True)
 
-    # Node configuration
-    col1, col2 = st.columns(2)
-    with col1:
-        nodes = st.text_area("Diagram Nodes", 
-                           value="[diagram nodes]\n"
-                                 "LAYER1 - UserA\n"
-                                 "LAYER2 - CloudfrontA\n"
-                                 "LAYER2 - ALBA\n"
-                                 "LAYER3 - WebServerA\n"
-                                 "LAYER3 - WebServerB\n"
-                                 "LAYER4 - AppServerA\n"
-                                 "LAYER4 - AppServerB\n"
-                                 "LAYER5 - DBServerA\n"
-                                 "LAYER5 - DBServerB\n",
-                           height=150)
+    # Inputs live in a form so typing does not rerun the script; the
+    # diagram is only re-rendered when the form is submitted
+    with st.form("diagram_spec"):
+        # Node configuration
+        col1, col2 = st.columns(2)
+        with col1:
+            nodes = st.text_area("Diagram Nodes", 
+                               value="[diagram nodes]\n"
+                                     "LAYER1 - UserA\n"
+                                     "LAYER2 - CloudfrontA\n"
+                                     "LAYER2 - ALBA\n"
+                                     "LAYER3 - WebServerA\n"
+                                     "LAYER3 - WebServerB\n"
+                                     "LAYER4 - AppServerA\n"
+                                     "LAYER4 - AppServerB\n"
+                                     "LAYER5 - DBServerA\n"
+                                     "LAYER5 - DBServerB\n",
+                               height=150)
     
-    with col2:
-        connections = st.text_area("Diagram Connections",
-                                 value="[diagram connection]\n"
-                                       "UserA to> CloudfrontA \n"
-                                       "CloudfrontA to> ALBA \n"
-                                       "ALBA ~> WebServerA\n"
-                                       "ALBA ~> WebServerB\n"
-                                       "WebServerA ~> AppServerA\n"
-                                       "WebServerA ~> AppServerB\n"
-                                       "WebServerB ~> AppServerA\n"
-                                       "WebServerB ~> AppServerB\n"
-                                       "AppServerA ~> DBServerA\n"
-                                       "AppServerB >> DBServerB\n",
-                                 height=150)
+        with col2:
+            connections = st.text_area("Diagram Connections",
+                                     value="[diagram connection]\n"
+                                           "UserA to> CloudfrontA \n"
+                                           "CloudfrontA to> ALBA \n"
+                                           "ALBA ~> WebServerA\n"
+                                           "ALBA ~> WebServerB\n"
+                                           "WebServerA ~> AppServerA\n"
+                                           "WebServerA ~> AppServerB\n"
+                                           "WebServerB ~> AppServerA\n"
+                                           "WebServerB ~> AppServerB\n"
+                                           "AppServerA ~> DBServerA\n"
+                                           "AppServerB >> DBServerB\n",
+                                     height=150)
     
-    animations = st.text_area("Animations (Optional)",
-                            value="",
-                            height=100)
+        animations = st.text_area("Animations (Optional)",
+                                value="",
+                                height=100)
+        submitted = st.form_submit_button("Generate Diagram")
 
-    if st.button("Generate Diagram"):
-        # Parse inputs
-        parsed_nodes, parsed_conns, parsed_anims = parse_diagram_spec(
-            nodes + "\n" + connections + "\n" + animations
-        )
-        
-        # Generate SVG
-        svg_content = generate_custom_svg(parsed_nodes, parsed_conns, parsed_anims)
-        
-        # Display
-        st.components.v1.html(svg_content, width=800, height=600)
-        
-        # Download
-        b64 = base64.b64encode(svg_content.encode()).decode()
-        href = f'<a href="data:image/svg+xml;base64,{b64}" download="diagram.svg">Download SVG</a>'
-        st.markdown(href, unsafe_allow_html=True)
+    if submitted:
+        update_diagram(nodes + "\n" + connections + "\n" + animations)
+    if 'diagram' in st.session_state:
+        show_diagram(st.session_state.diagram)
 
-def generate_custom_svg(nodes, connections, animations):
-    # Add color palette
-    CONNECTION_COLORS = [
-        '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEEAD', 
-        '#D4A5A5', '#77CC6D', '#9A94BC', '#FF9F89', '#83E8BA'
-    ]
-    color_index = 0
+    with st.expander("Generate from a description (Bedrock)"):
+        description = st.text_area("Architecture description", height=100)
+        if st.button("Generate with Bedrock") and description:
+            stream_diagram(description)
 
-    # Layout configuration
-    svg_width = 800
-    svg_height = 600
-    node_width = 120
-    node_height = 50
-    gap = 50  # Space between tiers
-    
-    # Group nodes by layer
-    layers = {f'LAYER{i}': [] for i in range(1,6)}
-    for node_type, label in nodes:
-        if node_type.startswith('LAYER'):
-            # Extract layer number correctly (handles "LAYER2" -> "2")
-            layer_num = ''.join(filter(str.isdigit, node_type))
-            layers[f'LAYER{layer_num}'].append(label)
+    if os.environ.get('DIAGRAM_METRICS_PORT'):
+        start_metrics_server(int(os.environ['DIAGRAM_METRICS_PORT']))
+    if metrics.registry.enabled:
+        show_metrics()
 
-    # Update vertical positions
-    layer_positions = {
-        'LAYER1': gap,
-        'LAYER2': gap*3,
-        'LAYER3': gap*5,
-        'LAYER4': gap*7,
-        'LAYER5': svg_height - node_height - gap*1.5  # 600-50-75=475px
-    }
+def show_metrics():
+    # Per-stage timings in the sidebar, drawn last so they include this run
+    with st.sidebar:
+        st.subheader("Pipeline metrics")
+        stages = metrics.registry.snapshot()
+        if not stages:
+            st.caption("No stages recorded yet")
+            return
+        st.table([
+            {
+                'stage': stage,
+                'calls': entry['calls'],
+                'errors': entry['errors'],
+                'last ms': round(entry['last_seconds'] * 1000, 1),
+                'mean ms': round(entry['mean_seconds'] * 1000, 1),
+                'max ms': round(entry['max_seconds'] * 1000, 1),
+                **entry['sizes'],
+            }
+            for stage, entry in sorted(stages.items())
+        ])
+        st.download_button("Download Prometheus metrics", metrics.registry.prometheus_text(),
+                           file_name="diagram_metrics.prom", mime="text/plain")
+        if st.button("Reset metrics"):
+            metrics.registry.reset()
 
-    # Position nodes in their layers
-    node_positions = {}
-    for layer, labels in layers.items():
-        if not labels:
-            continue
-            
-        # Calculate horizontal centering
-        total_width = (node_width + gap) * len(labels) - gap
-        start_x = (svg_width - total_width) / 2
-        
-        for idx, label in enumerate(labels):
-            x = start_x + (node_width + gap) * idx
-            y = layer_positions[layer]
-            node_positions[label] = (x, y)
+@st.cache_resource
+def start_metrics_server(port):
+    # One Prometheus endpoint per process, not one per rerun
+    return metrics.serve(port)
 
-    # Remove LAYER6 from styles
-    layer_styles = {
-        'LAYER1': {'fill': '#FFEBEE', 'stroke': '#D32F2F'},
-        'LAYER2': {'fill': '#E3F2FD', 'stroke': '#2196F3', 'shape': 'rect', 'rx': '15'},
-        'LAYER3': {'fill': '#F1F8E9', 'stroke': '#7CB342', 'shape': 'ellipse'},
-        'LAYER4': {'fill': '#FFF3E0', 'stroke': '#EF6C00'},
-        'LAYER5': {'fill': '#E8F5E9', 'stroke': '#388E3C'}
-    }
+def update_diagram(spec_text):
+    # Keep the rendered page in session state so reruns from other widgets
+    # redraw it without parsing or rendering again
+    key = text_key(spec_text)
+    current = st.session_state.get('diagram')
+    if current is not None and current['key'] == key:
+        return current
 
-    # Build SVG
-    svg = f'''<svg width="{svg_width}" height="{svg_height}" xmlns="http://www.w3.org/2000/svg">
-        <defs>
-            <linearGradient id="gradient">
-                <stop offset="0" stop-color="white" stop-opacity="0"/>
-                <stop offset="0.4" stop-color="white" stop-opacity="1"/>
-                <stop offset="0.6" stop-color="white" stop-opacity="1"/>
-                <stop offset="1" stop-color="white" stop-opacity="0"/>
-            </linearGradient>
-            <mask id="gradient-mask">
-                <rect class="mask-rect" width="200%" height="100%" fill="url(#gradient)">
-                    <animate attributeName="x" 
-                             from="100%" 
-                             to="-100%"
-                             dur="8s" 
-                             repeatCount="indefinite"/>
-                </rect>
-            </mask>
-            <marker id="arrow" markerWidth="10" markerHeight="10" refX="10" refY="3" orient="auto">
-                <path d="M0,0 L0,6 L9,3 z" fill="context-stroke"/>
-            </marker>
-            <style>
-                @keyframes dash {{
-                    to {{ stroke-dashoffset: -20; }}
-                }}
-                .animated-line {{
-                    stroke-dasharray: 5, 5;
-                    animation: dash 1s linear infinite;
-                }}
-            </style>
-        </defs>'''
-    
-    # Connection style configuration
-    CONNECTION_STYLES = {
-        '~~': {'type': 'curved', 'arrow': False, 'dashed': False, 'duration': 8},
-        '~>': {'type': 'curved', 'arrow': True, 'dashed': False, 'duration': 6},
-        '==': {'type': 'straight', 'arrow': False, 'dashed': False, 'duration': 6},
-        '=>': {'type': 'straight', 'arrow': True, 'dashed': False, 'duration': 4},
-        '--': {'type': 'dashed', 'arrow': False, 'dashed': True, 'duration': 2},
-        '->': {'type': 'dashed', 'arrow': True, 'dashed': True, 'duration': 2},
-        ' to ': {'type': 'solid', 'arrow': False, 'dashed': False, 'duration': 0},
-        'to>': {'type': 'solid', 'arrow': True, 'dashed': False, 'duration': 0},
-        '>>': {'type': 'animated', 'arrow': True, 'dashed': True, 'duration': 1}
+    report = {}
+    svg_content = render_spec(spec_text, get_render_cache(), get_incremental_renderer(),
+                              report=report)
+    st.session_state.diagram = {
+        'key': key,
+        'spec': spec_text,
+        'svg': svg_content,
+        'download': None,
+        'report': report,
     }
-    
-    # Draw connections with different animation types
-    for conn in connections:
-        source, target, conn_type = conn
-        
-        # Validate nodes exist
-        source_exists = any(n[1] == source for n in nodes)
-        target_exists = any(n[1] == target for n in nodes)
-        if not source_exists or not target_exists:
-            continue  # Skip invalid connections
-        
-        style = CONNECTION_STYLES.get(conn_type, CONNECTION_STYLES['>>'])
-        
-        # Get node types
-        source_type = next(n[0] for n in nodes if n[1] == source)
-        target_type = next(n[0] for n in nodes if n[1] == target)
-        
-        # Calculate connection points
-        x1, y1 = node_positions[source]
-        x2, y2 = node_positions[target]
-        
-        # Get node styles
-        source_style = layer_styles.get(source_type, {})
-        target_style = layer_styles.get(target_type, {})
-        
-        # Get layer numbers
-        source_layer = int(''.join(filter(str.isdigit, source_type)))
-        target_layer = int(''.join(filter(str.isdigit, target_type)))
+    return st.session_state.diagram
 
-        # Vertical connections
-        if source_layer < target_layer:
-            # Connect from bottom of source to top of target
-            x1 += node_width/2
-            y1 += node_height  # Bottom of source
-            x2 += node_width/2
-            y2 += 0  # Top of target
-        else:
-            # Horizontal connections
-            x1 += node_width  # Right of source
-            y1 += node_height/2
-            x2 += 0  # Left of target
-            y2 += node_height/2
-        
-        # Determine if connection should be animated
-        is_animated = any(
-            (anim_source == source and anim_target == target) or
-            (anim_source == target and anim_target == source)
-            for anim_source, anim_target in animations
-        )
-        
-        # Determine animation style
-        stroke_color = CONNECTION_COLORS[color_index % len(CONNECTION_COLORS)]
-        color_index += 1
-        
-        # Create curved path
-        mid_x = (x1 + x2) / 2
-        mid_y = (y1 + y2) / 2
-        offset = 50
-        
-        # Handle curved connections: for ~~ and ~> we want a fixed upward curve
-        if conn_type in ['~~', '~>']:
-            if source_layer < target_layer:  # Vertical connection
-                delta_y = y2 - y1
-                # Use a relative factor (0.5) but enforce a minimum of 30 and maximum of 60 units offset
-                offset_val = min(max(delta_y * 0.5, 30), 60)
-                ctrl_x = mid_x
-                ctrl_y = mid_y - offset_val
-            else:
-                # For horizontal or upward connections, use the fixed right/up curve
-                curve_intensity = 100
-                ctrl_x = mid_x + curve_intensity
-                ctrl_y = mid_y - (curve_intensity * 0.6)
-        else:
-            # For other connection types, use the original dynamic curve
-            if y1 < y2:
-                ctrl_y = mid_y + offset
-            else:
-                ctrl_y = mid_y - offset
-            ctrl_x = mid_x
-        
-        path_d = f"M {x1} {y1} Q {ctrl_x} {ctrl_y} {x2} {y2}"
+def show_diagram(diagram):
+    components.html(diagram['svg'], width=800, height=600)
+    # The download is the standalone compact SVG, which is much smaller than
+    # the displayed HTML document. It is only rendered when asked for, so
+    # edits render the diagram once, and then kept with the diagram
+    if diagram['download'] is None and st.button("Prepare SVG download"):
+        with metrics.measure('download') as sizes:
+            diagram['download'] = render_spec(diagram['spec'], get_render_cache(),
+                                              compact=True).encode('utf-8')
+            sizes['output_bytes'] = len(diagram['download'])
+    if diagram['download'] is not None:
+        # Served as a file by Streamlit instead of a base64 data: URI in the page
+        st.download_button("Download SVG", diagram['download'], file_name="diagram.svg",
+                           mime="image/svg+xml")
 
-        # Update connection rendering
-        if style['type'] == 'curved':
-            # Draw base layer for curved connections
-            if conn_type in ['~>', '~~', '=>', '==']:
-                svg += f'''
-                <path d="{path_d}" 
-                      stroke="rgba(238, 238, 238, 0.05)" 
-                      stroke-width="2"
-                      fill="none"
-                      {"marker-end='url(#arrow)'" if style['arrow'] else ''}/>'''
+    stats = get_render_cache().stats()
+    st.caption(f"Render cache: {stats['hits']} hits, {stats['misses']} misses, "
+               f"{stats['evictions']} evictions")
+    report = diagram['report']
+    if report.get('animation_slots', 0) > 1:
+        st.caption(f"Animating {report['max_concurrent_animations']} of "
+                   f"{report['animated_connections']} animated connections at a time, "
+                   f"rotating through {report['animation_slots']} groups every "
+                   f"{report['rotate_every']}s")
+    else:
+        st.caption(f"{report.get('animated_connections', 0)} of "
+                   f"{report.get('connections', 0)} connections animated")
 
-            svg += f'''
-            <path d="{path_d}" 
-                  stroke="{stroke_color}" 
-                  stroke-width="3"
-                  fill="none"
-                  {"marker-end='url(#arrow)'" if style['arrow'] else ''}
-                  mask="url(#gradient-mask)">
-                <animate attributeName="stroke-opacity" 
-                         values="0.3;1;0.3" 
-                         dur="{style['duration']}s" 
-                         repeatCount="indefinite"/>
-            </path>'''
-        elif style['type'] == 'straight':
-            # Base layer for straight connections
-            if conn_type in ['=>', '==']:
-                svg += f'''
-                <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
-                      stroke="rgba(238, 238, 238, 0.05)"
-                      stroke-width="2"
-                      {"marker-end='url(#arrow)'" if style['arrow'] else ''}/>'''
+def stream_diagram(description):
+    # Draw the diagram as the model writes the spec instead of waiting for
+    # the whole response
+    credentials = get_bedrock_credentials()
+    model_id = os.environ.get('BEDROCK_MODEL_ID', 'anthropic.claude-3-haiku-20240307-v1:0')
+    placeholder = st.empty()
+    lines = []
 
-            svg += f'''
-            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
-                  stroke="{stroke_color}"
-                  stroke-width="2"
-                  {"marker-end='url(#arrow)'" if style['arrow'] else ''}
-                  mask="url(#gradient-mask)"/>'''
-        elif style['type'] == 'dashed':
-            svg += f'''
-            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
-                  stroke="{stroke_color}"
-                  stroke-width="2"
-                  stroke-dasharray="5,5"
-                  {"marker-end='url(#arrow)'" if style['arrow'] else ''}>
-                <animate attributeName="stroke-dashoffset"
-                         from="0" to="20"
-                         dur="{style['duration']}s"
-                         repeatCount="indefinite"/>
-            </line>'''
-        elif style['type'] == 'solid':
-            svg += f'''
-            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
-                  stroke="{stroke_color}"
-                  stroke-width="2"
-                  {"marker-end='url(#arrow)'" if style['arrow'] else ''}/>'''
-        elif style['type'] == 'animated':
-            svg += f'''
-            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" 
-                  stroke="{stroke_color}"
-                  stroke-width="2" 
-                  stroke-dasharray="5,5"
-                  marker-end="url(#arrow)"
-                  class="animated-line"/>'''
-    
-    # Draw nodes
-    for label, (x, y) in node_positions.items():
-        layer = next(n[0] for n in nodes if n[1] == label)
-        style = layer_styles.get(layer, {})
-        
-        if style.get('shape') == 'ellipse':
-            svg += f'''
-            <ellipse cx="{x + node_width/2}" cy="{y + node_height/2}" 
-                     rx="{node_width/2}" ry="{node_height/2}"
-                     fill="{style['fill']}" stroke="{style['stroke']}" stroke-width="3"/>'''
+    def spec_lines():
+        deltas = iter_bedrock_text(SPEC_PROMPT.format(description=description),
+                                   credentials['aws_access_key_id'],
+                                   credentials['aws_secret_access_key'], model_id)
+        for line in iter_text_lines(deltas):
+            lines.append(line)
+            yield line
+
+    svg_content = None
+    try:
+        for _, _, _, svg_content in render_progressively(spec_lines()):
+            with placeholder.container():
+                components.html(svg_content, width=800, height=600)
+    except Exception as e:
+        st.error(f"Error streaming from Bedrock: {str(e)}")
+    if svg_content is not None:
+        st.code("\n".join(lines))
+
+    stats = response_cache.cache.stats()
+    st.caption(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, "
+               f"{stats['coalesced']} shared calls, {stats['latency_saved']:.1f}s saved")
+
+@st.cache_resource
+def get_render_cache():
+    # Shared across reruns and sessions; set DIAGRAM_CACHE_DIR to keep
+    # entries on disk across restarts
+    return RenderCache(
+        maxsize=int(os.environ.get('DIAGRAM_CACHE_SIZE', 128)),
+        cache_dir=os.environ.get('DIAGRAM_CACHE_DIR') or None,
+        disk_maxsize=int(os.environ.get('DIAGRAM_CACHE_DISK_SIZE', 1024)),
+    )
+
+def get_incremental_renderer():
+    # One renderer per browser session so edits reuse that session's fragments
+    if 'incremental_renderer' not in st.session_state:
+        st.session_state.incremental_renderer = IncrementalRenderer(max_animated=max_animated())
+    return st.session_state.incremental_renderer
+
+def max_animated():
+    # Cap on concurrently animated connections; larger diagrams rotate the
+    # animation through groups of this size. 0 disables the cap.
+    return int(os.environ.get('DIAGRAM_MAX_ANIMATED', 200)) or None
+
+def render_spec(spec_text, cache, renderer=None, compact=False, report=None):
+    """Parse and render a diagram spec through the content-addressed cache.
+
+    On a cache miss the SVG is produced by ``renderer`` (an
+    ``IncrementalRenderer``) when given, so small edits only re-emit the
+    fragments they touch. ``compact=True`` returns the standalone compact
+    SVG document instead of the HTML page. ``report`` (a dict) receives the
+    animation counts of the HTML page.
+    """
+    parsed = cache.get_or_compute(
+        'parse-' + text_key(spec_text),
+        lambda: parse_diagram_spec(spec_text),
+    )
+    if compact:
+        return cache.get_or_compute(
+            'svg-' + spec_key(*parsed, renderer='custom', compact=True,
+                              max_animated=max_animated()),
+            lambda: generate_custom_svg(*parsed, html=False, compact=True,
+                                        max_animated=max_animated()),
+        )
+
+    def render():
+        page_report = {}
+        if renderer is not None:
+            svg = renderer.render(*parsed)
+            page_report = renderer.last_stats['animation']
         else:
-            rx = style.get('rx', '0')
-            svg += f'''
-            <rect x="{x}" y="{y}" width="{node_width}" height="{node_height}"
-                  fill="{style['fill']}" stroke="{style['stroke']}" 
-                  rx="{rx}" stroke-width="3"/>'''
-        
-        # Label
-        svg += f'''
-        <text x="{x + node_width/2}" y="{y + node_height/2 + 5}" 
-              font-size="14" text-anchor="middle" fill="#292929">
-            {label}
-        </text>'''
-    
-    svg += "</svg>"
-    
-    # Wrap in HTML with styles
-    return f'''
-    <html>
-    <body>
-        <div style="width:{svg_width}px; height:{svg_height}px; border:1px solid #ccc; overflow:auto">
-            {svg}
-        </div>
-    </body>
-    </html>
-    '''
+            svg = generate_custom_svg(*parsed, max_animated=max_animated(), report=page_report)
+        return svg, page_report
+
+    svg, page_report = cache.get_or_compute(
+        'page-' + spec_key(*parsed, renderer='custom', max_animated=max_animated()),
+        render,
+    )
+    if report is not None:
+        report.update(page_report)
+    return svg
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,216 @@
+"""Per-stage timing and size metrics for the diagram pipeline.
+
+Stages (parse, layout, SVG rendering, Graphviz, download encoding, Bedrock
+calls) record their duration, sizes such as nodes, edges, output characters
+and streamed tokens, and whether they failed. The totals are available as a
+dict (``registry.snapshot()``, shown in the app's sidebar) and in the
+Prometheus text format (``registry.prometheus_text()``, optionally served
+over HTTP); each record can also be logged as one JSON line.
+
+Recording is off unless ``DIAGRAM_METRICS`` is set (see ``configure``). When it is off the
+``timed`` wrappers only check one flag before calling through.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the duration histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger('diagram.metrics')
+
+
+class MetricsRegistry:
+    """Thread-safe per-stage call counts, durations, errors and size totals"""
+
+    def __init__(self, enabled=False, log=False):
+        self.enabled = enabled
+        self.log = log
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, error=False, **sizes):
+        """Add one call of ``stage``; ``sizes`` are summed per stage"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {
+                    'calls': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                    'last_seconds': 0.0, 'buckets': [0] * len(BUCKETS), 'sizes': {},
+                }
+            entry['calls'] += 1
+            entry['errors'] += bool(error)
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['last_seconds'] = seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+                    break
+            for name, value in sizes.items():
+                entry['sizes'][name] = entry['sizes'].get(name, 0) + value
+        if self.log:
+            logger.info(json.dumps({'event': 'stage', 'stage': stage, 'seconds': round(seconds, 6),
+                                    'error': bool(error), **sizes}))
+
+    def snapshot(self):
+        """Return ``{stage: totals}`` with the mean duration added"""
+        with self._lock:
+            stages = {}
+            for stage, entry in self._stages.items():
+                stages[stage] = dict(entry, buckets=list(entry['buckets']),
+                                     sizes=dict(entry['sizes']),
+                                     mean_seconds=entry['seconds'] / entry['calls'])
+            return stages
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def prometheus_text(self, prefix='diagram'):
+        """Render the totals in the Prometheus text exposition format"""
+        stages = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_stage_seconds Time spent in each pipeline stage.',
+            f'# TYPE {prefix}_stage_seconds histogram',
+        ]
+        for stage, entry in sorted(stages.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, entry['buckets']):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} '
+                             f'{cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} '
+                         f'{entry["calls"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {entry["seconds"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {entry["calls"]}')
+
+        lines.append(f'# HELP {prefix}_stage_errors_total Failed calls of each pipeline stage.')
+        lines.append(f'# TYPE {prefix}_stage_errors_total counter')
+        for stage, entry in sorted(stages.items()):
+            lines.append(f'{prefix}_stage_errors_total{{stage="{stage}"}} {entry["errors"]}')
+
+        lines.append(f'# HELP {prefix}_stage_size_total Items processed by each pipeline stage '
+                     f'(nodes, edges, output size, tokens).')
+        lines.append(f'# TYPE {prefix}_stage_size_total counter')
+        for stage, entry in sorted(stages.items()):
+            for name, value in sorted(entry['sizes'].items()):
+                lines.append(f'{prefix}_stage_size_total{{stage="{stage}",measure="{name}"}} '
+                             f'{value}')
+        return '\n'.join(lines) + '\n'
+
+
+def timed(stage, sizes=None):
+    """Decorator recording each call of a function as ``stage``.
+
+    ``sizes(result, *args, **kwargs)`` returns the sizes to record for a
+    successful call; it is only called while recording is enabled.
+    Exceptions are recorded as errors and re-raised.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                registry.record(stage, time.perf_counter() - start, error=True)
+                raise
+            registry.record(stage, time.perf_counter() - start,
+                            **(sizes(result, *args, **kwargs) if sizes else {}))
+            return result
+        return wrapper
+    return decorate
+
+
+def output_sizes(output, nodes, connections, *args, **kwargs):
+    """``sizes`` for renderers called as ``render(nodes, connections, ...)``"""
+    return {'nodes': len(nodes), 'edges': len(connections), 'output_chars': len(output)}
+
+
+@contextmanager
+def measure(stage):
+    """Record the enclosed block as ``stage``; sizes go in the yielded dict"""
+    if not registry.enabled:
+        yield {}
+        return
+    sizes = {}
+    start = time.perf_counter()
+    try:
+        yield sizes
+    except BaseException:
+        registry.record(stage, time.perf_counter() - start, error=True)
+        raise
+    registry.record(stage, time.perf_counter() - start, **sizes)
+
+
+def serve(port, host=None):
+    """Serve ``/metrics`` in the Prometheus text format from a daemon thread.
+
+    ``host`` defaults to ``bind_host`` (localhost unless configured).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host or bind_host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Process-wide registry used by the instrumented functions
+registry = MetricsRegistry()
+# Address the Prometheus endpoint listens on
+bind_host = '127.0.0.1'
+
+
+def configure(enabled=None, log=None, host=None):
+    """Turn recording and JSON logging on or off.
+
+    Defaults come from ``DIAGRAM_METRICS`` and ``DIAGRAM_METRICS_LOG`` (any
+    value other than empty or 0 enables); setting ``DIAGRAM_METRICS_PORT``
+    for the Prometheus endpoint also enables recording. JSON lines go to
+    the ``diagram.metrics`` logger, which logs to stderr unless the
+    application has configured logging. ``host`` is the address ``serve``
+    binds to, from ``DIAGRAM_METRICS_HOST`` (default 127.0.0.1; set
+    0.0.0.0 to let other machines scrape it).
+    """
+    global bind_host
+    bind_host = host or os.environ.get('DIAGRAM_METRICS_HOST') or '127.0.0.1'
+    if enabled is None:
+        enabled = (os.environ.get('DIAGRAM_METRICS', '') not in ('', '0')
+                   or bool(os.environ.get('DIAGRAM_METRICS_PORT')))
+    if log is None:
+        log = os.environ.get('DIAGRAM_METRICS_LOG', '') not in ('', '0')
+    registry.enabled = enabled or log
+    registry.log = log
+    if log:
+        logger.setLevel(logging.INFO)
+        if not logger.handlers and not logging.getLogger().handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+
+
+configure()
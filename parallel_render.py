@@ -0,0 +1,280 @@
+"""Parallel SVG emission for a single very large diagram.
+
+The layout is computed once in the calling process. Its coordinate arrays,
+connector and node type ids, label text and animation schedule are copied
+into one shared-memory block; worker processes map that block read-only,
+and each task only names a range of connections or nodes, so nothing the
+size of the diagram is pickled per task. Workers return each range's
+fragments as strings and the caller joins them in range order, so the
+document is byte-for-byte the serial one: colors follow each connection's
+position in the whole diagram exactly like ``iter_connection_args``, and
+the animation budget comes from one schedule computed up front.
+
+    svg = generate_parallel_svg(nodes, connections, animations, workers=8)
+
+Diagrams below ``min_edges`` connections are emitted serially, since
+starting the pool and copying the layout would cost more than they save.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import metrics
+import svg_renderer
+from layout import Layout, compute_graph_layout, compute_layout
+
+# Smallest range of connections or nodes worth sending to a worker
+MIN_CHUNK = 4096
+# Diagrams with fewer connections are emitted serially
+MIN_EDGES = 20000
+
+FLOAT_COLUMNS = ('x1', 'y1', 'x2', 'y2', 'ctrl_x', 'ctrl_y', 'node_x', 'node_y')
+
+# Worker side: (block name, SharedMemory, Layout view, animation slots)
+_attached = None
+
+
+class _SharedTable:
+    """Read-only sequence of table entries selected by a shared id array"""
+
+    def __init__(self, ids, table):
+        self.ids = ids
+        self.table = table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        table = self.table
+        return [table[i] for i in self.ids[index].tolist()]
+
+
+class _SharedText:
+    """Read-only sequence of strings stored as UTF-8 bytes and end offsets"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start, stop, _ = index.indices(len(self))
+        offsets = self.offsets[start:max(start, stop) + 1].tolist()
+        base = offsets[0]
+        data = self.data[base:offsets[-1]].tobytes()
+        return [data[begin - base:end - base].decode('utf-8')
+                for begin, end in zip(offsets, offsets[1:])]
+
+
+def _ids(values):
+    """Intern a list of strings as ``(int32 ids, table)``"""
+    table = {}
+    ids = np.fromiter((table.setdefault(value, len(table)) for value in values),
+                      dtype=np.int32, count=len(values))
+    return ids, list(table)
+
+
+def share_layout(layout, slots):
+    """Copy a layout and its animation slots into a new shared-memory block.
+
+    Returns ``(block, spec)``; ``spec`` is the small description workers
+    need to map the block. The caller closes and unlinks the block.
+    """
+    connector_ids, connectors = _ids(layout.connectors)
+    type_ids, node_types = _ids(layout.node_types)
+    encoded = [label.encode('utf-8') for label in layout.labels]
+    label_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
+              out=label_offsets[1:])
+    columns = [(name, np.asarray(getattr(layout, name))) for name in FLOAT_COLUMNS]
+    columns += [
+        ('slots', np.asarray(slots, dtype=np.int32)),
+        ('connector', connector_ids),
+        ('node_type', type_ids),
+        ('label_offsets', label_offsets),
+        ('labels', np.frombuffer(b''.join(encoded), dtype=np.uint8)),
+    ]
+
+    arrays = []
+    size = 0
+    for name, values in columns:
+        arrays.append((name, values.dtype.str, size, len(values)))
+        size += -(-values.nbytes // 8) * 8  # keep every column 8-byte aligned
+    block = shared_memory.SharedMemory(create=True, size=max(size, 8))
+    for (name, dtype, offset, length), (_, values) in zip(arrays, columns):
+        np.ndarray(length, dtype=dtype, buffer=block.buf, offset=offset)[:] = values
+    spec = {'width': layout.width, 'height': layout.height, 'connectors': connectors,
+            'node_types': node_types, 'arrays': arrays}
+    return block, spec
+
+
+def _attach(name, spec):
+    """Map a shared layout in a worker; the last one mapped is reused"""
+    global _attached
+    if _attached is not None and _attached[0] == name:
+        return _attached[2:]
+    if _attached is not None:
+        block = _attached[1]
+        _attached = None
+        try:
+            block.close()
+        except BufferError:
+            pass  # a view is still referenced; the mapping goes with it
+    block = shared_memory.SharedMemory(name=name)
+    columns = {column: np.ndarray(length, dtype=dtype, buffer=block.buf, offset=offset)
+               for column, dtype, offset, length in spec['arrays']}
+    layout = Layout()
+    layout.width = spec['width']
+    layout.height = spec['height']
+    for column in FLOAT_COLUMNS:
+        setattr(layout, column, columns[column])
+    layout.connectors = _SharedTable(columns['connector'], spec['connectors'])
+    layout.node_types = _SharedTable(columns['node_type'], spec['node_types'])
+    layout.labels = _SharedText(columns['label_offsets'], columns['labels'])
+    _attached = (name, block, layout, columns['slots'])
+    return layout, columns['slots']
+
+
+def render_edges(name, spec, start, end, compact, precision, slot_count):
+    """Render connections ``start:end``; runs in a worker process.
+
+    Returns ``(base, fragments, groups)``: the compact base-layer path data,
+    the connections as drawn in place and, over the animation budget, the
+    animated copies for each slot group.
+    """
+    layout, slots = _attach(name, spec)
+    if compact:
+        edge_args, base = svg_renderer._compact_edge_args(layout, precision, start, end)
+        render = svg_renderer._compact_edge
+
+        def render_static(args):
+            return svg_renderer._compact_edge(args, static=True)
+    else:
+        edge_args, base = svg_renderer.iter_connection_args(layout, start, end), ()
+
+        def render(args):
+            return svg_renderer.connection_svg(*args)
+
+        def render_static(args):
+            return svg_renderer.static_connection_svg(*args)
+
+    if slot_count <= 1:
+        return ''.join(base), ''.join(map(render, edge_args)), []
+    fragments = []
+    groups = [[] for _ in range(slot_count)]
+    for args, slot in zip(edge_args, slots[start:end].tolist()):
+        if slot < 0:
+            fragments.append(render(args))
+        else:
+            fragments.append(render_static(args))
+            groups[slot].append(render(args))
+    return ''.join(base), ''.join(fragments), [''.join(group) for group in groups]
+
+
+def render_nodes(name, spec, start, end, compact, precision):
+    """Render nodes ``start:end``; runs in a worker process"""
+    layout, _ = _attach(name, spec)
+    if compact:
+        return ''.join(svg_renderer._iter_compact_nodes(layout, precision, start, end))
+    return ''.join(svg_renderer.node_svg(*args)
+                   for args in svg_renderer.iter_node_args(layout, start, end))
+
+
+def _ranges(count, workers, chunk_size):
+    # About four ranges per worker evens out uneven fragment sizes
+    size = chunk_size or max(MIN_CHUNK, -(-count // (workers * 4)))
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def iter_parallel_svg(layout, html=True, compact=False, precision=1, max_animated=None,
+                      rotate_every=4, report=None, workers=None, chunk_size=None,
+                      executor=None, min_edges=MIN_EDGES):
+    """Yield the same document as ``iter_layout_svg``, emitted by a process pool.
+
+    ``workers`` defaults to the CPU count; pass an ``executor`` (a
+    ``ProcessPoolExecutor``) to reuse one pool across diagrams.
+    ``chunk_size`` overrides the number of connections or nodes per task.
+    ``report`` also receives ``workers`` and ``tasks``.
+    """
+    workers = workers or os.cpu_count() or 1
+    edge_count = len(layout.connectors)
+    if edge_count < min_edges or (workers < 2 and executor is None):
+        yield from svg_renderer.iter_layout_svg(layout, html, compact, precision,
+                                                max_animated, rotate_every, report)
+        if report is not None:
+            report.update(workers=1, tasks=0)
+        return
+
+    slots, slot_count = svg_renderer.schedule_animations(layout.connectors, max_animated)
+    edge_ranges = _ranges(edge_count, workers, chunk_size)
+    node_ranges = _ranges(len(layout.labels), workers, chunk_size)
+    if report is not None:
+        report.update(svg_renderer.animation_report(layout.connectors, slots, slot_count,
+                                                    rotate_every))
+        report.update(workers=workers, tasks=len(edge_ranges) + len(node_ranges))
+
+    block, spec = share_layout(layout, slots)
+    pool = executor or ProcessPoolExecutor(max_workers=workers)
+    try:
+        edge_futures = [pool.submit(render_edges, block.name, spec, start, end, compact,
+                                    precision, slot_count)
+                        for start, end in edge_ranges]
+        node_futures = [pool.submit(render_nodes, block.name, spec, start, end, compact,
+                                    precision)
+                        for start, end in node_ranges]
+
+        if compact:
+            yield svg_renderer._compact_header(layout, html)
+            yield '<g class="e">'
+        else:
+            yield svg_renderer.svg_header(layout.width, layout.height, html)
+        edges = [future.result() for future in edge_futures]
+        base = ''.join(part[0] for part in edges)
+        if base:
+            yield f'<path class="b" d="{base}"/>'
+        for part in edges:
+            yield part[1]
+        if slot_count > 1:
+            yield svg_renderer.slot_style(slot_count, rotate_every)
+            for slot in range(slot_count):
+                yield f'<g class="slot-{slot}">'
+                for part in edges:
+                    yield part[2][slot]
+                yield '</g>'
+        if compact:
+            yield '</g>'
+        del edges
+
+        for future in node_futures:
+            yield future.result()
+        if compact:
+            yield '</svg>'
+            if html:
+                yield '</div></body></html>'
+        else:
+            yield '</svg>'
+            if html:
+                yield svg_renderer.HTML_SUFFIX
+    finally:
+        if executor is None:
+            pool.shutdown(cancel_futures=True)
+        block.close()
+        block.unlink()
+
+
+@metrics.timed('render_parallel', metrics.output_sizes)
+def generate_parallel_svg(nodes, connections, animations, html=True, compact=False, **options):
+    """``generate_custom_svg`` emitted in parallel (options as for ``iter_parallel_svg``)"""
+    return ''.join(iter_parallel_svg(compute_layout(nodes, connections), html, compact,
+                                     **options))
+
+
+@metrics.timed('render_parallel', lambda svg, graph, *args, **kwargs: {
+    'nodes': graph.node_count, 'edges': graph.edge_count, 'output_chars': len(svg)})
+def generate_graph_parallel_svg(graph, html=True, compact=False, **options):
+    """``generate_parallel_svg`` for a ``DiagramGraph``"""
+    return ''.join(iter_parallel_svg(compute_graph_layout(graph), html, compact, **options))
@@ -0,0 +1,184 @@
+"""Content-addressed cache for parsed diagram specs and rendered SVG.
+
+Entries are keyed by a SHA-256 of the normalized input, held in a bounded
+in-memory LRU and optionally mirrored to a directory on disk so they
+survive process (and Streamlit) restarts. Values are stored on disk as one
+JSON file per entry (SVG text, parsed specs, layout indexes); JSON arrays
+come back as tuples. The disk tier is bounded too: past ``disk_maxsize``
+entries, the least recently used files (oldest mtime) are removed.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def text_key(text):
+    """Hash raw spec text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def spec_key(nodes, connections, animations, **options):
+    """Hash a parsed spec and renderer options into a cache key.
+
+    Node and connection order affects layout and colors so it is kept;
+    animations are a set of pairs so they are de-duplicated and sorted.
+    """
+    payload = json.dumps(
+        {
+            'nodes': [list(node) for node in nodes],
+            'connections': [list(conn) for conn in connections],
+            'animations': sorted({tuple(anim) for anim in animations}),
+            'options': options,
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _tuples(value):
+    """Turn the lists of a decoded JSON value back into tuples"""
+    if isinstance(value, list):
+        return tuple(map(_tuples, value))
+    if isinstance(value, dict):
+        return {name: _tuples(item) for name, item in value.items()}
+    return value
+
+
+class RenderCache:
+    """Two-tier LRU cache with hit/miss/eviction counters"""
+
+    def __init__(self, maxsize=128, cache_dir=None, disk_maxsize=1024):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._entries = OrderedDict()
+        self._disk_keys = OrderedDict()  # keys on disk, least recently used first
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self):
+        # Oldest files first so they are evicted first; pickles written by
+        # earlier versions are never read again, so they are removed
+        found = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if name.endswith('.json'):
+                    found.append((os.path.getmtime(path), name[:-5]))
+                elif name.endswith('.pkl'):
+                    os.remove(path)
+            except OSError:
+                pass
+        for _, key in sorted(found):
+            self._disk_keys[key] = None
+        with self._lock:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        # Caller holds the lock
+        while len(self._disk_keys) > self.disk_maxsize:
+            key, _ = self._disk_keys.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self.disk_evictions += 1
+
+    def _store(self, key, value):
+        # Caller holds the lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, encoding='utf-8') as fp:
+                    value = _tuples(json.load(fp))
+                os.utime(path)
+            except (OSError, ValueError):
+                pass
+            else:
+                with self._lock:
+                    self._store(key, value)
+                    self._disk_keys[key] = None
+                    self._disk_keys.move_to_end(key)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+        if self.cache_dir:
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+                    json.dump(value, fp, separators=(',', ':'))
+                os.replace(tmp_path, self._path(key))
+            except (OSError, TypeError, ValueError):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+            with self._lock:
+                self._disk_keys[key] = None
+                self._disk_keys.move_to_end(key)
+                self._evict_disk()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, computing and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Drop the in-memory tier (disk entries are left in place)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'disk_size': len(self._disk_keys),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,391 @@
+"""HTTP render service: POST spec text, get the SVG back.
+
+A plain ASGI application, so it runs under any ASGI server:
+
+    python render_service.py --port 8080 --workers 4
+    uvicorn render_service:app --port 8080
+
+Endpoints:
+
+* ``POST /render`` with the spec text as the body. Query parameters:
+  ``renderer`` (``custom`` or ``graphviz``), ``compact=1`` for the compact
+  SVG format and ``max_animated=N`` (custom renderer only). Responds with a
+  standalone ``image/svg+xml`` document; ``X-Rejected-Lines`` counts spec
+  lines that could not be parsed.
+
+  To render only part of the diagram (see ``graph_query.py``), pass
+  ``around=LABEL`` (repeatable) with ``hops=N`` (default: no limit) and
+  ``direction`` (``both``, ``out`` or ``in``), ``layers=FIRST-LAST``
+  (either side may be left out) and ``connector=C`` (repeatable).
+* ``GET /healthz``: service counters as JSON.
+* ``GET /metrics``: pipeline metrics in the Prometheus text format (see
+  ``metrics.py``; recorded when ``DIAGRAM_METRICS`` is set).
+
+Parsing and rendering run on a bounded process pool so large diagrams do not
+block the event loop. Concurrent requests for the same spec and options
+share one render, and finished renders are kept in a small ``RenderCache``.
+When more distinct renders are pending than the pool has workers plus
+``max_queue``, new ones are turned away with ``429 Too Many Requests``. If a
+worker dies, the pool is replaced and the render retried once before the
+request gets ``503 Service Unavailable``.
+
+Node labels come from the client and are XML-escaped by the renderers, so
+the returned SVG never contains markup from the spec.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs
+
+import metrics
+from render_cache import RenderCache, text_key
+
+RENDERERS = ('custom', 'graphviz')
+MAX_BODY_BYTES = 8 * 1024 * 1024
+RETRY_AFTER_SECONDS = 1
+# Parsed graphs and adjacency indexes kept per worker for focused renders
+INDEX_CACHE_SIZE = 8
+
+_indexes = OrderedDict()
+
+
+class Overloaded(Exception):
+    """Raised when the render queue is full"""
+
+
+class Unavailable(Exception):
+    """Raised when the render pool keeps failing"""
+
+
+def render_text(spec_text, renderer='custom', compact=False, max_animated=None, focus=None):
+    """Parse and render spec text; runs in a worker process.
+
+    ``focus`` holds ``AdjacencyIndex.query`` arguments to render only part
+    of the diagram. Returns ``(svg_bytes, rejected_line_count)``.
+    """
+    if focus:
+        index, rejected_count = load_index(spec_text)
+        graph = index.query(**focus)
+    else:
+        from graph import DiagramGraph
+
+        rejected = []
+        graph = DiagramGraph.parse(spec_text, rejected)
+        rejected_count = len(rejected)
+    if renderer == 'graphviz':
+        from bedrock_utils import generate_graph_diagram
+        svg = generate_graph_diagram(graph)
+    else:
+        from svg_renderer import generate_graph_svg
+        svg = generate_graph_svg(graph, html=False, compact=compact, max_animated=max_animated)
+    return svg.encode('utf-8'), rejected_count
+
+
+def load_index(spec_text):
+    """Return ``(AdjacencyIndex, rejected_line_count)`` for spec text, reusing
+    the index of recently focused specs"""
+    key = text_key(spec_text)
+    if key in _indexes:
+        _indexes.move_to_end(key)
+        return _indexes[key]
+
+    from graph import DiagramGraph
+    from graph_query import AdjacencyIndex
+
+    rejected = []
+    _indexes[key] = AdjacencyIndex(DiagramGraph.parse(spec_text, rejected)), len(rejected)
+    while len(_indexes) > INDEX_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return _indexes[key]
+
+
+def load_worker():
+    """Import the renderers once per worker process, before the first request"""
+    for name in ('bedrock_utils', 'graphviz_layout', 'svg_renderer'):
+        importlib.import_module(name)
+
+
+class RenderService:
+    """Bounded render pool with identical-request coalescing.
+
+    ``pending`` maps a request key to the future of its render; a request
+    whose key is already pending waits on that future instead of queueing
+    another render. The pool is created on first use.
+    """
+
+    def __init__(self, workers=None, max_queue=32, cache_size=128, timeout=60.0,
+                 executor=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.cache = RenderCache(maxsize=cache_size)
+        self.pending = {}
+        self.requests = 0
+        self.rendered = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failed = 0
+        self.pool_restarts = 0
+        self._executor = executor
+
+    @classmethod
+    def from_env(cls):
+        """Build a service from ``RENDER_WORKERS``, ``RENDER_MAX_QUEUE``,
+        ``RENDER_CACHE_SIZE`` and ``RENDER_TIMEOUT``"""
+        return cls(workers=int(os.environ.get('RENDER_WORKERS', 0)) or None,
+                   max_queue=int(os.environ.get('RENDER_MAX_QUEUE', 32)),
+                   cache_size=int(os.environ.get('RENDER_CACHE_SIZE', 128)),
+                   timeout=float(os.environ.get('RENDER_TIMEOUT', 60)))
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 initializer=load_worker)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart_pool(self, broken):
+        """Drop a broken pool so the next render starts a new one"""
+        if self._executor is broken:
+            self.pool_restarts += 1
+            self.shutdown()
+
+    async def render(self, spec_text, renderer='custom', compact=False, max_animated=None,
+                     focus=None):
+        """Return ``(svg_bytes, rejected_line_count)`` for one request.
+
+        Raises ``Overloaded`` when the queue is full,
+        ``asyncio.TimeoutError`` when the render takes longer than
+        ``timeout`` (the render itself keeps going for other waiters) and
+        ``Unavailable`` when the pool broke again after being restarted.
+        """
+        self.requests += 1
+        options = json.dumps([renderer, bool(compact), max_animated, focus], sort_keys=True)
+        key = text_key(options + '\0' + spec_text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        for _ in range(2):
+            future, executor = self.pending.get(key) or (None, None)
+            try:
+                if future is not None:
+                    self.coalesced += 1
+                else:
+                    if len(self.pending) >= self.workers + self.max_queue:
+                        self.rejected += 1
+                        raise Overloaded()
+                    executor = self.executor
+                    future = asyncio.get_running_loop().run_in_executor(
+                        executor, render_text, spec_text, renderer, compact, max_animated, focus)
+                    self.pending[key] = future, executor
+                    future.add_done_callback(lambda done: self._finish(key, done))
+                    self.rendered += 1
+                # Shielded so a waiter timing out does not cancel the shared render
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except BrokenProcessPool:
+                # A worker died (crashed or was killed); start a new pool and retry
+                self._restart_pool(executor)
+        raise Unavailable()
+
+    def _finish(self, key, future):
+        if self.pending.get(key, (None,))[0] is future:
+            del self.pending[key]
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.cache.put(key, future.result())
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'pending': len(self.pending),
+            'requests': self.requests,
+            'rendered': self.rendered,
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'pool_restarts': self.pool_restarts,
+            'cache': self.cache.stats(),
+        }
+
+    async def handle(self, method, path, query, body):
+        """Answer one request; returns ``(status, headers, body_bytes)``"""
+        if path == '/healthz':
+            return 200, [(b'content-type', b'application/json')], \
+                json.dumps(self.stats()).encode('utf-8')
+        if path == '/metrics':
+            return 200, [(b'content-type', b'text/plain; version=0.0.4; charset=utf-8')], \
+                metrics.registry.prometheus_text().encode('utf-8')
+        if path != '/render':
+            return error_response(404, "Not found")
+        if method != 'POST':
+            return error_response(405, "Use POST with the spec text as the body",
+                                  [(b'allow', b'POST')])
+        if len(body) > MAX_BODY_BYTES:
+            return error_response(413, f"Spec is larger than {MAX_BODY_BYTES} bytes")
+
+        params = parse_qs(query)
+        renderer = params.get('renderer', ['custom'])[0]
+        if renderer not in RENDERERS:
+            return error_response(400, f"Unknown renderer {renderer!r}")
+        compact = params.get('compact', ['0'])[0] not in ('', '0', 'false')
+        try:
+            max_animated = int(params['max_animated'][0]) if 'max_animated' in params else None
+            focus = focus_options(params)
+            spec_text = body.decode('utf-8')
+        except ValueError as e:
+            return error_response(400, str(e))
+
+        try:
+            with metrics.measure('service_render') as sizes:
+                svg, rejected = await self.render(spec_text, renderer, compact, max_animated,
+                                                  focus)
+                sizes['output_bytes'] = len(svg)
+        except Overloaded:
+            return error_response(429, "Render queue is full",
+                                  [(b'retry-after', str(RETRY_AFTER_SECONDS).encode())])
+        except Unavailable:
+            return error_response(503, "Render workers are failing",
+                                  [(b'retry-after', str(RETRY_AFTER_SECONDS).encode())])
+        except asyncio.TimeoutError:
+            return error_response(504, f"Render took longer than {self.timeout:g}s")
+        except ValueError as e:
+            # Bad focus arguments, e.g. an unknown node
+            return error_response(400, str(e))
+        except Exception as e:
+            return error_response(500, f"{type(e).__name__}: {e}")
+        return 200, [(b'content-type', b'image/svg+xml'),
+                     (b'x-rejected-lines', str(rejected).encode())], svg
+
+
+def focus_options(params):
+    """``AdjacencyIndex.query`` arguments from query parameters, or None"""
+    focus = {}
+    if 'around' in params:
+        focus['around'] = params['around']
+        focus['hops'] = int(params['hops'][0]) if 'hops' in params else None
+        focus['direction'] = params.get('direction', ['both'])[0]
+    if 'layers' in params:
+        first, dash, last = params['layers'][0].partition('-')
+        if not dash:
+            last = first
+        focus['layers'] = (int(first) if first else None, int(last) if last else None)
+    if 'connector' in params:
+        focus['connectors'] = params['connector']
+    return focus or None
+
+
+def error_response(status, message, headers=()):
+    return status, [(b'content-type', b'text/plain; charset=utf-8'), *headers], \
+        (message + '\n').encode('utf-8')
+
+
+def asgi_app(service):
+    """Wrap a ``RenderService`` in an ASGI application"""
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    service.shutdown()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        # Read the body, giving up early once it is over the limit
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size <= MAX_BODY_BYTES:
+                chunks.append(chunk)
+            more_body = message.get('more_body', False)
+
+        if size > MAX_BODY_BYTES:
+            status, headers, content = error_response(
+                413, f"Spec is larger than {MAX_BODY_BYTES} bytes")
+        else:
+            status, headers, content = await service.handle(
+                scope['method'], scope['path'], scope.get('query_string', b'').decode('latin-1'),
+                b''.join(chunks))
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [*headers, (b'content-length', str(len(content)).encode())]})
+        await send({'type': 'http.response.body', 'body': content})
+
+    app.service = service
+    return app
+
+
+_app = None
+
+
+async def app(scope, receive, send):
+    """ASGI entry point for ``uvicorn render_service:app``.
+
+    The service is built from the environment on the first event, so
+    importing this module starts nothing.
+    """
+    global _app
+    if _app is None:
+        _app = asgi_app(RenderService.from_env())
+    await _app(scope, receive, send)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve diagram rendering over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help="render worker processes (default: CPU count)")
+    parser.add_argument('--max-queue', type=int, default=32,
+                        help="distinct renders allowed to wait for a worker before "
+                             "requests get 429")
+    parser.add_argument('--cache-size', type=int, default=128,
+                        help="rendered SVGs kept in memory")
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help="seconds a request waits for its render before 504")
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("render_service needs an ASGI server: pip install uvicorn")
+
+    service = RenderService(workers=args.workers, max_queue=args.max_queue,
+                            cache_size=args.cache_size, timeout=args.timeout)
+    started = time.perf_counter()
+    try:
+        uvicorn.run(asgi_app(service), host=args.host, port=args.port, log_level='warning')
+    finally:
+        service.shutdown()
+        stats = service.stats()
+        print(f"{stats['requests']} requests in {time.perf_counter() - started:.0f}s: "
+              f"{stats['rendered']} rendered, {stats['coalesced']} coalesced, "
+              f"{stats['cache']['hits']} cached, {stats['rejected']} rejected, "
+              f"{stats['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Prompt -> response cache for Bedrock model calls.
+
+Responses are keyed by a SHA-256 of (model id, normalized prompt,
+max_tokens), held in a bounded LRU and optionally mirrored to one JSON file
+per entry on disk so they survive restarts. Entries can expire after a TTL.
+Concurrent requests for the same key share a single upstream call: the
+first caller computes the response and the others wait for its result.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# _lookup result for an entry that has to be read from disk first
+_UNREAD = object()
+
+
+def normalize_prompt(prompt):
+    """Drop leading/trailing blank space and trailing spaces on each line"""
+    return '\n'.join(line.rstrip() for line in prompt.strip().splitlines())
+
+
+def response_key(model_id, prompt, max_tokens):
+    payload = json.dumps([model_id, normalize_prompt(prompt), max_tokens])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """LRU response cache with optional disk tier, TTL and call coalescing.
+
+    ``maxsize`` bounds the number of entries in memory and on disk;
+    ``ttl`` (seconds, None for no expiry) is measured from when the
+    response was fetched, so it also applies to entries loaded from disk.
+    """
+
+    def __init__(self, maxsize=256, cache_dir=None, ttl=None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evictions = 0
+        self.errors = 0
+        self.latency_saved = 0.0
+        self._entries = OrderedDict()   # key -> entry dict, or None if only on disk
+        self._inflight = {}             # key -> Future of the upstream call
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self):
+        # Oldest files first so they are evicted first; values load lazily
+        found = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                try:
+                    found.append((os.path.getmtime(os.path.join(self.cache_dir, name)), name[:-5]))
+                except OSError:
+                    pass
+        for _, key in sorted(found):
+            self._entries[key] = None
+        self._evict()
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, entry):
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+                json.dump(entry, fp)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _remove(self, key):
+        # Caller holds the lock
+        self._entries.pop(key, None)
+        if self.cache_dir:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _evict(self):
+        # Caller holds the lock
+        while len(self._entries) > self.maxsize:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.time() - entry['created'] >= self.ttl
+
+    def _lookup(self, key, loaded=_UNREAD):
+        """Return a live entry or None, counting hits; caller holds the lock.
+
+        An entry that is only on disk gives ``_UNREAD``: the caller reads it
+        with ``_read`` after releasing the lock and looks again, passing the
+        result as ``loaded``.
+        """
+        if key not in self._entries:
+            return None
+        entry = self._entries[key]
+        from_disk = entry is None
+        if from_disk:
+            if loaded is _UNREAD:
+                return _UNREAD
+            if loaded is None:
+                self._entries.pop(key)
+                return None
+            entry = self._entries[key] = loaded
+        if self._expired(entry):
+            self._remove(key)
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.disk_hits += from_disk
+        self.latency_saved += entry['latency']
+        return entry
+
+    def get(self, key):
+        """Return the cached response text for ``key``, or None"""
+        with self._lock:
+            entry = self._lookup(key)
+        if entry is _UNREAD:
+            loaded = self._read(key)
+            with self._lock:
+                entry = self._lookup(key, loaded)
+        return None if entry is None else entry['text']
+
+    def put(self, key, text, latency=0.0):
+        entry = {'text': text, 'created': time.time(), 'latency': latency}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+        if self.cache_dir:
+            self._write(key, entry)
+
+    def get_or_compute(self, key, compute):
+        """Return the response for ``key``, calling ``compute()`` at most once.
+
+        Callers that arrive while another call for the same key is running
+        wait for it and share its result (or exception). Exceptions are not
+        cached.
+        """
+        loaded = _UNREAD
+        while True:
+            with self._lock:
+                entry = self._lookup(key, loaded)
+                if entry is None:
+                    future = self._inflight.get(key)
+                    if future is None:
+                        future = self._inflight[key] = Future()
+                        owner = True
+                        self.misses += 1
+                    else:
+                        owner = False
+                        self.coalesced += 1
+                    break
+            if entry is not _UNREAD:
+                return entry['text']
+            loaded = self._read(key)
+
+        if not owner:
+            return future.result()
+
+        start = time.perf_counter()
+        try:
+            text = compute()
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        self.put(key, text, time.perf_counter() - start)
+        with self._lock:
+            del self._inflight[key]
+        future.set_result(text)
+        return text
+
+    def clear(self):
+        """Drop every entry, including the ones on disk"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'errors': self.errors,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'upstream_calls_saved': self.hits + self.coalesced,
+                'latency_saved': self.latency_saved,
+            }
+
+
+# Process-wide instance used by bedrock_utils
+cache = None
+
+
+def configure(maxsize=None, cache_dir=None, ttl=None):
+    """(Re)create the shared cache.
+
+    Defaults come from ``BEDROCK_CACHE_SIZE`` (256 entries),
+    ``BEDROCK_CACHE_DIR`` (memory only when unset) and ``BEDROCK_CACHE_TTL``
+    (seconds; no expiry when unset).
+    """
+    global cache
+    if maxsize is None:
+        maxsize = int(os.environ.get('BEDROCK_CACHE_SIZE', 256))
+    if cache_dir is None:
+        cache_dir = os.environ.get('BEDROCK_CACHE_DIR') or None
+    if ttl is None and os.environ.get('BEDROCK_CACHE_TTL'):
+        ttl = float(os.environ['BEDROCK_CACHE_TTL'])
+    cache = ResponseCache(maxsize=maxsize, cache_dir=cache_dir, ttl=ttl)
+
+
+configure()
@@ -0,0 +1,596 @@
+"""Custom SVG renderer for parsed diagram specs.
+
+This is the rendering core used by the Streamlit app, the batch renderer
+and the incremental renderer. It has no Streamlit or boto3 dependency so it
+stays quick to import in workers and command-line tools.
+
+``compact=True`` renders the same diagram with shared CSS classes instead of
+per-element attributes, ``<use>`` references to one shape per layer style,
+CSS animations instead of a SMIL ``<animate>`` per edge, rounded
+coordinates and a single path for all faint base layers.
+"""
+import gzip
+from xml.sax.saxutils import escape
+
+import metrics
+from bedrock_utils import write_fragments
+from graph import layer_number
+from layout import (
+    SVG_WIDTH, SVG_HEIGHT, NODE_WIDTH, NODE_HEIGHT, compute_graph_layout, compute_layout,
+)
+
+# Add color palette
+CONNECTION_COLORS = [
+    '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEEAD', 
+    '#D4A5A5', '#77CC6D', '#9A94BC', '#FF9F89', '#83E8BA'
+]
+
+# Layer styles; deeper layers reuse them in order (LAYER6 looks like LAYER1)
+LAYER_STYLES = {
+    'LAYER1': {'fill': '#FFEBEE', 'stroke': '#D32F2F'},
+    'LAYER2': {'fill': '#E3F2FD', 'stroke': '#2196F3', 'shape': 'rect', 'rx': '15'},
+    'LAYER3': {'fill': '#F1F8E9', 'stroke': '#7CB342', 'shape': 'ellipse'},
+    'LAYER4': {'fill': '#FFF3E0', 'stroke': '#EF6C00'},
+    'LAYER5': {'fill': '#E8F5E9', 'stroke': '#388E3C'}
+}
+
+# Connection style configuration
+CONNECTION_STYLES = {
+    '~~': {'type': 'curved', 'arrow': False, 'dashed': False, 'duration': 8},
+    '~>': {'type': 'curved', 'arrow': True, 'dashed': False, 'duration': 6},
+    '==': {'type': 'straight', 'arrow': False, 'dashed': False, 'duration': 6},
+    '=>': {'type': 'straight', 'arrow': True, 'dashed': False, 'duration': 4},
+    '--': {'type': 'dashed', 'arrow': False, 'dashed': True, 'duration': 2},
+    '->': {'type': 'dashed', 'arrow': True, 'dashed': True, 'duration': 2},
+    ' to ': {'type': 'solid', 'arrow': False, 'dashed': False, 'duration': 0},
+    'to>': {'type': 'solid', 'arrow': True, 'dashed': False, 'duration': 0},
+    '>>': {'type': 'animated', 'arrow': True, 'dashed': True, 'duration': 1}
+}
+
+SVG_DEFS = '''
+        <defs>
+            <linearGradient id="gradient">
+                <stop offset="0" stop-color="white" stop-opacity="0"/>
+                <stop offset="0.4" stop-color="white" stop-opacity="1"/>
+                <stop offset="0.6" stop-color="white" stop-opacity="1"/>
+                <stop offset="1" stop-color="white" stop-opacity="0"/>
+            </linearGradient>
+            <mask id="gradient-mask">
+                <rect class="mask-rect" width="200%" height="100%" fill="url(#gradient)">
+                    <animate attributeName="x" 
+                             from="100%" 
+                             to="-100%"
+                             dur="8s" 
+                             repeatCount="indefinite"/>
+                </rect>
+            </mask>
+            <marker id="arrow" markerWidth="10" markerHeight="10" refX="10" refY="3" orient="auto">
+                <path d="M0,0 L0,6 L9,3 z" fill="context-stroke"/>
+            </marker>
+            <style>
+                @keyframes dash {
+                    to { stroke-dashoffset: -20; }
+                }
+                .animated-line {
+                    stroke-dasharray: 5, 5;
+                    animation: dash 1s linear infinite;
+                }
+            </style>
+        </defs>'''
+
+HTML_SUFFIX = '''
+        </div>
+    </body>
+    </html>
+    '''
+
+
+def svg_header(width, height, html=True):
+    """Open the SVG document, including ``<defs>``.
+
+    With ``html`` the document is wrapped in a page whose div is capped at
+    the default canvas size and scrolls when the diagram is larger.
+    """
+    svg = f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" xmlns="http://www.w3.org/2000/svg">' + SVG_DEFS
+    if not html:
+        return svg
+    return f'''
+    <html>
+    <body>
+        <div style="width:{min(width, SVG_WIDTH)}px; height:{min(height, SVG_HEIGHT)}px; border:1px solid #ccc; overflow:auto">
+            ''' + svg
+
+
+def layer_style_name(node_type):
+    """Return the ``LAYER_STYLES`` key used for a node type, or None"""
+    if node_type in LAYER_STYLES:
+        return node_type
+    layer = layer_number(node_type)
+    if layer is None:
+        return None
+    return f'LAYER{(layer - 1) % len(LAYER_STYLES) + 1}'
+
+
+def layer_style(node_type):
+    """Return the fill/stroke/shape style for a node type"""
+    name = layer_style_name(node_type)
+    return LAYER_STYLES[name] if name else {}
+
+
+def connection_svg(conn_type, x1, y1, x2, y2, ctrl_x, ctrl_y, stroke_color):
+    """Render the SVG fragment for one routed connection"""
+    style = CONNECTION_STYLES.get(conn_type, CONNECTION_STYLES['>>'])
+    path_d = f"M {x1} {y1} Q {ctrl_x} {ctrl_y} {x2} {y2}"
+
+    # Update connection rendering
+    svg = ''
+    if style['type'] == 'curved':
+        # Draw base layer for curved connections
+        if conn_type in ['~>', '~~', '=>', '==']:
+            svg += f'''
+                <path d="{path_d}" 
+                      stroke="rgba(238, 238, 238, 0.05)" 
+                      stroke-width="2"
+                      fill="none"
+                      {"marker-end='url(#arrow)'" if style['arrow'] else ''}/>'''
+
+        svg += f'''
+            <path d="{path_d}" 
+                  stroke="{stroke_color}" 
+                  stroke-width="3"
+                  fill="none"
+                  {"marker-end='url(#arrow)'" if style['arrow'] else ''}
+                  mask="url(#gradient-mask)">
+                <animate attributeName="stroke-opacity" 
+                         values="0.3;1;0.3" 
+                         dur="{style['duration']}s" 
+                         repeatCount="indefinite"/>
+            </path>'''
+    elif style['type'] == 'straight':
+        # Base layer for straight connections
+        if conn_type in ['=>', '==']:
+            svg += f'''
+                <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
+                      stroke="rgba(238, 238, 238, 0.05)"
+                      stroke-width="2"
+                      {"marker-end='url(#arrow)'" if style['arrow'] else ''}/>'''
+
+        svg += f'''
+            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
+                  stroke="{stroke_color}"
+                  stroke-width="2"
+                  {"marker-end='url(#arrow)'" if style['arrow'] else ''}
+                  mask="url(#gradient-mask)"/>'''
+    elif style['type'] == 'dashed':
+        svg += f'''
+            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
+                  stroke="{stroke_color}"
+                  stroke-width="2"
+                  stroke-dasharray="5,5"
+                  {"marker-end='url(#arrow)'" if style['arrow'] else ''}>
+                <animate attributeName="stroke-dashoffset"
+                         from="0" to="20"
+                         dur="{style['duration']}s"
+                         repeatCount="indefinite"/>
+            </line>'''
+    elif style['type'] == 'solid':
+        svg += f'''
+            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
+                  stroke="{stroke_color}"
+                  stroke-width="2"
+                  {"marker-end='url(#arrow)'" if style['arrow'] else ''}/>'''
+    elif style['type'] == 'animated':
+        svg += f'''
+            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" 
+                  stroke="{stroke_color}"
+                  stroke-width="2" 
+                  stroke-dasharray="5,5"
+                  marker-end="url(#arrow)"
+                  class="animated-line"/>'''
+    return svg
+
+
+def static_connection_svg(conn_type, x1, y1, x2, y2, ctrl_x, ctrl_y, stroke_color):
+    """Render a dimmed, unanimated copy of a connection.
+
+    Used under the animated copy when the animation budget is exceeded, so
+    connections stay visible while it is not their turn to animate.
+    """
+    style = CONNECTION_STYLES.get(conn_type, CONNECTION_STYLES['>>'])
+    marker = "marker-end='url(#arrow)'" if style['arrow'] else ''
+    if style['type'] == 'curved':
+        return f'''
+            <path d="M {x1} {y1} Q {ctrl_x} {ctrl_y} {x2} {y2}"
+                  stroke="{stroke_color}" stroke-opacity="0.3" stroke-width="3" fill="none" {marker}/>'''
+    dash = ' stroke-dasharray="5,5"' if style['dashed'] else ''
+    return f'''
+            <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"
+                  stroke="{stroke_color}" stroke-opacity="0.3" stroke-width="2"{dash} {marker}/>'''
+
+
+# Connection types that animate, through SMIL, CSS or the animated mask
+ANIMATED_TYPES = frozenset(('curved', 'straight', 'dashed', 'animated'))
+
+
+def connection_type(conn_type):
+    return CONNECTION_STYLES.get(conn_type, CONNECTION_STYLES['>>'])['type']
+
+
+def schedule_animations(conn_types, max_animated=None):
+    """Spread animated connections over rotating animation slots.
+
+    Returns ``(slots, slot_count)`` where ``slots[i]`` is the slot of the
+    i-th connection, or -1 if it never animates. With ``max_animated``
+    set and exceeded, animated connections are dealt round-robin into
+    enough slots that no slot holds more than ``max_animated``; otherwise
+    everything is in slot 0.
+    """
+    slots = []
+    animated = 0
+    for conn_type in conn_types:
+        if connection_type(conn_type) in ANIMATED_TYPES:
+            slots.append(animated)
+            animated += 1
+        else:
+            slots.append(-1)
+    if max_animated is None or animated <= max_animated:
+        return [min(slot, 0) for slot in slots], 1 if animated else 0
+    slot_count = -(-animated // max(1, max_animated))
+    return [slot % slot_count if slot >= 0 else -1 for slot in slots], slot_count
+
+
+def slot_style(slot_count, rotate_every):
+    """CSS that shows one slot group at a time, each for ``rotate_every`` seconds"""
+    cycle = slot_count * rotate_every
+    css = [
+        f'g[class^="slot-"]{{animation:slots {cycle:g}s step-end infinite}}',
+        f'@keyframes slots{{0%{{visibility:visible}}{100 / slot_count:.4g}%,100%{{visibility:hidden}}}}',
+    ]
+    # Negative delays start slot k's cycle so it is visible from k * rotate_every.
+    # g.slot-N matches the specificity of the rule above and comes after it,
+    # so the delay is not reset by that rule's animation shorthand
+    css.extend(
+        f'g.slot-{slot}{{animation-delay:-{(slot_count - slot) % slot_count * rotate_every:g}s}}'
+        for slot in range(1, slot_count)
+    )
+    return '<style>' + ''.join(css) + '</style>'
+
+
+def animation_report(conn_types, slots, slot_count, rotate_every):
+    """Animation counts for ``report`` dicts, from ``schedule_animations`` output"""
+    animated = sum(slot >= 0 for slot in slots)
+    kinds = {}
+    for conn_type in conn_types:
+        kind = connection_type(conn_type)
+        kinds[kind] = kinds.get(kind, 0) + 1
+    return {
+        'connections': len(conn_types),
+        'animated_connections': animated,
+        'animation_slots': slot_count,
+        'max_concurrent_animations': -(-animated // slot_count) if slot_count else 0,
+        'rotate_every': rotate_every if slot_count > 1 else None,
+        'connection_types': kinds,
+    }
+
+
+def iter_scheduled_connections(edge_args, render, render_static, max_animated=None,
+                               rotate_every=4, report=None):
+    """Yield connection fragments under an animation budget.
+
+    ``render(args)`` and ``render_static(args)`` produce the animated and
+    dimmed fragments for one connection's arguments (connector first).
+    Within budget every connection is rendered as usual. Over budget, every
+    animated connection is drawn dimmed and its animated copy is placed in
+    one of the rotating slot groups, so at most ``max_animated`` animated
+    elements are visible (and painted) at any time. ``report`` (a dict) is
+    updated with the animation counts.
+    """
+    edge_args = list(edge_args)
+    conn_types = [args[0] for args in edge_args]
+    slots, slot_count = schedule_animations(conn_types, max_animated)
+    if report is not None:
+        report.update(animation_report(conn_types, slots, slot_count, rotate_every))
+
+    if slot_count <= 1:
+        for args in edge_args:
+            yield render(args)
+        return
+
+    groups = [[] for _ in range(slot_count)]
+    for args, slot in zip(edge_args, slots):
+        if slot < 0:
+            yield render(args)
+        else:
+            yield render_static(args)
+            groups[slot].append(args)
+
+    yield slot_style(slot_count, rotate_every)
+    for slot, group in enumerate(groups):
+        yield f'<g class="slot-{slot}">'
+        for args in group:
+            yield render(args)
+        yield '</g>'
+
+
+def node_svg(label, x, y, node_type):
+    """Render the SVG fragment (shape and label) for one node"""
+    style = layer_style(node_type)
+    
+    if style.get('shape') == 'ellipse':
+        svg = f'''
+            <ellipse cx="{x + NODE_WIDTH/2}" cy="{y + NODE_HEIGHT/2}" 
+                     rx="{NODE_WIDTH/2}" ry="{NODE_HEIGHT/2}"
+                     fill="{style['fill']}" stroke="{style['stroke']}" stroke-width="3"/>'''
+    else:
+        rx = style.get('rx', '0')
+        svg = f'''
+            <rect x="{x}" y="{y}" width="{NODE_WIDTH}" height="{NODE_HEIGHT}"
+                  fill="{style['fill']}" stroke="{style['stroke']}" 
+                  rx="{rx}" stroke-width="3"/>'''
+    
+    # Label
+    svg += f'''
+        <text x="{x + NODE_WIDTH/2}" y="{y + NODE_HEIGHT/2 + 5}" 
+              font-size="14" text-anchor="middle" fill="#292929">
+            {escape(label)}
+        </text>'''
+    return svg
+
+
+def iter_connection_args(layout, start=0, end=None):
+    """Yield ``connection_svg`` arguments for every kept connection, in order.
+
+    ``start``/``end`` select a range of connections; colors still follow
+    each connection's position in the whole diagram.
+    """
+    edges = slice(start, end)
+    geometry = zip(
+        layout.x1[edges].tolist(), layout.y1[edges].tolist(), layout.x2[edges].tolist(),
+        layout.y2[edges].tolist(), layout.ctrl_x[edges].tolist(), layout.ctrl_y[edges].tolist(),
+    )
+    for color_index, (conn_type, points) in enumerate(
+            zip(layout.connectors[edges], geometry), start):
+        stroke_color = CONNECTION_COLORS[color_index % len(CONNECTION_COLORS)]
+        yield (conn_type,) + points + (stroke_color,)
+
+
+def iter_node_args(layout, start=0, end=None):
+    """Yield ``node_svg`` arguments for every drawn node (or a range of them), in order"""
+    nodes = slice(start, end)
+    return zip(layout.labels[nodes], layout.node_x[nodes].tolist(),
+               layout.node_y[nodes].tolist(), layout.node_types[nodes])
+
+
+def iter_custom_svg(nodes, connections, animations, html=True, compact=False, precision=1,
+                    max_animated=None, rotate_every=4, report=None):
+    """Yield the diagram HTML/SVG document as fragments, in document order.
+
+    Fragments are the HTML wrapper and ``<defs>`` block, one fragment per
+    connection and one per node, so callers can forward them as they are
+    produced instead of holding the whole document in memory. Pass
+    ``html=False`` for a standalone SVG document and ``compact=True`` for
+    the compact format, with coordinates rounded to ``precision`` decimals.
+    ``max_animated`` caps the number of concurrently animated connections
+    (see ``iter_scheduled_connections``); ``report`` (a dict) receives the
+    animation counts.
+    """
+    yield from iter_layout_svg(compute_layout(nodes, connections), html, compact,
+                               precision, max_animated, rotate_every, report)
+
+
+def iter_layout_svg(layout, html=True, compact=False, precision=1,
+                    max_animated=None, rotate_every=4, report=None):
+    """Yield the document for an already computed ``layout``.
+
+    This is the emission stage of ``iter_custom_svg``; the options are the
+    same.
+    """
+    if compact:
+        yield from _iter_compact_svg(layout, html, precision,
+                                     max_animated, rotate_every, report)
+        return
+
+    yield svg_header(layout.width, layout.height, html)
+
+    # Draw connections with different animation types
+    yield from iter_scheduled_connections(
+        iter_connection_args(layout),
+        lambda args: connection_svg(*args),
+        lambda args: static_connection_svg(*args),
+        max_animated, rotate_every, report,
+    )
+    
+    # Draw nodes
+    for args in iter_node_args(layout):
+        yield node_svg(*args)
+    
+    yield "</svg>"
+    if html:
+        yield HTML_SUFFIX
+
+
+def write_custom_svg(out, nodes, connections, animations, chunk_size=65536, html=True,
+                     compact=False, **options):
+    """Stream the rendered diagram to a file object or write callable.
+
+    ``options`` are passed on to ``iter_custom_svg``.
+    """
+    fragments = iter_custom_svg(nodes, connections, animations, html, compact, **options)
+    return write_fragments(out, fragments, chunk_size)
+
+
+@metrics.timed('render_svg', metrics.output_sizes)
+def generate_custom_svg(nodes, connections, animations, html=True, compact=False, **options):
+    return ''.join(iter_custom_svg(nodes, connections, animations, html, compact, **options))
+
+
+@metrics.timed('render_svg', lambda svg, graph, *args, **kwargs: {
+    'nodes': graph.node_count, 'edges': graph.edge_count, 'output_chars': len(svg)})
+def generate_graph_svg(graph, html=True, compact=False, **options):
+    """``generate_custom_svg`` for a ``DiagramGraph``"""
+    return ''.join(iter_layout_svg(compute_graph_layout(graph), html, compact, **options))
+
+
+def compress_svg(svg):
+    """Gzip an SVG document into ``.svgz`` bytes (reproducible: no timestamp)"""
+    return gzip.compress(svg.encode('utf-8'), compresslevel=9, mtime=0)
+
+
+# Compact format. Connection and layer styles become CSS classes; the SMIL
+# stroke-opacity and dash-offset animations become CSS keyframes with the
+# same timing.
+COMPACT_CSS = (
+    '.e *{fill:none;stroke-width:2}'
+    '.cv{stroke-width:3;mask:url(#gradient-mask);animation:pulse linear infinite}'
+    '.st{mask:url(#gradient-mask)}'
+    '.ds{stroke-dasharray:5,5;animation:flow linear infinite}'
+    '.an{stroke-dasharray:5,5;animation:dash 1s linear infinite}'
+    '.ar{marker-end:url(#arrow)}'
+    '.b{stroke:rgba(238,238,238,0.05)}'
+    '.dim{stroke-opacity:.3}.w3{stroke-width:3}.da{stroke-dasharray:5,5}'
+    '@keyframes pulse{0%,100%{stroke-opacity:.3}50%{stroke-opacity:1}}'
+    '@keyframes flow{to{stroke-dashoffset:20}}'
+    '@keyframes dash{to{stroke-dashoffset:-20}}'
+    'text{font-size:14px;text-anchor:middle;fill:#292929}'
+    + ''.join(f'.d{d}{{animation-duration:{d}s}}'
+              for d in sorted({style['duration'] for style in CONNECTION_STYLES.values()} - {0}))
+    + ''.join(f'.p{i}{{stroke:{color}}}' for i, color in enumerate(CONNECTION_COLORS))
+    + ''.join(f'.l{name[5:]}{{fill:{style["fill"]};stroke:{style["stroke"]};stroke-width:3}}'
+              for name, style in LAYER_STYLES.items())
+)
+
+COMPACT_DEFS = (
+    '<linearGradient id="gradient">'
+    '<stop offset="0" stop-color="white" stop-opacity="0"/>'
+    '<stop offset="0.4" stop-color="white"/>'
+    '<stop offset="0.6" stop-color="white"/>'
+    '<stop offset="1" stop-color="white" stop-opacity="0"/>'
+    '</linearGradient>'
+    '<mask id="gradient-mask"><rect width="200%" height="100%" fill="url(#gradient)">'
+    '<animate attributeName="x" from="100%" to="-100%" dur="8s" repeatCount="indefinite"/>'
+    '</rect></mask>'
+    '<marker id="arrow" markerWidth="10" markerHeight="10" refX="10" refY="3" orient="auto">'
+    '<path d="M0,0 L0,6 L9,3 z" fill="context-stroke"/></marker>'
+)
+
+
+def _connection_classes(conn_type, static=False):
+    style = CONNECTION_STYLES.get(conn_type, CONNECTION_STYLES['>>'])
+    if static:
+        classes = 'dim' + (' w3' if style['type'] == 'curved' else '')
+        if style['dashed']:
+            classes += ' da'
+        if style['arrow']:
+            classes += ' ar'
+        return classes, style['type']
+    classes = {
+        'curved': f"cv d{style['duration']}",
+        'straight': 'st',
+        'dashed': f"ds d{style['duration']}",
+        'solid': '',
+        'animated': 'an',
+    }[style['type']]
+    if style['arrow']:
+        classes += ' ar'
+    return classes.strip(), style['type']
+
+
+def _layer_shape(name):
+    style = LAYER_STYLES[name]
+    css_class = f'l{name[5:]}'
+    if style.get('shape') == 'ellipse':
+        return (f'<ellipse id="{css_class}" class="{css_class}" cx="{NODE_WIDTH/2:g}" '
+                f'cy="{NODE_HEIGHT/2:g}" rx="{NODE_WIDTH/2:g}" ry="{NODE_HEIGHT/2:g}"/>')
+    rx = style.get('rx', '0')
+    rx_attr = f' rx="{rx}"' if rx != '0' else ''
+    return (f'<rect id="{css_class}" class="{css_class}" width="{NODE_WIDTH}" '
+            f'height="{NODE_HEIGHT}"{rx_attr}/>')
+
+
+def _format_coords(values, precision):
+    """Round an array of coordinates to strings without trailing zeros"""
+    strings = []
+    for value in values.round(precision).tolist():
+        text = repr(value)
+        if text.endswith('.0'):
+            text = text[:-2]
+        strings.append('0' if text == '-0' else text)
+    return strings
+
+
+def _compact_edge(args, static=False):
+    conn_type, x1, y1, x2, y2, cx, cy, color = args
+    classes, kind = _connection_classes(conn_type, static)
+    classes = f'{classes} p{color}'.lstrip()
+    if kind == 'curved':
+        return f'<path class="{classes}" d="M{x1} {y1}Q{cx} {cy} {x2} {y2}"/>'
+    return f'<line class="{classes}" x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"/>'
+
+
+def _compact_header(layout, html):
+    width = layout.width
+    height = layout.height
+    svg = (f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+           f'xmlns="http://www.w3.org/2000/svg">')
+    if html:
+        svg = (f'<html><body><div style="width:{min(width, SVG_WIDTH)}px; '
+               f'height:{min(height, SVG_HEIGHT)}px; border:1px solid #ccc; overflow:auto">' + svg)
+    used_layers = sorted({layer_style_name(node_type) for node_type in layout.node_types})
+    return (svg + '<defs>' + COMPACT_DEFS + ''.join(map(_layer_shape, used_layers))
+            + '</defs><style>' + COMPACT_CSS + '</style>')
+
+
+def _compact_edge_args(layout, precision, start=0, end=None):
+    """Return ``(edge_args, base)`` for a range of connections: ``_compact_edge``
+    arguments and the base-layer path segments"""
+    edges = slice(start, end)
+    coords = [_format_coords(values[edges], precision) for values in
+              (layout.x1, layout.y1, layout.x2, layout.y2, layout.ctrl_x, layout.ctrl_y)]
+    edge_args = []
+    base = []
+    for color_index, (conn_type, x1, y1, x2, y2, cx, cy) in enumerate(
+            zip(layout.connectors[edges], *coords), start):
+        kind = connection_type(conn_type)
+        if kind == 'curved' and conn_type in ('~>', '~~', '=>', '=='):
+            base.append(f'M{x1} {y1}Q{cx} {cy} {x2} {y2}')
+        elif kind == 'straight' and conn_type in ('=>', '=='):
+            base.append(f'M{x1} {y1}L{x2} {y2}')
+        edge_args.append((conn_type, x1, y1, x2, y2, cx, cy, color_index % len(CONNECTION_COLORS)))
+    return edge_args, base
+
+
+def _iter_compact_nodes(layout, precision, start=0, end=None):
+    nodes = slice(start, end)
+    node_x = layout.node_x[nodes]
+    node_y = layout.node_y[nodes]
+    xs = _format_coords(node_x, precision)
+    ys = _format_coords(node_y, precision)
+    label_xs = _format_coords(node_x + NODE_WIDTH/2, precision)
+    label_ys = _format_coords(node_y + NODE_HEIGHT/2 + 5, precision)
+    for label, node_type, x, y, label_x, label_y in zip(
+            layout.labels[nodes], layout.node_types[nodes], xs, ys, label_xs, label_ys):
+        shape = f'l{layer_style_name(node_type)[5:]}'
+        yield f'<use href="#{shape}" x="{x}" y="{y}"/><text x="{label_x}" y="{label_y}">{escape(label)}</text>'
+
+
+def _iter_compact_svg(layout, html, precision, max_animated=None,
+                      rotate_every=4, report=None):
+    yield _compact_header(layout, html)
+    edge_args, base = _compact_edge_args(layout, precision)
+
+    # The faint base layers are identical apart from geometry, so they are
+    # drawn as one path under all connections
+    yield '<g class="e">'
+    if base:
+        yield f'<path class="b" d="{"".join(base)}"/>'
+    yield from iter_scheduled_connections(
+        edge_args, _compact_edge, lambda args: _compact_edge(args, static=True),
+        max_animated, rotate_every, report,
+    )
+    yield '</g>'
+    yield from _iter_compact_nodes(layout, precision)
+
+    yield '</svg>'
+    if html:
+        yield '</div></body></html>'
+
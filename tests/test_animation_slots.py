@@ -0,0 +1,35 @@
+import re
+import xml.etree.ElementTree as ET
+
+from svg_renderer import generate_custom_svg, slot_style
+
+SVG = '{http://www.w3.org/2000/svg}'
+
+
+def test_slot_delays_outrank_the_shared_animation_rule():
+    css = slot_style(4, 3)
+    assert 'g[class^="slot-"]{animation:slots 12s step-end infinite}' in css
+    # Same specificity as the shared rule and after it, so the delay sticks
+    assert not re.search(r'[{}>]\.slot-', css)
+    delays = dict(re.findall(r'g\.slot-(\d+)\{animation-delay:(-?[\d.]+)s\}', css))
+    assert delays == {'1': '-9', '2': '-6', '3': '-3'}
+    assert css.index('g[class^="slot-"]') < css.index('g.slot-1')
+
+
+def test_slot_groups_hold_at_most_max_animated():
+    nodes = [('LAYER1', 'A'), ('LAYER2', 'B')]
+    # '--' and '>>' animate and draw one element each; 'to>' is static
+    connections = [('A', 'B', ('--', '>>', 'to>')[i % 3]) for i in range(60)]
+    report = {}
+    svg = generate_custom_svg(nodes, connections, [], html=False, max_animated=8,
+                              rotate_every=2, report=report)
+    assert report['animated_connections'] == 40
+    assert report['animation_slots'] == 5
+    assert report['max_concurrent_animations'] == 8
+
+    root = ET.fromstring(svg)
+    groups = {g.get('class'): len(list(g)) for g in root.iter(SVG + 'g')
+              if (g.get('class') or '').startswith('slot-')}
+    assert groups == {f'slot-{slot}': 8 for slot in range(5)}
+    for slot in range(1, 5):
+        assert f'g.slot-{slot}{{animation-delay:-{(5 - slot) * 2}s}}' in svg
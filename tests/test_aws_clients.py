@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+
+import pytest
+
+import aws_clients
+
+
+class StubSecretsClient:
+    def __init__(self, release=None):
+        self.calls = 0
+        self.release = release
+        self.lock = threading.Lock()
+
+    def get_secret_value(self, SecretId):
+        with self.lock:
+            self.calls += 1
+            version = self.calls
+        if self.release is not None:
+            self.release.wait(5)
+        return {'SecretString': json.dumps({'id': SecretId, 'version': version})}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(aws_clients.time, 'monotonic', clock)
+    client = StubSecretsClient()
+    created = []
+
+    def factory(service, **kwargs):
+        created.append((service, kwargs))
+        return client
+
+    aws_clients.configure(factory, secret_ttl=100)
+    yield client, created, clock
+    aws_clients.configure()
+
+
+def test_clients_are_reused_per_service_and_credentials(stub):
+    _, created, _ = stub
+    pool = aws_clients.client_pool
+    first = pool.get('bedrock-runtime', region_name='us-east-1', aws_access_key_id='a')
+    assert pool.get('bedrock-runtime', region_name='us-east-1', aws_access_key_id='a') is first
+    pool.get('bedrock-runtime', region_name='us-east-1', aws_access_key_id='b')
+    pool.get('secretsmanager', region_name='us-east-1')
+    assert len(created) == 3
+    assert pool.stats() == {'clients': 3, 'created': 3, 'reused': 1}
+
+
+def test_secrets_expire_after_the_ttl(stub):
+    client, _, clock = stub
+    cache = aws_clients.secret_cache
+    assert cache.get('s')['version'] == 1
+    clock.now += 50
+    assert cache.get('s')['version'] == 1
+    clock.now += 60
+    assert cache.get('s')['version'] == 2
+    assert client.calls == 2
+    assert cache.stats()['hits'] == 1
+
+
+def test_old_secrets_refresh_in_the_background(stub):
+    client, _, clock = stub
+    cache = aws_clients.secret_cache
+    cache.get('s')
+    client.release = threading.Event()
+    clock.now += 90
+    # Served from the cache while the refresh waits on Secrets Manager
+    assert cache.get('s')['version'] == 1
+    assert cache.get('s')['version'] == 1
+    assert cache.stats()['background_refreshes'] == 1
+    client.release.set()
+    wait_for(lambda: cache.stats()['fetches'] == 2)
+    assert cache.get('s')['version'] == 2
+    assert client.calls == 2
+
+
+def test_concurrent_cold_lookups_share_one_fetch(stub):
+    client, _, _ = stub
+    client.release = threading.Event()
+    cache = aws_clients.secret_cache
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('s')))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.stats()['coalesced'] == 7)
+    client.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert client.calls == 1
+    assert [result['version'] for result in results] == [1] * 8
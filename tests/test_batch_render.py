@@ -0,0 +1,32 @@
+import json
+
+from batch_render import MANIFEST_NAME, main
+
+SPEC = """[diagram nodes]
+LAYER1 - A
+LAYER2 - B
+[diagram connection]
+A => B
+"""
+
+
+def test_forced_runs_keep_the_manifest_entries_of_other_files(tmp_path, capsys):
+    specs = tmp_path / 'specs'
+    specs.mkdir()
+    for name in ('one', 'two'):
+        (specs / f'{name}.txt').write_text(SPEC.replace('B', name.upper()))
+    out_dir = str(tmp_path / 'out')
+    one, two = str(specs / 'one.txt'), str(specs / 'two.txt')
+
+    assert main([str(specs), '-o', out_dir, '-j', '1']) == 0
+    manifest_path = tmp_path / 'out' / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text())
+    assert sorted(manifest) == [one, two]
+
+    assert main([one, '-o', out_dir, '-j', '1', '--force']) == 0
+    assert json.loads(manifest_path.read_text()) == manifest
+    assert '1 rendered, 0 unchanged' in capsys.readouterr().out
+
+    # two.txt is still known, so the next run skips both files
+    assert main([str(specs), '-o', out_dir, '-j', '1']) == 0
+    assert '0 rendered, 2 unchanged' in capsys.readouterr().out
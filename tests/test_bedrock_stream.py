@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import aws_clients
+import response_cache
+from bedrock_utils import iter_bedrock_text, iter_stream_text, iter_text_lines
+
+DELTAS = ['[diagram nodes]\nLAYER1 - A', '\nLAYER2', ' - B\n[diagram connection]\n', 'A => B']
+
+
+def fake_stream(deltas=DELTAS):
+    """Events shaped like an ``invoke_model_with_response_stream`` body"""
+    messages = [{'type': 'message_start', 'message': {'usage': {'input_tokens': 12}}}]
+    messages += [{'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': text}}
+                 for text in deltas]
+    messages += [{'type': 'message_delta', 'usage': {'output_tokens': 34}},
+                 {'type': 'message_stop'}]
+    return [{'chunk': {'bytes': json.dumps(message).encode()}} for message in messages]
+
+
+class StubBedrock:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model_with_response_stream(self, modelId, body):
+        self.calls += 1
+        return {'body': iter(fake_stream())}
+
+
+@pytest.fixture
+def bedrock():
+    client = StubBedrock()
+    aws_clients.configure(lambda service, **kwargs: client)
+    response_cache.configure(maxsize=8, cache_dir='')
+    yield client
+    aws_clients.configure()
+    response_cache.configure()
+
+
+def test_stream_text_and_usage():
+    usage = {}
+    deltas = list(iter_stream_text(fake_stream(), usage))
+    assert deltas == DELTAS
+    assert usage == {'chunks': 4, 'input_tokens': 12, 'output_tokens': 34}
+    assert list(iter_text_lines(deltas)) == [
+        '[diagram nodes]', 'LAYER1 - A', 'LAYER2 - B', '[diagram connection]', 'A => B']
+
+
+def test_complete_stream_is_cached(bedrock):
+    assert ''.join(iter_bedrock_text('prompt', 'a', 's', 'model')) == ''.join(DELTAS)
+    assert list(iter_bedrock_text('prompt', 'a', 's', 'model')) == [''.join(DELTAS)]
+    assert bedrock.calls == 1
+
+
+def test_partially_consumed_stream_is_not_cached(bedrock):
+    stream = iter_bedrock_text('prompt', 'a', 's', 'model')
+    assert next(stream) == DELTAS[0]
+    stream.close()
+    assert response_cache.cache.stats()['size'] == 0
+    assert ''.join(iter_bedrock_text('prompt', 'a', 's', 'model')) == ''.join(DELTAS)
+    assert bedrock.calls == 2
@@ -0,0 +1,67 @@
+import gzip
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from benchmarks.synthetic import synthetic_spec
+from layout import compute_layout
+from svg_renderer import compress_svg, generate_custom_svg
+
+SVG = '{http://www.w3.org/2000/svg}'
+
+
+@pytest.fixture(scope='module')
+def spec():
+    nodes, connections, animations = synthetic_spec(2000, seed=2)
+    nodes.append(('LAYER3', 'R&D <core>'))
+    connections.append(('R&D <core>', nodes[0][1], '=>'))
+    return nodes, connections, animations
+
+
+def drawn(svg):
+    """Count ``(connections, nodes)`` drawn in a full or compact document"""
+    root = ET.fromstring(svg)
+    edges = 0
+    for element in root.iter():
+        if element.tag not in (SVG + 'line', SVG + 'path'):
+            continue
+        if element.get('class', '').split()[:1] == ['b']:
+            continue  # compact: the shared base layer path
+        stroke = element.get('stroke')
+        if stroke is None and 'class' not in element.attrib:
+            continue  # the arrow marker
+        if stroke is not None and stroke.startswith('rgba'):
+            continue  # full: a per-connection base layer
+        edges += 1
+    nodes = sum(1 for _ in root.iter(SVG + 'text'))
+    return edges, nodes
+
+
+@pytest.mark.parametrize('options', [{}, {'max_animated': 50}, {'precision': 0}])
+def test_compact_output_draws_the_same_diagram_in_fewer_bytes(spec, options):
+    full = generate_custom_svg(*spec, html=False, **options)
+    compact = generate_custom_svg(*spec, html=False, compact=True, **options)
+    assert len(compact) < len(full) / 2
+    assert drawn(compact) == drawn(full)
+
+    layout = compute_layout(*spec[:2])
+    edges, nodes = drawn(full)
+    assert nodes == len(layout.labels)
+    if not options.get('max_animated'):
+        assert edges == len(layout.edges)
+    assert 'R&amp;D &lt;core&gt;' in compact
+
+
+def test_compact_html_wraps_the_svg(spec):
+    page = generate_custom_svg(*spec, compact=True)
+    assert page.startswith('<html><body><div ') and page.endswith('</svg></div></body></html>')
+    ET.fromstring(page)
+
+
+def test_compress_svg_round_trips(spec):
+    svg = generate_custom_svg(*spec, html=False, compact=True)
+    data = compress_svg(svg)
+    assert gzip.decompress(data).decode('utf-8') == svg
+    assert len(data) < len(svg.encode('utf-8')) / 4
+    # No timestamp, so the same document always gives the same bytes
+    assert compress_svg(svg) == data
@@ -0,0 +1,98 @@
+import io
+
+import numpy as np
+
+from bedrock_utils import iter_diagram_spec, parse_diagram_spec
+from benchmarks.synthetic import synthetic_spec_text
+from graph import DiagramGraph, _intern
+
+# Duplicate labels and connections, a self loop, a label only used in
+# connections, an unlayered node type, animations with no matching
+# connection and lines that do not parse
+SPEC = """[diagram nodes]
+LAYER1 - UserA
+LAYER2 - ALBA
+LAYER3 - Web
+LAYER12 - Archive
+SERVICE - Queue
+LAYER4 - ALBA
+LAYER2 B
+[diagram connection]
+UserA to> ALBA
+ALBA ~> Web
+ALBA ~> Web
+Web to Archive
+Web == Web
+Queue -- Ghost
+Web Archive
+[animation]
+ALBA ~> Web
+Web -> Web
+Nobody => ALBA
+ALBA => UserA
+"""
+
+
+def expected_animations(connections, animations):
+    pairs = set(animations)
+    return [(source, target) for source, target, _ in connections if (source, target) in pairs]
+
+
+def columns(graph):
+    return (graph.labels, graph.types, graph.connectors, graph.type_layers.tolist(),
+            graph.node_label.tolist(), graph.node_type.tolist(), graph.source.tolist(),
+            graph.target.tolist(), graph.connector.tolist(), graph.animated.tolist())
+
+
+def test_graph_round_trips_a_parsed_spec():
+    rejected = []
+    nodes, connections, animations = parse_diagram_spec(SPEC, rejected)
+    graph_rejected = []
+    graph = DiagramGraph.parse(SPEC, graph_rejected)
+
+    assert graph.nodes() == nodes
+    assert graph.connections() == connections
+    assert graph.animations() == expected_animations(connections, animations)
+    assert graph.animations() == [('ALBA', 'Web'), ('ALBA', 'Web'), ('Web', 'Web')]
+    assert graph_rejected == rejected == [(8, 'LAYER2 B'), (16, 'Web Archive')]
+    assert (graph.node_count, graph.edge_count) == (len(nodes), len(connections))
+
+    events = DiagramGraph.from_events(iter_diagram_spec(io.StringIO(SPEC)))
+    from_spec = DiagramGraph.from_spec(nodes, connections, animations)
+    assert columns(events) == columns(graph)
+    assert columns(from_spec) == columns(graph)
+    again = DiagramGraph.from_spec(graph.nodes(), graph.connections(), graph.animations())
+    assert columns(again) == columns(graph)
+
+
+def test_labels_types_and_connectors_are_interned_once():
+    graph = DiagramGraph.parse(SPEC)
+    # Ids follow first use, nodes before connections
+    assert graph.labels == ['UserA', 'ALBA', 'Web', 'Archive', 'Queue', 'Ghost']
+    assert graph.types == ['LAYER1', 'LAYER2', 'LAYER3', 'LAYER12', 'SERVICE', 'LAYER4']
+    assert graph.connectors == ['to>', '~>', ' to ', '==', '--']
+    assert graph.type_layers.tolist() == [1, 2, 3, 12, -1, 4]
+    assert graph.node_label.tolist() == [0, 1, 2, 3, 4, 1]
+    assert graph.node_layers.tolist() == [1, 2, 3, 12, -1, 4]
+    assert graph.source.dtype == graph.connector.dtype == np.int32
+
+
+def test_plain_pairs_get_an_empty_connector():
+    graph = DiagramGraph.from_spec([('LAYER1', 'A')], [('A', 'B'), ('B', 'A')], [('B', 'A')])
+    assert graph.connections() == [('A', 'B', ''), ('B', 'A', '')]
+    assert graph.animations() == [('B', 'A')]
+
+
+def test_intern_numbers_values_by_first_use():
+    ids, values = _intern(['b', 'a', 'b', 'c', 'a'], 5)
+    assert dict(ids) == {'b': 0, 'a': 1, 'c': 2}
+    assert values.tolist() == [0, 1, 0, 2, 1]
+
+
+def test_large_specs_round_trip():
+    text = synthetic_spec_text(5000, 7, seed=4)
+    nodes, connections, animations = parse_diagram_spec(text)
+    graph = DiagramGraph.parse(text)
+    assert graph.nodes() == nodes
+    assert graph.connections() == connections
+    assert graph.animations() == expected_animations(connections, animations)
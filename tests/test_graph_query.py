@@ -0,0 +1,158 @@
+import pytest
+
+from graph import DiagramGraph
+from graph_query import AdjacencyIndex
+
+# The spec main.py starts with
+DEFAULT_SPEC = """[diagram nodes]
+LAYER1 - UserA
+LAYER2 - CloudfrontA
+LAYER2 - ALBA
+LAYER3 - WebServerA
+LAYER3 - WebServerB
+LAYER4 - AppServerA
+LAYER4 - AppServerB
+LAYER5 - DBServerA
+LAYER5 - DBServerB
+[diagram connection]
+UserA to> CloudfrontA
+CloudfrontA to> ALBA
+ALBA ~> WebServerA
+ALBA ~> WebServerB
+WebServerA ~> AppServerA
+WebServerA ~> AppServerB
+WebServerB ~> AppServerA
+WebServerB ~> AppServerB
+AppServerA ~> DBServerA
+AppServerB >> DBServerB
+"""
+
+# A -> B -> C -> A is a cycle, D loops on itself and B is declared twice
+CYCLIC_SPEC = """[diagram nodes]
+LAYER1 - A
+LAYER2 - B
+LAYER2 - C
+LAYER3 - D
+LAYER4 - E
+LAYER3 - B
+[diagram connection]
+A => B
+B => C
+C -> A
+C => D
+D ~~ D
+E -- A
+[animation]
+C => A
+D => D
+"""
+
+
+@pytest.fixture
+def default():
+    return AdjacencyIndex(DiagramGraph.parse(DEFAULT_SPEC))
+
+
+@pytest.fixture
+def cyclic():
+    return AdjacencyIndex(DiagramGraph.parse(CYCLIC_SPEC))
+
+
+def labels(graph):
+    return [label for _, label in graph.nodes()]
+
+
+def test_neighborhood(default):
+    sub = default.neighborhood(['ALBA'])
+    assert labels(sub) == ['CloudfrontA', 'ALBA', 'WebServerA', 'WebServerB']
+    assert sub.connections() == [
+        ('CloudfrontA', 'ALBA', 'to>'),
+        ('ALBA', 'WebServerA', '~>'),
+        ('ALBA', 'WebServerB', '~>'),
+    ]
+    assert labels(default.neighborhood('ALBA', hops=2, direction='out')) == [
+        'ALBA', 'WebServerA', 'WebServerB', 'AppServerA', 'AppServerB']
+    assert labels(default.neighborhood('ALBA', hops=0)) == ['ALBA']
+
+
+def test_downstream_and_upstream_closures(default):
+    assert labels(default.downstream('AppServerB')) == ['AppServerB', 'DBServerB']
+    assert labels(default.downstream('UserA')) == labels(default.graph)
+    assert labels(default.upstream('DBServerA')) == [
+        'UserA', 'CloudfrontA', 'ALBA', 'WebServerA', 'WebServerB', 'AppServerA', 'DBServerA']
+    assert len(default.upstream('DBServerA').connections()) == 7
+
+
+def test_filters_limit_the_walk(default):
+    assert labels(default.downstream('UserA', layers=(None, 3))) == [
+        'UserA', 'CloudfrontA', 'ALBA', 'WebServerA', 'WebServerB']
+    # CloudfrontA is outside the range, so UserA is not reached through it
+    assert labels(default.upstream('WebServerA', layers=(3, None))) == ['WebServerA']
+    sub = default.downstream('ALBA', connectors=['~>'])
+    assert labels(sub) == ['ALBA', 'WebServerA', 'WebServerB', 'AppServerA', 'AppServerB',
+                           'DBServerA']
+    assert {connector for _, _, connector in sub.connections()} == {'~>'}
+
+
+def test_layer_range(default):
+    sub = default.layer_range(3, 4)
+    assert labels(sub) == ['WebServerA', 'WebServerB', 'AppServerA', 'AppServerB']
+    assert len(sub.connections()) == 4
+    assert labels(default.layer_range(5)) == ['DBServerA', 'DBServerB']
+    assert labels(default.layer_range(last=1)) == ['UserA']
+    assert default.layer_range(3, 4, connectors=['>>']).connections() == []
+
+
+def test_with_connectors(default):
+    sub = default.with_connectors('>>', 'to>')
+    assert labels(sub) == ['UserA', 'CloudfrontA', 'ALBA', 'AppServerB', 'DBServerB']
+    assert sub.connections() == [
+        ('UserA', 'CloudfrontA', 'to>'),
+        ('CloudfrontA', 'ALBA', 'to>'),
+        ('AppServerB', 'DBServerB', '>>'),
+    ]
+    # A layer range selects the nodes; connectors only filter the connections
+    sub = default.with_connectors('>>', layers=(4, 5))
+    assert labels(sub) == ['AppServerA', 'AppServerB', 'DBServerA', 'DBServerB']
+    assert sub.connections() == [('AppServerB', 'DBServerB', '>>')]
+
+
+def test_query_without_selection_returns_the_whole_graph(default):
+    sub = default.query()
+    assert sub.nodes() == default.graph.nodes()
+    assert sub.connections() == default.graph.connections()
+
+
+def test_query_rejects_unknown_labels_and_directions(default):
+    with pytest.raises(ValueError, match='Unknown node'):
+        default.neighborhood(['Nope'])
+    with pytest.raises(ValueError, match='direction'):
+        default.neighborhood(['ALBA'], direction='sideways')
+
+
+def test_walks_terminate_on_cycles(cyclic):
+    assert labels(cyclic.downstream('A')) == ['A', 'B', 'C', 'D', 'B']
+    assert labels(cyclic.upstream('A')) == ['A', 'B', 'C', 'E', 'B']
+    assert labels(cyclic.downstream('D')) == ['D']
+    assert labels(cyclic.neighborhood('D', hops=None)) == labels(cyclic.graph)
+    assert labels(cyclic.neighborhood('A', hops=50, direction='out')) == [
+        'A', 'B', 'C', 'D', 'B']
+
+
+def test_subgraph_keeps_order_animations_and_self_loops(cyclic):
+    sub = cyclic.downstream('C')
+    # Every declaration of a selected label is kept, in declaration order
+    assert sub.nodes() == [('LAYER1', 'A'), ('LAYER2', 'B'), ('LAYER2', 'C'),
+                           ('LAYER3', 'D'), ('LAYER3', 'B')]
+    assert sub.connections() == [
+        ('A', 'B', '=>'), ('B', 'C', '=>'), ('C', 'A', '->'), ('C', 'D', '=>'),
+        ('D', 'D', '~~'),
+    ]
+    assert sub.animations() == [('C', 'A'), ('D', 'D')]
+    # Labels are renumbered densely over the selection
+    assert sorted(sub.labels) == ['A', 'B', 'C', 'D']
+    assert max(sub.source.max(), sub.target.max(), sub.node_label.max()) == 3
+
+    # B is drawn at its last declaration, so it belongs to layer 3
+    assert labels(cyclic.layer_range(3, 3)) == ['B', 'D', 'B']
+    assert labels(cyclic.layer_range(2, 2)) == ['C']
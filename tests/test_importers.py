@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from importers import _JsonReader, iter_json_records
+
+RECORDS = [{'label': f'n{i}', 'layer': [1, 2.5, -3e5, 12345678901234][i % 4],
+            'name': 'a"bé' * (i % 3), 'animated': [True, False, None][i % 3]}
+           for i in range(200)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 8, 13, 64])
+def test_values_split_across_chunks(chunk_size):
+    data = json.dumps(RECORDS + [7, 0.25, 'x', True]).encode('utf-8')
+    reader = _JsonReader(data, chunk_size=chunk_size)
+    assert list(reader.iter_array()) == RECORDS + [7, 0.25, 'x', True]
+
+
+def test_truncated_input():
+    data = json.dumps(RECORDS[:3]).encode('utf-8')[:-20]
+    records = list(iter_json_records(data))
+    assert [record for _, record in records[:2]] == RECORDS[:2]
+    number, error = records[2]
+    assert number == 3
+    assert error.startswith('invalid JSON: unexpected end of input')
+
+
+def test_malformed_record_fails_without_reading_on():
+    body = ', '.join(json.dumps(record) for record in RECORDS * 50)
+    data = ('[{"label": "a"}, {"label": tru}, ' + body + ']').encode('utf-8')
+    reader = _JsonReader(data, chunk_size=1024)
+    records = reader.iter_array()
+    assert next(records) == {'label': 'a'}
+    with pytest.raises(ValueError, match='Expecting value at character 27'):
+        next(records)
+    assert reader.offset <= 1024
+
+
+@pytest.mark.parametrize('text', ['{"a": [1, 2,]}', '[{"a": 1} {"a": 2}]', '[{"a": "x\ny"}]'])
+def test_malformed_input(text):
+    records = list(iter_json_records(text.encode('utf-8')))
+    assert isinstance(records[-1][1], str)
+    assert records[-1][1].startswith('invalid JSON: ')
@@ -0,0 +1,26 @@
+from benchmarks.synthetic import synthetic_spec
+from incremental import IncrementalRenderer
+from svg_renderer import generate_custom_svg
+
+
+def test_matches_full_render_and_reuses_fragments():
+    nodes, connections, animations = synthetic_spec(400, seed=2)
+    renderer = IncrementalRenderer()
+    renderer.render(nodes, connections[:-10], animations)
+
+    svg = renderer.render(nodes, connections, animations)
+    assert svg == generate_custom_svg(nodes, connections, animations)
+    stats = renderer.last_stats
+    assert stats['changed_layers'] == 0
+    assert stats['rendered_edges'] == 10
+    assert stats['rendered_nodes'] == 0
+
+
+def test_deleting_a_connection_recolors_the_rest():
+    nodes, connections, animations = synthetic_spec(400, seed=2)
+    renderer = IncrementalRenderer()
+    renderer.render(nodes, connections, animations)
+
+    svg = renderer.render(nodes, connections[1:], animations)
+    assert svg == generate_custom_svg(nodes, connections[1:], animations)
+    assert renderer.last_stats['reused_edges'] < len(connections) // 2
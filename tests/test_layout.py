@@ -0,0 +1,67 @@
+from layout import GAP, NODE_HEIGHT, NODE_WIDTH, SVG_HEIGHT, SVG_WIDTH, compute_layout
+
+
+def positions(layout):
+    return {label: (float(x), float(y))
+            for label, x, y in zip(layout.labels, layout.node_x, layout.node_y)}
+
+
+def assert_on_canvas(layout):
+    assert layout.node_x.min() >= GAP and layout.node_y.min() >= GAP
+    assert layout.node_x.max() + NODE_WIDTH <= layout.width - GAP
+    assert layout.node_y.max() + NODE_HEIGHT <= layout.height - GAP
+
+
+def test_five_layers_keep_the_original_tiers():
+    layout = compute_layout([(f'LAYER{i}', f'N{i}') for i in range(1, 6)], [])
+    assert (layout.width, layout.height) == (SVG_WIDTH, SVG_HEIGHT)
+    assert [y for _, y in positions(layout).values()] == [50, 150, 250, 350, 475]
+
+
+def test_layer0_gets_a_tier_above_layer1():
+    nodes = [(f'LAYER{i}', f'N{i}') for i in range(6)]
+    layout = compute_layout(nodes, [('N0', 'N1', '->')])
+    assert [y for _, y in positions(layout).values()] == [50, 150, 250, 350, 450, 550]
+    assert layout.height == 675
+    assert_on_canvas(layout)
+    # N0 is above N1, so the connection runs top to bottom
+    assert (float(layout.y1[0]), float(layout.y2[0])) == (50 + NODE_HEIGHT, 150)
+
+    only = compute_layout([('LAYER0', 'Top'), ('LAYER0', 'Other')], [])
+    assert {y for _, y in positions(only).values()} == {GAP}
+    assert (only.width, only.height) == (SVG_WIDTH, SVG_HEIGHT)
+
+
+def test_deep_layers_grow_the_canvas():
+    nodes = [(f'LAYER{i}', f'N{i}') for i in range(1, 9)]
+    layout = compute_layout(nodes, [])
+    ys = [y for _, y in positions(layout).values()]
+    assert ys == sorted(ys) and len(set(ys)) == 8
+    assert ys[4] == 450  # LAYER5 is no longer pinned to the bottom
+    assert layout.height == 875
+    assert ys[-1] == layout.height - NODE_HEIGHT - GAP*1.5
+    assert_on_canvas(layout)
+
+    sparse = compute_layout([('LAYER1', 'A'), ('LAYER12', 'B')], [])
+    assert positions(sparse)['B'][1] == GAP*(2*12 - 1)
+    assert_on_canvas(sparse)
+
+
+def test_wide_tiers_widen_the_canvas():
+    nodes = [('LAYER2', f'N{i}') for i in range(10)] + [('LAYER1', 'Top')]
+    layout = compute_layout(nodes, [])
+    assert layout.width == 10*(NODE_WIDTH + GAP) - GAP + 2*GAP
+    assert layout.height == SVG_HEIGHT
+    xs = [x for label, (x, _) in positions(layout).items() if label != 'Top']
+    assert xs == [GAP + i*(NODE_WIDTH + GAP) for i in range(10)]
+    # Narrower tiers are centered on the wider canvas
+    assert positions(layout)['Top'][0] == (layout.width - NODE_WIDTH) / 2
+    assert_on_canvas(layout)
+
+
+def test_unlayered_nodes_and_their_connections_are_dropped():
+    nodes = [('LAYER1', 'A'), ('SERVICE', 'B'), ('LAYER2', 'C')]
+    layout = compute_layout(nodes, [('A', 'B', '->'), ('A', 'C', '=>'), ('B', 'C', '--')])
+    assert layout.labels == ['A', 'C']
+    assert layout.edges == [1]
+    assert layout.connectors == ['=>']
@@ -0,0 +1,28 @@
+import urllib.request
+
+import metrics
+
+
+def test_endpoint_binds_to_localhost_by_default(monkeypatch):
+    monkeypatch.delenv('DIAGRAM_METRICS_HOST', raising=False)
+    metrics.configure()
+    server = metrics.serve(0)
+    try:
+        host, port = server.server_address
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            assert response.status == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_host_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv('DIAGRAM_METRICS_HOST', '0.0.0.0')
+    metrics.configure()
+    try:
+        assert metrics.bind_host == '0.0.0.0'
+    finally:
+        monkeypatch.delenv('DIAGRAM_METRICS_HOST')
+        metrics.configure()
+    assert metrics.bind_host == '127.0.0.1'
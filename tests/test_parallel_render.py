@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from benchmarks.synthetic import synthetic_spec
+from layout import compute_layout
+from parallel_render import iter_parallel_svg
+from svg_renderer import iter_layout_svg
+
+OPTIONS = (
+    {},
+    {'html': False, 'max_animated': 40},
+    {'precision': 0},
+)
+
+
+@pytest.fixture(scope='module')
+def layout():
+    nodes, connections, animations = synthetic_spec(1500, seed=5)
+    nodes.append(('LAYER2', 'Ünïcode ✓ <label>'))
+    connections.append((nodes[0][1], '--', 'Ünïcode ✓ <label>'))
+    return compute_layout(nodes, connections)
+
+
+@pytest.fixture(scope='module')
+def executor():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('options', OPTIONS)
+def test_parallel_output_matches_serial(layout, executor, compact, options):
+    serial_report = {}
+    parallel_report = {}
+    serial = ''.join(iter_layout_svg(layout, compact=compact, report=serial_report, **options))
+    parallel = ''.join(iter_parallel_svg(layout, compact=compact, report=parallel_report,
+                                         executor=executor, workers=2, min_edges=0,
+                                         chunk_size=128, **options))
+    assert parallel == serial
+    assert parallel_report.pop('workers') == 2
+    assert parallel_report.pop('tasks') > 2
+    assert parallel_report == serial_report
+    assert (serial_report['animation_slots'] > 1) == ('max_animated' in options)
+
+
+def test_own_pool_and_uneven_chunks_match_serial(layout):
+    serial = ''.join(iter_layout_svg(layout, compact=True, max_animated=40))
+    parallel = ''.join(iter_parallel_svg(layout, compact=True, max_animated=40,
+                                         workers=2, min_edges=0, chunk_size=333))
+    assert parallel == serial
+
+
+def test_small_diagrams_are_emitted_serially(layout):
+    report = {}
+    parallel = ''.join(iter_parallel_svg(layout, report=report, workers=2))
+    assert parallel == ''.join(iter_layout_svg(layout))
+    assert (report['workers'], report['tasks']) == (1, 0)
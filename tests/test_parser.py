@@ -0,0 +1,40 @@
+import pytest
+
+from bedrock_utils import parse_diagram_spec
+from graph import DiagramGraph
+
+CONNECTIONS = [
+    ('UserA to> CloudfrontA ', ('UserA', 'CloudfrontA', 'to>')),
+    ('Ato>B', ('A', 'B', 'to>')),
+    ('A to>B', ('A', 'B', 'to>')),
+    ('Proto ~> Tomato', ('Proto', 'Tomato', '~>')),
+    ('A to B to C', ('A', 'B to C', ' to ')),
+    ('Route to S3 => Bucket', ('Route to S3', 'Bucket', '=>')),
+    ('Proto to Tomato', ('Proto', 'Tomato', ' to ')),
+    ('ALBA ~> WebServerA', ('ALBA', 'WebServerA', '~>')),
+    ('A->B', ('A', 'B', '->')),
+    ('A >> B', ('A', 'B', '>>')),
+]
+
+
+@pytest.mark.parametrize('line, expected', CONNECTIONS)
+def test_connection_lines(line, expected):
+    rejected = []
+    _, connections, _ = parse_diagram_spec(f'[diagram connection]\n{line}\n', rejected)
+    assert connections == [expected]
+    assert rejected == []
+
+
+@pytest.mark.parametrize('line, expected', CONNECTIONS)
+def test_graph_parser_agrees(line, expected):
+    graph = DiagramGraph.parse(f'[diagram connection]\n{line}\n')
+    assert graph.connections() == [expected]
+
+
+def test_unparseable_lines_are_rejected():
+    rejected = []
+    nodes, connections, _ = parse_diagram_spec(
+        '[diagram nodes]\nLAYER1 - A\nLAYER2 B\n[diagram connection]\nA B\n', rejected)
+    assert nodes == [('LAYER1', 'A')]
+    assert connections == []
+    assert rejected == [(3, 'LAYER2 B'), (5, 'A B')]
@@ -0,0 +1,44 @@
+import os
+
+from bedrock_utils import parse_diagram_spec
+from render_cache import RenderCache
+from svg_renderer import generate_custom_svg
+
+SPEC = """[diagram nodes]
+LAYER1 - A
+LAYER2 - B
+[diagram connection]
+A => B
+[diagram animation]
+A => B
+"""
+
+
+def test_disk_entries_are_json_and_survive_a_restart(tmp_path):
+    parsed = parse_diagram_spec(SPEC)
+    cache = RenderCache(cache_dir=str(tmp_path))
+    cache.put('parse', parsed)
+    cache.put('page', (generate_custom_svg(*parsed), {'connections': 1}))
+    assert sorted(os.listdir(tmp_path)) == ['page.json', 'parse.json']
+
+    restarted = RenderCache(cache_dir=str(tmp_path))
+    nodes, connections, animations = restarted.get('parse')
+    assert generate_custom_svg(nodes, connections, animations) == generate_custom_svg(*parsed)
+    assert restarted.get('page') == (generate_custom_svg(*parsed), {'connections': 1})
+    assert restarted.stats()['disk_hits'] == 2
+
+
+def test_disk_tier_evicts_the_oldest_files(tmp_path):
+    (tmp_path / 'old.pkl').write_bytes(b'not read')
+    cache = RenderCache(maxsize=1, cache_dir=str(tmp_path), disk_maxsize=3)
+    for i in range(5):
+        cache.put(f'k{i}', f'<svg>{i}</svg>')
+        os.utime(tmp_path / f'k{i}.json', (i, i))
+    assert sorted(os.listdir(tmp_path)) == ['k2.json', 'k3.json', 'k4.json']
+    assert cache.stats()['disk_evictions'] == 2
+
+    # A disk hit makes k2 the most recently used file
+    assert cache.get('k2') == '<svg>2</svg>'
+    restarted = RenderCache(cache_dir=str(tmp_path), disk_maxsize=2)
+    assert sorted(os.listdir(tmp_path)) == ['k2.json', 'k4.json']
+    assert restarted.get('k3') is None
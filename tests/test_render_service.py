@@ -0,0 +1,84 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import render_service
+from render_service import RenderService
+from svg_renderer import generate_custom_svg
+
+SPEC = """[diagram nodes]
+LAYER1 - <script>alert(1)</script>
+LAYER2 - B & C
+[diagram connection]
+<script>alert(1)</script> => B & C
+"""
+
+
+def test_labels_are_escaped():
+    nodes = [('LAYER1', '<script>alert(1)</script>'), ('LAYER2', 'B & C')]
+    connections = [('<script>alert(1)</script>', 'B & C', '=>')]
+    for compact in (False, True):
+        svg = generate_custom_svg(nodes, connections, [], html=False, compact=compact)
+        assert '<script>' not in svg
+        assert '&lt;script&gt;alert(1)&lt;/script&gt;' in svg
+        assert 'B &amp; C' in svg
+
+
+def test_service_response_is_escaped():
+    service = RenderService(workers=1)
+    try:
+        status, headers, body = asyncio.run(service.handle('POST', '/render', '', SPEC.encode()))
+    finally:
+        service.shutdown()
+    assert status == 200
+    assert b'<script>' not in body
+    assert b'&lt;script&gt;' in body
+
+
+def test_broken_pool_is_replaced():
+    service = RenderService(workers=1)
+
+    async def run():
+        crashed = service.executor.submit(os._exit, 1)
+        try:
+            crashed.result()
+        except BrokenProcessPool:
+            pass
+        return await service.render(SPEC)
+
+    try:
+        svg, rejected = asyncio.run(run())
+    finally:
+        service.shutdown()
+    assert svg.startswith(b'<svg')
+    assert rejected == 0
+    assert service.pool_restarts == 1
+
+
+class BrokenExecutor:
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+    def shutdown(self, *args, **kwargs):
+        pass
+
+
+class AlwaysBroken(RenderService):
+    @property
+    def executor(self):
+        return self._executor
+
+    def shutdown(self):
+        self._executor = BrokenExecutor()
+
+
+def test_pool_that_keeps_breaking_returns_503():
+    service = AlwaysBroken(workers=1, executor=BrokenExecutor())
+    status, headers, body = asyncio.run(service.handle('POST', '/render', '', SPEC.encode()))
+    assert status == 503
+    assert (b'retry-after', b'1') in headers
+    assert service.pending == {}
+
+
+def test_import_does_not_build_a_service():
+    assert render_service._app is None
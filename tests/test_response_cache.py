@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, response_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, 'time', clock)
+    return clock
+
+
+def test_keys_ignore_trailing_blank_space():
+    assert response_key('m', 'a  \nb\n\n', 10) == response_key('m', '\na\nb', 10)
+    assert response_key('m', 'a', 10) != response_key('m', 'a', 20)
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(ttl=60)
+    cache.put('k', 'text', latency=2.0)
+    clock.now += 59
+    assert cache.get('k') == 'text'
+    clock.now += 1
+    assert cache.get('k') is None
+    assert cache.get_or_compute('k', lambda: 'fresh') == 'fresh'
+    stats = cache.stats()
+    assert (stats['hits'], stats['expired'], stats['misses']) == (1, 1, 1)
+    assert stats['latency_saved'] == 2.0
+
+
+def test_concurrent_misses_share_one_call():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'text'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.stats()['coalesced'] == 7)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == ['text'] * 8
+    assert cache.get_or_compute('k', compute) == 'text'
+    assert len(calls) == 1
+    assert cache.stats()['upstream_calls_saved'] == 8
+
+
+def test_failed_calls_reach_every_waiter_and_are_not_cached():
+    cache = ResponseCache()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError('throttled')
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_compute('k', fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.stats()['coalesced'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ['throttled'] * 3
+    assert cache.stats()['errors'] == 1
+    assert cache.get_or_compute('k', lambda: 'text') == 'text'
+
+
+def test_entries_reload_from_disk(tmp_path, clock):
+    cache = ResponseCache(cache_dir=str(tmp_path), ttl=60)
+    cache.put('a', 'first', latency=1.5)
+    cache.put('b', 'second')
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'b.json']
+
+    restarted = ResponseCache(cache_dir=str(tmp_path), ttl=60)
+    read = restarted._read
+    reads = []
+
+    def unlocked_read(key):
+        # Disk reads must not block lookups of other keys
+        assert not restarted._lock.locked()
+        reads.append(key)
+        return read(key)
+
+    restarted._read = unlocked_read
+    assert restarted.get('a') == 'first'
+    assert restarted.get_or_compute('b', lambda: 'recomputed') == 'second'
+    assert restarted.get('a') == 'first'
+    assert reads == ['a', 'b']
+    assert restarted.stats()['disk_hits'] == 2
+    assert restarted.stats()['latency_saved'] == 3.0
+
+    # The TTL runs from the original fetch, not from the reload
+    clock.now += 60
+    assert ResponseCache(cache_dir=str(tmp_path), ttl=60).get('a') is None
+    assert 'a.json' not in os.listdir(tmp_path)
+
+
+def test_missing_disk_entries_are_misses(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    cache.put('k', 'text')
+    restarted = ResponseCache(cache_dir=str(tmp_path))
+    os.remove(tmp_path / 'k.json')
+    assert restarted.get_or_compute('k', lambda: 'recomputed') == 'recomputed'
+    assert restarted.stats()['misses'] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(maxsize=2, cache_dir=str(tmp_path))
+    cache.put('a', '1')
+    cache.put('b', '2')
+    assert cache.get('a') == '1'
+    cache.put('c', '3')
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('1', '3')
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'c.json']
+    assert cache.stats()['evictions'] == 1
+
+    # Restarting with a smaller bound drops the oldest files
+    for i, name in enumerate(['c.json', 'a.json']):
+        os.utime(tmp_path / name, (i, i))
+    restarted = ResponseCache(maxsize=1, cache_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == ['a.json']
+    assert restarted.get('a') == '1'
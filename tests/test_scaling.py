@@ -0,0 +1,42 @@
+import re
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_spec
+from benchmarks.timing import time_call
+from layout import compute_layout
+from svg_renderer import SVG_DEFS, generate_custom_svg
+
+SIZES = (1000, 4000, 16000)
+# Per-edge time may grow this much from the smallest size to the largest;
+# loose enough for a busy CI machine, tight enough to catch a quadratic scan
+MAX_GROWTH = 4.0
+DRAWN = re.compile(r'<(?:line|path) ')
+
+
+def test_layout_of_a_prefix_matches_the_full_layout():
+    nodes, connections, _ = synthetic_spec(SIZES[-1], seed=3)
+    full = compute_layout(nodes, connections)
+    for size in SIZES[:-1]:
+        part = compute_layout(nodes, connections[:size])
+        assert part.labels == full.labels
+        assert np.array_equal(part.node_x, full.node_x)
+        assert np.array_equal(part.node_y, full.node_y)
+        kept = np.searchsorted(full.edges, part.edges)
+        assert np.array_equal(np.asarray(full.edges)[kept], part.edges)
+        for column in ('x1', 'y1', 'x2', 'y2', 'ctrl_x', 'ctrl_y'):
+            assert np.array_equal(getattr(part, column), getattr(full, column)[kept])
+
+
+def test_render_is_complete_and_near_linear():
+    per_edge = []
+    for size in SIZES:
+        nodes, connections, animations = synthetic_spec(size)
+        svg = generate_custom_svg(nodes, connections, animations, html=False)
+        layout = compute_layout(nodes, connections)
+        assert len(re.findall(r'<text ', svg)) == len(layout.labels)
+        # Animated connections are drawn over a faint copy of themselves
+        drawn = len(DRAWN.findall(svg)) - len(DRAWN.findall(SVG_DEFS))
+        assert len(layout.edges) <= drawn <= 2 * len(layout.edges)
+        per_edge.append(time_call(generate_custom_svg, nodes, connections, animations) / size)
+    assert per_edge[-1] <= per_edge[0] * MAX_GROWTH
@@ -0,0 +1,82 @@
+import io
+
+import pytest
+
+import graphviz_layout
+from bedrock_utils import (
+    generate_diagram,
+    generate_diagrams,
+    iter_diagram,
+    write_diagram,
+    write_fragments,
+)
+from benchmarks.synthetic import synthetic_graphviz_svg, synthetic_spec
+from render_cache import RenderCache
+from svg_renderer import generate_custom_svg, iter_custom_svg, write_custom_svg
+
+
+@pytest.fixture(scope='module')
+def spec():
+    return synthetic_spec(600, seed=6)
+
+
+@pytest.fixture
+def fake_dot(monkeypatch):
+    """Lay out Graphviz diagrams without the ``dot`` binary"""
+    runs = []
+
+    def run_dot(sources):
+        runs.append(len(sources))
+        return [synthetic_graphviz_svg(source.count(' -> '), seed=len(source))
+                for source in sources]
+
+    monkeypatch.setattr(graphviz_layout, 'run_dot', run_dot)
+    monkeypatch.setattr(graphviz_layout, 'layout_cache', RenderCache())
+    return runs
+
+
+@pytest.mark.parametrize('chunk_size', [1, 100, 65536])
+def test_write_fragments_matches_join(chunk_size):
+    fragments = [f'<g id="{i}">' + 'x' * (i % 7) for i in range(500)]
+    out = io.StringIO()
+    assert write_fragments(out, iter(fragments), chunk_size) == len(''.join(fragments))
+    assert out.getvalue() == ''.join(fragments)
+
+    chunks = []
+    write_fragments(chunks.append, fragments, chunk_size)
+    assert ''.join(chunks) == ''.join(fragments)
+    # Every chunk but the last holds at least chunk_size characters and
+    # stops at the first fragment that reaches it
+    longest = max(map(len, fragments))
+    assert all(chunk_size <= len(chunk) < chunk_size + longest for chunk in chunks[:-1])
+
+
+@pytest.mark.parametrize('options', [{}, {'html': False}, {'compact': True},
+                                     {'max_animated': 20}])
+def test_custom_svg_streams_the_joined_document(spec, options):
+    svg = generate_custom_svg(*spec, **options)
+    assert ''.join(iter_custom_svg(*spec, **options)) == svg
+    out = io.StringIO()
+    assert write_custom_svg(out, *spec, chunk_size=1000, **options) == len(svg)
+    assert out.getvalue() == svg
+
+
+def test_graphviz_diagram_streams_the_joined_document(spec, fake_dot):
+    svg = generate_diagram(*spec)
+    assert ''.join(iter_diagram(*spec)) == svg
+    chunks = []
+    assert write_diagram(chunks.append, *spec, chunk_size=1000) == len(svg)
+    assert ''.join(chunks) == svg
+    assert len(chunks) > 1
+    # The layout is cached by structure, so only the first render ran dot
+    assert fake_dot == [1]
+    assert 'mask="url(#gradient-mask)"' in svg
+
+
+def test_batched_graphviz_diagrams_match_single_renders(spec, fake_dot):
+    nodes, connections, animations = spec
+    diagrams = [spec, (nodes, connections[:300], animations), (nodes, connections, [])]
+    batch = generate_diagrams(diagrams)
+    assert fake_dot == [2]
+    assert batch == [generate_diagram(*diagram) for diagram in diagrams]
+    assert batch[0] != batch[2]
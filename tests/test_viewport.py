@@ -0,0 +1,55 @@
+import re
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_spec
+from layout import NODE_HEIGHT
+from viewport import SpatialIndex, TiledDiagram
+
+
+def brute_force(index, x0, y0, x1, y1):
+    return np.flatnonzero((index.x0 <= x1) & (index.x1 >= x0)
+                          & (index.y0 <= y1) & (index.y1 >= y0))
+
+
+def test_query_matches_brute_force():
+    rng = np.random.default_rng(0)
+    # Some boxes start left of or above the origin: the index itself does
+    # not assume the layout keeps to the canvas
+    x0 = rng.uniform(-100, 5000, 2000)
+    y0 = rng.uniform(-100, 3000, 2000)
+    index = SpatialIndex(x0, y0, x0 + rng.uniform(0, 400, 2000),
+                         y0 + rng.uniform(0, 200, 2000), cell_size=256)
+    for _ in range(300):
+        qx0, qy0 = rng.uniform(-600, 5500, 2)
+        qx1 = qx0 + rng.uniform(0, 2000)
+        qy1 = qy0 + rng.uniform(0, 2000)
+        assert index.query(qx0, qy0, qx1, qy1).tolist() == \
+            brute_force(index, qx0, qy0, qx1, qy1).tolist()
+
+
+def test_query_above_the_origin():
+    # Nothing the layout draws lies above the canvas, but the index still
+    # has to answer for boxes and queries there
+    index = SpatialIndex([10], [-50], [160], [-10])
+    assert index.query(0, -100, 200, -20).tolist() == [0]
+    assert index.query(0, -100, 200, -60).tolist() == []
+    assert index.query(0, 0, 200, 10**7).tolist() == []
+
+
+def test_summary_decorations_fit_the_boxes_at_low_zoom():
+    nodes, connections, _ = synthetic_spec(3000, seed=1)
+    diagram = TiledDiagram(nodes, connections)
+    for scale in (0.2, 0.05, 0.01):
+        svg = diagram.viewport_svg(0, -100, diagram.width, diagram.height + 100, scale=scale)
+        assert diagram.last_stats['detail'] == 'summary'
+        rects = re.findall(r'<rect [^>]*height="([\d.]+)"[^>]*stroke-width="([\d.]+)" rx="([\d.]+)"',
+                           svg)
+        assert rects
+        for height, stroke, corner in rects:
+            assert float(stroke) <= float(height) / 4
+            assert float(corner) <= float(height) / 2
+        for size in re.findall(r'font-size="([\d.]+)"', svg):
+            assert float(size) <= NODE_HEIGHT
+        for width in re.findall(r'<line [^>]*stroke-width="([\d.]+)"', svg):
+            assert float(width) <= NODE_HEIGHT
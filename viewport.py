@@ -0,0 +1,357 @@
+"""Viewport, tile and level-of-detail rendering for very large diagrams.
+
+``TiledDiagram`` lays a spec out once and indexes node boxes and connection
+bounding boxes in a ``SpatialIndex``. Each render then emits only what
+intersects the requested viewport:
+
+* at normal zoom, the nodes and connections in view are drawn exactly as
+  ``generate_custom_svg`` draws them;
+* zoomed out far enough that nodes would overlap on screen, each tier is
+  collapsed into summary nodes ("42 nodes") of a fixed on-screen width, and
+  the connections between them are bundled into one line per pair of
+  summaries, drawn wider the more connections it carries.
+
+``tile_svg`` renders square map-style tiles: at zoom ``z`` a tile covers
+``tile_size * 2**z`` canvas pixels.
+"""
+import math
+
+import numpy as np
+
+from layout import NODE_WIDTH, NODE_HEIGHT, GAP, compute_layout
+from svg_renderer import (
+    CONNECTION_COLORS,
+    CONNECTION_STYLES,
+    SVG_DEFS,
+    connection_svg,
+    iter_scheduled_connections,
+    layer_style,
+    node_svg,
+    static_connection_svg,
+)
+
+# Collapse tiers once neighbouring nodes are closer than this on screen
+MIN_NODE_SPACING_PX = 40
+# On-screen width of one summary node
+SUMMARY_WIDTH_PX = 120
+# Curves are tested against a viewport as this many straight segments, with
+# the viewport grown by EDGE_MARGIN to cover stroke width and arrowheads
+CURVE_SEGMENTS = 16
+EDGE_MARGIN = 8
+# Largest summary stroke, corner radius, font size and bundle width, as
+# fractions of NODE_HEIGHT
+MAX_STROKE = 0.1
+MAX_CORNER = 0.2
+MAX_FONT = 0.6
+MAX_BUNDLE_WIDTH = 0.5
+
+
+class SpatialIndex:
+    """Uniform grid over axis-aligned boxes.
+
+    Each box is registered in every grid cell it overlaps; boxes that would
+    cover more than ``max_cells`` cells (long connections) are kept in a
+    separate list that is always tested. ``query`` returns the sorted
+    indexes of the boxes intersecting a rectangle.
+    """
+
+    def __init__(self, x0, y0, x1, y1, cell_size=512, max_cells=64):
+        self.x0 = np.asarray(x0, dtype=float)
+        self.y0 = np.asarray(y0, dtype=float)
+        self.x1 = np.asarray(x1, dtype=float)
+        self.y1 = np.asarray(y1, dtype=float)
+        self.cell_size = cell_size
+
+        cx0 = np.maximum(self.x0 // cell_size, 0).astype(np.int64)
+        cy0 = np.maximum(self.y0 // cell_size, 0).astype(np.int64)
+        cx1 = np.maximum(self.x1 // cell_size, 0).astype(np.int64)
+        cy1 = np.maximum(self.y1 // cell_size, 0).astype(np.int64)
+        self.columns = int(cx1.max()) + 1 if len(cx1) else 1
+        self.rows = int(cy1.max()) + 1 if len(cy1) else 1
+        spans_x = cx1 - cx0 + 1
+        spans_y = cy1 - cy0 + 1
+        cells = spans_x * spans_y
+        small = np.flatnonzero(cells <= max_cells)
+        self.large = np.flatnonzero(cells > max_cells)
+
+        # Expand every small box into one (cell, box) pair per covered cell
+        counts = cells[small]
+        boxes = np.repeat(small, counts)
+        offset = np.arange(len(boxes)) - np.repeat(np.cumsum(counts) - counts, counts)
+        col = cx0[boxes] + offset % spans_x[boxes]
+        row = cy0[boxes] + offset // spans_x[boxes]
+        cell_ids = row * self.columns + col
+        order = np.argsort(cell_ids, kind='stable')
+        self._cell_ids = cell_ids[order]
+        self._boxes = boxes[order]
+
+    def query(self, x0, y0, x1, y1):
+        size = self.cell_size
+        # Boxes left of or above the origin were registered in the first
+        # column or row, so the query is clamped the same way
+        columns = np.arange(max(0, int(x0 // size)),
+                            min(self.columns - 1, max(0, int(x1 // size))) + 1)
+        rows = np.arange(max(0, int(y0 // size)),
+                         min(self.rows - 1, max(0, int(y1 // size))) + 1)
+        wanted = (rows[:, None] * self.columns + columns[None, :]).ravel()
+        starts = np.searchsorted(self._cell_ids, wanted, side='left')
+        ends = np.searchsorted(self._cell_ids, wanted, side='right')
+        parts = [self._boxes[start:end] for start, end in zip(starts.tolist(), ends.tolist())
+                 if end > start]
+        parts.append(self.large)
+        candidates = np.unique(np.concatenate(parts))
+        hits = ((self.x0[candidates] <= x1) & (self.x1[candidates] >= x0)
+                & (self.y0[candidates] <= y1) & (self.y1[candidates] >= y0))
+        return candidates[hits]
+
+    def __len__(self):
+        return len(self.x0)
+
+
+class TiledDiagram:
+    """A laid-out diagram that renders viewports and tiles on demand"""
+
+    def __init__(self, nodes, connections, max_animated=None, max_bundles=2000):
+        self.connections = connections
+        self.max_animated = max_animated
+        self.max_bundles = max_bundles
+        self.layout = layout = compute_layout(nodes, connections)
+        self.width = layout.width
+        self.height = layout.height
+        self.nodes = SpatialIndex(layout.node_x, layout.node_y,
+                                  layout.node_x + NODE_WIDTH, layout.node_y + NODE_HEIGHT)
+        self.edges = SpatialIndex(
+            np.minimum(np.minimum(layout.x1, layout.x2), layout.ctrl_x),
+            np.minimum(np.minimum(layout.y1, layout.y2), layout.ctrl_y),
+            np.maximum(np.maximum(layout.x1, layout.x2), layout.ctrl_x),
+            np.maximum(np.maximum(layout.y1, layout.y2), layout.ctrl_y),
+        )
+        self.curved = np.array([
+            CONNECTION_STYLES.get(conn_type, CONNECTION_STYLES['>>'])['type'] == 'curved'
+            for conn_type in layout.connectors
+        ], dtype=bool)
+        self._summaries = {}
+        self.last_stats = {}
+
+    def collapsed(self, scale):
+        """Whether tiers are drawn as summary nodes at this scale"""
+        return (NODE_WIDTH + GAP) * scale < MIN_NODE_SPACING_PX
+
+    def viewport_svg(self, x, y, width, height, scale=1.0, html=False):
+        """Render the part of the canvas in ``(x, y, width, height)``.
+
+        The SVG is ``width * scale`` by ``height * scale`` pixels.
+        ``last_stats`` records the level of detail and element counts.
+        """
+        x1 = x + width
+        y1 = y + height
+        if self.collapsed(scale):
+            body, stats = self._summary_body(x, y, x1, y1, scale)
+        else:
+            body, stats = self._detail_body(x, y, x1, y1)
+        self.last_stats = stats
+
+        px_width = max(1, round(width * scale))
+        px_height = max(1, round(height * scale))
+        svg = (f'<svg width="{px_width}" height="{px_height}" viewBox="{x:g} {y:g} {width:g} {height:g}" '
+               f'xmlns="http://www.w3.org/2000/svg">' + SVG_DEFS + ''.join(body) + '</svg>')
+        if html:
+            svg = (f'<html><body><div style="width:{px_width}px; height:{px_height}px; '
+                   f'border:1px solid #ccc; overflow:hidden">{svg}</div></body></html>')
+        return svg
+
+    def tile_grid(self, zoom, tile_size=512):
+        """Return ``(columns, rows)`` of tiles at ``zoom`` (0 is full size)"""
+        span = tile_size * 2 ** zoom
+        return math.ceil(self.width / span), math.ceil(self.height / span)
+
+    def tile_svg(self, column, row, zoom, tile_size=512):
+        """Render one ``tile_size`` pixel tile; each zoom level halves the scale"""
+        span = tile_size * 2 ** zoom
+        return self.viewport_svg(column * span, row * span, span, span, scale=2.0 ** -zoom)
+
+    def _visible_edges(self, x0, y0, x1, y1):
+        """Connections whose drawn line or curve crosses the rectangle.
+
+        The index only compares bounding boxes, which a long diagonal
+        connection can overlap without passing through the viewport.
+        """
+        x0 -= EDGE_MARGIN
+        y0 -= EDGE_MARGIN
+        x1 += EDGE_MARGIN
+        y1 += EDGE_MARGIN
+        candidates = self.edges.query(x0, y0, x1, y1)
+        layout = self.layout
+        px1, py1 = layout.x1[candidates, None], layout.y1[candidates, None]
+        px2, py2 = layout.x2[candidates, None], layout.y2[candidates, None]
+        # Straight connections ignore the control point; a control point
+        # at the midpoint makes the quadratic a straight line
+        curved = self.curved[candidates, None]
+        cx = np.where(curved, layout.ctrl_x[candidates, None], (px1 + px2) / 2)
+        cy = np.where(curved, layout.ctrl_y[candidates, None], (py1 + py2) / 2)
+
+        t = np.linspace(0, 1, CURVE_SEGMENTS + 1)[None, :]
+        u = 1 - t
+        qx = u * u * px1 + 2 * u * t * cx + t * t * px2
+        qy = u * u * py1 + 2 * u * t * cy + t * t * py2
+        hits = _segments_hit(qx[:, :-1], qy[:, :-1], qx[:, 1:], qy[:, 1:], x0, y0, x1, y1)
+        return candidates[hits.any(axis=1)]
+
+    def _detail_body(self, x0, y0, x1, y1):
+        layout = self.layout
+        edges = self._visible_edges(x0, y0, x1, y1).tolist()
+        node_indexes = self.nodes.query(x0, y0, x1, y1).tolist()
+
+        # Same arguments and color order as iter_connection_args; only the
+        # coordinates of the connections in view are converted
+        x1s, y1s = layout.x1[edges].tolist(), layout.y1[edges].tolist()
+        x2s, y2s = layout.x2[edges].tolist(), layout.y2[edges].tolist()
+        cxs, cys = layout.ctrl_x[edges].tolist(), layout.ctrl_y[edges].tolist()
+        edge_args = [
+            (layout.connectors[k], x1s[j], y1s[j], x2s[j], y2s[j], cxs[j], cys[j],
+             CONNECTION_COLORS[k % len(CONNECTION_COLORS)])
+            for j, k in enumerate(edges)
+        ]
+        report = {}
+        body = list(iter_scheduled_connections(
+            edge_args,
+            lambda args: connection_svg(*args),
+            lambda args: static_connection_svg(*args),
+            self.max_animated, report=report,
+        ))
+        node_x = layout.node_x[node_indexes].tolist()
+        node_y = layout.node_y[node_indexes].tolist()
+        body.extend(node_svg(layout.labels[i], node_x[j], node_y[j], layout.node_types[i])
+                    for j, i in enumerate(node_indexes))
+        return body, {
+            'detail': 'full',
+            'nodes': len(node_indexes),
+            'connections': len(edges),
+            'total_nodes': len(self.nodes),
+            'total_connections': len(self.edges),
+            'animation': report,
+        }
+
+    def _summaries_for(self, scale):
+        """Summary boxes and bundled connections for a zoom scale (cached)"""
+        bin_width = SUMMARY_WIDTH_PX / scale
+        cached = self._summaries.get(bin_width)
+        if cached is not None:
+            return cached
+
+        layout = self.layout
+        node_bin = (layout.node_x // bin_width).astype(np.int64)
+        # One summary per (tier, bin); tiers are rows of equal y
+        keys = np.stack([layout.node_layers.astype(np.int64), node_bin], axis=1)
+        groups, first_node, node_group, counts = np.unique(
+            keys, axis=0, return_index=True, return_inverse=True, return_counts=True)
+        node_group = node_group.ravel()
+        group_x0 = np.full(len(groups), np.inf)
+        group_x1 = np.full(len(groups), -np.inf)
+        group_y = np.zeros(len(groups))
+        np.minimum.at(group_x0, node_group, layout.node_x)
+        np.maximum.at(group_x1, node_group, layout.node_x + NODE_WIDTH)
+        group_y[node_group] = layout.node_y
+        group_type = [layout.node_types[i] for i in first_node.tolist()]
+
+        # Bundle connections by the summaries at their ends (node slots are
+        # found from the endpoints, which sit on node boxes)
+        label_node = {label: i for i, label in enumerate(layout.labels)}
+        conn = self.connections
+        src = np.fromiter((label_node[conn[k][0]] for k in layout.edges), dtype=np.int64,
+                          count=len(layout.edges))
+        dst = np.fromiter((label_node[conn[k][1]] for k in layout.edges), dtype=np.int64,
+                          count=len(layout.edges))
+        src_group = node_group[src]
+        dst_group = node_group[dst]
+        between = src_group != dst_group
+        pairs, bundle_counts = np.unique(
+            np.stack([src_group[between], dst_group[between]], axis=1), axis=0, return_counts=True
+        ) if between.any() else (np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+        cx = (group_x0 + group_x1) / 2
+        cy = group_y + NODE_HEIGHT / 2
+        summary = {
+            'x0': group_x0, 'x1': group_x1, 'y': group_y, 'counts': counts,
+            'types': group_type,
+            'boxes': SpatialIndex(group_x0, group_y, group_x1, group_y + NODE_HEIGHT),
+            'pairs': pairs, 'bundle_counts': bundle_counts,
+            'bx1': cx[pairs[:, 0]], 'by1': cy[pairs[:, 0]],
+            'bx2': cx[pairs[:, 1]], 'by2': cy[pairs[:, 1]],
+        }
+        summary['bundles'] = SpatialIndex(
+            np.minimum(summary['bx1'], summary['bx2']), np.minimum(summary['by1'], summary['by2']),
+            np.maximum(summary['bx1'], summary['bx2']), np.maximum(summary['by1'], summary['by2']),
+        )
+        self._summaries[bin_width] = summary
+        return summary
+
+    def _summary_body(self, x0, y0, x1, y1, scale):
+        summary = self._summaries_for(scale)
+        pixel = 1 / scale
+        # Strokes, corners and text keep their on-screen size while that
+        # fits the box, which stays NODE_HEIGHT tall on the canvas; further
+        # out they shrink with it instead of swamping the tier
+        stroke = min(2 * pixel, NODE_HEIGHT * MAX_STROKE)
+        corner = min(6 * pixel, NODE_HEIGHT * MAX_CORNER)
+        font_size = min(12 * pixel, NODE_HEIGHT * MAX_FONT)
+        max_bundle_width = NODE_HEIGHT * MAX_BUNDLE_WIDTH
+        body = []
+        bundles = summary['bundles'].query(x0, y0, x1, y1)
+        hidden = 0
+        if self.max_bundles is not None and len(bundles) > self.max_bundles:
+            # Keep the heaviest bundles; the rest are only counted
+            weights = summary['bundle_counts'][bundles]
+            keep = np.sort(np.argpartition(-weights, self.max_bundles)[:self.max_bundles])
+            hidden = int(weights.sum() - weights[keep].sum())
+            bundles = bundles[keep]
+        bundles = bundles.tolist()
+        for k in bundles:
+            count = int(summary['bundle_counts'][k])
+            body.append(
+                f'<line x1="{summary["bx1"][k]:.1f}" y1="{summary["by1"][k]:.1f}" '
+                f'x2="{summary["bx2"][k]:.1f}" y2="{summary["by2"][k]:.1f}" stroke="#9E9E9E" '
+                f'stroke-opacity="0.6" '
+                f'stroke-width="{min((1 + math.log2(count)) * pixel, max_bundle_width):.1f}">'
+                f'<title>{count} connections</title></line>'
+            )
+        boxes = summary['boxes'].query(x0, y0, x1, y1).tolist()
+        for g in boxes:
+            style = layer_style(summary['types'][g])
+            gx0 = summary['x0'][g]
+            gx1 = summary['x1'][g]
+            gy = summary['y'][g]
+            count = int(summary['counts'][g])
+            body.append(
+                f'<rect x="{gx0:.1f}" y="{gy:.1f}" width="{gx1 - gx0:.1f}" height="{NODE_HEIGHT}" '
+                f'fill="{style["fill"]}" stroke="{style["stroke"]}" stroke-width="{stroke:.1f}" '
+                f'rx="{corner:.1f}"/>'
+                f'<text x="{(gx0 + gx1) / 2:.1f}" y="{gy + NODE_HEIGHT / 2:.1f}" '
+                f'font-size="{font_size:.1f}" text-anchor="middle" dominant-baseline="middle" '
+                f'fill="#292929">{count} node{"s" if count != 1 else ""}</text>'
+            )
+        return body, {
+            'detail': 'summary',
+            'summary_nodes': len(boxes),
+            'bundled_connections': len(bundles),
+            'hidden_connections': hidden,
+            'total_nodes': len(self.nodes),
+            'total_connections': len(self.edges),
+        }
+
+
+def _segments_hit(ax, ay, bx, by, x0, y0, x1, y1):
+    """Liang-Barsky test of segments ``a``-``b`` against a rectangle (vectorized)"""
+    dx = bx - ax
+    dy = by - ay
+    t0 = np.zeros(ax.shape)
+    t1 = np.ones(ax.shape)
+    inside = np.ones(ax.shape, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-dx, ax - x0), (dx, x1 - ax), (-dy, ay - y0), (dy, y1 - ay)):
+            # Parallel to this edge and outside it
+            inside &= (p != 0) | (q >= 0)
+            r = q / p
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    return inside & (t0 <= t1)